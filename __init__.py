@@ -1,5 +1,9 @@
+# The modules are scripts run from this folder (cli.py, batch.py, worker.py, service.py) and import
+# each other by plain name, e.g. "import config". The ones exported below switch to relative imports
+# when loaded as part of this package, so it can be imported as a library without touching sys.path.
+
 from .character_prompt import character_prompt
-from .story_prompt import story_prompt, extend_story_prompt
+from .story_prompt import story_prompt
 from .image_prompt import image_prompt
 from .story_title_prompt import story_title_prompt
 from .saftey import validate_safe_input
@@ -8,7 +12,6 @@ from .config import DEFAULT_ART_STYLE, DEFAULT_TONE, BANNED_TOPICS
 __all__ = [
     "character_prompt",
     "story_prompt",
-    "extend_story_prompt",
     "image_prompt",
     "story_title_prompt",
     "validate_safe_input",
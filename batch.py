@@ -0,0 +1,145 @@
+"""
+Bulk storybook generation from a JSONL file.
+
+Each input line is a JSON object with "title", "genre" and optionally "age_group", "structured"
+and "profile" (render profile, e.g. "draft"). Books run across a pool of worker threads, and every
+book's illustrations come out of one shared image pool, so --max-images-in-flight is a budget
+for the whole run, not per book. One result record
+is appended to the output JSONL as each book finishes, and throughput and the hedge rate are reported at the end.
+
+    python batch.py books.jsonl --output results.jsonl --workers 4 --max-images-in-flight 16
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, Optional, TextIO
+
+import config
+import instrumentation  # Counts image requests and hedges across every book of the run
+from hedging import hedge_summary
+
+
+def read_jobs(path: str) -> Iterator[dict]:
+    """Yields one job per non-blank line of a JSONL file, tagged with its line number."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                job = {"error": f"Invalid JSON: {e}"}
+            if not isinstance(job, dict):
+                # Valid JSON, but not a job record (e.g. a list or a bare string)
+                job = {"error": f"Expected a JSON object, got {type(job).__name__}."}
+            job["line"] = line_number
+            yield job
+
+
+def run_job(job: dict, image_executor, stream: bool = False) -> dict:
+    """Runs one book and returns its result record (never raises)."""
+    from main import run_story_pipeline  # Imported here so --help works without API dependencies
+
+    record = {"line": job["line"], "title": job.get("title"), "genre": job.get("genre")}
+    started = time.monotonic()
+    try:
+        if "error" in job:
+            raise ValueError(job["error"])
+        if not job.get("title") or not job.get("genre"):
+            raise ValueError("Both title and genre are required.")
+
+        storybook = run_story_pipeline(
+            job["title"],
+            job["genre"],
+            age_group=job.get("age_group", "5–10"),
+            stream=stream,
+            structured=job.get("structured", config.STRUCTURED_GENERATION),
+            profile=job.get("profile"),
+            image_executor=image_executor,
+        )
+        record["status"] = "ok"
+        record["storybook"] = storybook
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["seconds"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def run_batch(
+    input_path: str,
+    output: TextIO,
+    workers: int = config.BATCH_WORKERS,
+    max_images_in_flight: int = config.BATCH_MAX_IMAGES_IN_FLIGHT,
+    stream: bool = False,
+) -> dict:
+    """
+    Runs every job in `input_path` and streams result records to `output`.
+
+    Returns a summary dict with book counts, elapsed seconds, throughput in books/minute and how
+    often slow image generations were hedged.
+    """
+    jobs = list(read_jobs(input_path))
+    write_lock = threading.Lock()
+    succeeded = 0
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_images_in_flight, thread_name_prefix="batch-image") as image_pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-book") as book_pool:
+        futures = [book_pool.submit(run_job, job, image_pool, stream) for job in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            succeeded += record["status"] == "ok"
+            with write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            print(f"📘 [{record['status']}] line {record['line']}: {record['title']} ({record['seconds']}s)", file=sys.stderr)
+
+    elapsed = time.monotonic() - started
+    return {
+        "books": len(jobs),
+        "succeeded": succeeded,
+        "failed": len(jobs) - succeeded,
+        "seconds": round(elapsed, 3),
+        "books_per_minute": round(len(jobs) / elapsed * 60, 3) if elapsed > 0 else 0.0,
+        **hedge_summary(instrumentation.get_registry().snapshot()["counters"]),
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate storybooks in bulk from a JSONL file.")
+    parser.add_argument("input", help="JSONL file of {title, genre, age_group} records")
+    parser.add_argument("-o", "--output", help="Where to append result records (default: stdout)")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS, help="Books generated at the same time")
+    parser.add_argument(
+        "--max-images-in-flight",
+        type=int,
+        default=config.BATCH_MAX_IMAGES_IN_FLIGHT,
+        help="Image generations in flight across all books",
+    )
+    parser.add_argument("--stream", action="store_true", help="Start illustrating pages while stories stream in")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = run_batch(args.input, output, args.workers, args.max_images_in_flight, args.stream)
+    finally:
+        if args.output:
+            output.close()
+
+    print(
+        f"🏁 {summary['succeeded']}/{summary['books']} books in {summary['seconds']}s "
+        f"({summary['books_per_minute']} books/min, {summary['hedges']} hedged images, "
+        f"hedge rate {summary['hedge_rate']:.1%})",
+        file=sys.stderr,
+    )
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,529 @@
+"""
+Micro-benchmarks for the storybook pipeline's hot spots.
+
+Each benchmark is a subcommand and prints its results as JSON so runs can be compared over time:
+
+    python benchmarks.py safety
+    python benchmarks.py split
+    python benchmarks.py pdf
+    python benchmarks.py e2e
+    python benchmarks.py startup
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+
+# Shared with tests/test_utils.py, which checks the splitter against the same baseline and stories
+from tests.split_helpers import legacy_split_story_into_pages, random_story, random_words
+
+
+def _best_of(fn: Callable[[], object], repeat: int = 3) -> float:
+    """Runs fn `repeat` times and returns the fastest wall-clock time in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# === Safety matcher ===
+
+def bench_safety(term_counts: List[int], text_words: List[int], repeat: int = 3) -> dict:
+    """
+    Times SafetyMatcher.find_terms for every (banned list size, text size) combination, next to the
+    old per-term substring scan. The matcher's time should grow with text size only.
+    """
+    from saftey import SafetyMatcher
+
+    rng = random.Random(0)
+    vocabulary = random_words(5000, rng)
+    results = []
+    for term_count in term_counts:
+        # Terms that never occur in the text (worst case: nothing short-circuits), plus a few phrases.
+        terms = [word + "q" + str(i) for i, word in enumerate(random_words(term_count, rng))]
+        terms += [f"{a} {b}" for a, b in zip(terms[:10], terms[10:20])]
+        matcher = SafetyMatcher(terms)
+        for words in text_words:
+            text = " ".join(rng.choices(vocabulary, k=words))
+            lowered = text.lower()
+            results.append({
+                "terms": term_count,
+                "text_words": words,
+                "matcher_seconds": round(_best_of(lambda: matcher.find_terms(text), repeat), 6),
+                "substring_seconds": round(_best_of(lambda: any(t in lowered for t in terms), repeat), 6),
+            })
+    return {"benchmark": "safety", "results": results}
+
+
+# === Story page splitter ===
+
+def bench_split(story_words: List[int], total_pages: int = 20, repeat: int = 5) -> dict:
+    """Times both splitters on stories of increasing length and compares how balanced their pages are."""
+    from utils import split_story_into_pages
+
+    rng = random.Random(1)
+    results = []
+    for words in story_words:
+        story = random_story(rng, max(1, words // 15))
+        new_pages = split_story_into_pages(story, total_pages)
+        old_pages = legacy_split_story_into_pages(story, total_pages)
+        results.append({
+            "story_words": len(story.split()),
+            "seconds": round(_best_of(lambda: split_story_into_pages(story, total_pages), repeat), 6),
+            "legacy_seconds": round(_best_of(lambda: legacy_split_story_into_pages(story, total_pages), repeat), 6),
+            "page_words_stdev": round(statistics.pstdev(len(p["text"].split()) for p in new_pages), 2),
+            "legacy_page_words_stdev": round(statistics.pstdev(len(p["text"].split()) for p in old_pages), 2),
+            "legacy_empty_pages": sum(not p["text"] for p in old_pages),
+        })
+    return {"benchmark": "split", "results": results}
+
+
+# === PDF export ===
+
+def _legacy_create_pdf(storybook, output_path, image_dir, font_path):
+    """The original leonardo.create_pdf (every page held in memory), kept as the comparison baseline."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    pages = []
+    for page in storybook["pages"]:
+        img_path = os.path.join(image_dir, f"page_{page['page']}.jpg")
+        if not os.path.exists(img_path):
+            continue
+        img = Image.open(img_path).convert("RGB")
+        draw = ImageDraw.Draw(img)
+        font = ImageFont.truetype(font_path, 24)
+        draw.text((50, 50), page["text"], font=font, fill="black")
+        pages.append(img)
+    if pages:
+        pages[0].save(output_path, save_all=True, append_images=pages[1:])
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    # VmHWM starts fresh in every exec'd process; ru_maxrss would carry over the parent's peak.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+
+def _pdf_worker(variant: str, image_dir: str, page_count: int, dpi, results) -> None:
+    """Runs one export in a fresh process so its peak RSS isn't polluted by the other variant."""
+    import config
+    from pdf_export import export_pdf
+    from PIL import Image  # noqa: F401  (import cost counted in the baseline, not the export)
+
+    storybook = {"pages": [{"page": i + 1, "text": "The fox ran through the tall grass. " * 6} for i in range(page_count)]}
+    output_path = os.path.join(image_dir, f"{variant}.pdf")
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if variant == "legacy":
+        _legacy_create_pdf(storybook, output_path, image_dir, config.PDF_FONT_PATH)
+    else:
+        pages = ((os.path.join(image_dir, f"page_{p['page']}.jpg"), p["text"]) for p in storybook["pages"])
+        export_pdf(pages, output_path, dpi=dpi)
+    elapsed = time.perf_counter() - started
+    results.put({
+        "variant": variant,
+        "dpi": dpi,
+        "seconds_per_page": round(elapsed / page_count, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+        "pdf_mb": round(os.path.getsize(output_path) / 1024 ** 2, 2),
+    })
+
+
+def bench_pdf(page_count: int = 20, size: int = 1024, dpi: int = 96) -> dict:
+    """Peak RSS and seconds/page for the legacy in-memory PDF export vs the streaming exporter."""
+    from PIL import Image
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    runs = []
+    with tempfile.TemporaryDirectory() as image_dir:
+        # Noisy images so JPEG sizes are realistic rather than trivially compressible
+        for number in range(1, page_count + 1):
+            noise = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+            noise.save(os.path.join(image_dir, f"page_{number}.jpg"), quality=90)
+
+        for variant, variant_dpi in (("legacy", None), ("streaming", None), ("streaming", dpi)):
+            process = context.Process(target=_pdf_worker, args=(variant, image_dir, page_count, variant_dpi, results))
+            process.start()
+            runs.append(results.get())
+            process.join()
+    return {"benchmark": "pdf", "pages": page_count, "image_size": size, "results": runs}
+
+
+# === End-to-end pipeline against local fake APIs ===
+
+def parse_distribution(spec: str) -> Callable[[], float]:
+    """
+    Parses a latency distribution for the fake servers:
+    "0.5" (fixed), "uniform:LOW,HIGH", "lognormal:MEDIAN,SIGMA" or "exp:MEAN" (all in seconds).
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        value = float(kind)
+        return lambda: value
+    params = [float(arg) for arg in args.split(",")]
+    rng = random.Random()
+    if kind == "uniform":
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda: rng.lognormvariate(mu, params[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / params[0])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+def percentiles(values: List[float]) -> dict:
+    """p50/p90/p99/max/mean of `values` (nearest-rank), rounded to milliseconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "p50": round(rank(50), 3),
+        "p90": round(rank(90), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1], 3),
+        "mean": round(statistics.fmean(ordered), 3),
+    }
+
+
+def _span_percentiles(checkpoint_dir: str) -> Dict[str, dict]:
+    """Percentiles of every span name across all trace.json files under checkpoint_dir."""
+    durations = {}
+    for book in os.listdir(checkpoint_dir) if os.path.isdir(checkpoint_dir) else []:
+        path = os.path.join(checkpoint_dir, book, "trace.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for span in json.load(f)["spans"]:
+                    durations.setdefault(span["name"], []).append(span["duration"])
+    return {name: dict(percentiles(values), count=len(values)) for name, values in sorted(durations.items())}
+
+
+def _e2e_worker(variant: str, pages: int, concurrency: int, books: int, env: dict, results) -> None:
+    """Generates `books` books with one pipeline variant in a fresh process pointed at the fake APIs."""
+    os.environ.update(env)  # Before any repo import, so config and openai pick up the fake servers
+    os.chdir(env["HOME"])  # leonardo.py writes its PDF to the working directory
+
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull  # The pipelines print every step
+        import config
+        import instrumentation
+        from hedging import hedge_summary
+
+        if variant == "leonardo":
+            import leonardo
+
+            def run(title):
+                return leonardo.run_story_pipeline(title, "Adventure", max_images_in_flight=concurrency)
+        else:
+            import main
+
+            def run(title):
+                return main.run_story_pipeline(
+                    title, "Adventure", max_images_in_flight=concurrency, total_pages=pages,
+                    stream=variant == "main-stream", structured=variant == "main-structured", force_regenerate=True,
+                )
+
+        latencies, errors = [], Counter()
+        page_count = failed_pages = 0
+        started = time.perf_counter()
+        for number in range(books):
+            book_started = time.perf_counter()
+            try:
+                storybook = run(f"Benchmark Book {number}")
+                page_count += len(storybook["pages"])
+                failed_pages += sum(not page.get("image_url") for page in storybook["pages"])
+            except Exception as e:
+                errors[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - book_started)
+        elapsed = time.perf_counter() - started
+        sys.stdout = sys.__stdout__
+
+    results.put({
+        "variant": variant,
+        "pages": pages,
+        "concurrency": concurrency,
+        "books": books,
+        "failed_books": sum(errors.values()),
+        "errors": dict(errors),
+        "failed_pages": failed_pages,
+        "book_seconds": percentiles(latencies),
+        "books_per_minute": round(60 * books / elapsed, 2),
+        "pages_per_minute": round(60 * (page_count - failed_pages) / elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "spans": _span_percentiles(config.CHECKPOINT_DIR),
+        "counters": instrumentation.get_registry().snapshot()["counters"],
+        **hedge_summary(instrumentation.get_registry().snapshot()["counters"]),
+    })
+
+
+def _run_cli(env: dict, runs: int) -> dict:
+    """Runs the interactive `python main.py` CLI end to end, answering its prompts on stdin."""
+    latencies, exit_codes, peak_rss = [], Counter(), 0.0
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    for number in range(runs):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=repo_dir, env=dict(os.environ, **env),
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        process.stdin.write(f"Benchmark CLI Book {number}\nAdventure\n".encode())
+        process.stdin.close()
+        _, status, usage = os.wait4(process.pid, 0)  # wait4 also reports the child's peak RSS
+        process.returncode = os.waitstatus_to_exitcode(status)
+        latencies.append(time.perf_counter() - started)
+        exit_codes[process.returncode] += 1
+        peak_rss = max(peak_rss, usage.ru_maxrss / 1024)
+    return {
+        "variant": "cli",
+        "runs": runs,
+        "failed_runs": runs - exit_codes[0],
+        "run_seconds": percentiles(latencies),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+def bench_e2e(
+    variants: List[str],
+    page_counts: List[int],
+    concurrencies: List[int],
+    books: int = 2,
+    cli_runs: int = 2,
+    llm_latency: str = "lognormal:0.4,0.3",
+    generation_time: str = "uniform:1,3",
+    leonardo_latency: str = "0.01",
+    image_failure_rate: float = 0.05,
+    leonardo_rate_limit_rate: float = 0.02,
+    llm_failure_rate: float = 0.0,
+    llm_rate_limit_rate: float = 0.0,
+) -> dict:
+    """
+    Runs the storybook pipelines end to end against local fake OpenAI and Leonardo servers.
+
+    Every (variant, page count, concurrency) combination runs in a fresh process with its own empty
+    HOME (so no cache or checkpoint carries over) and reports per-book latency percentiles,
+    throughput, peak RSS, per-span percentiles from the books' traces, the instrumentation counters
+    and how many requests (and 429s) each fake server saw. Variants: "main", "main-stream",
+    "main-structured" (one JSON call for character and pages), "main-hedged" (main with hedged image
+    requests), "leonardo" (leonardo.py, which always writes 2 pages and a PDF) and "cli" (python main.py).
+    """
+    import config
+    from fake_leonardo import FakeLeonardoServer
+    from fake_openai import FakeOpenAIServer
+
+    fake_openai = FakeOpenAIServer(
+        latency=parse_distribution(llm_latency), failure_rate=llm_failure_rate,
+        rate_limit_rate=llm_rate_limit_rate, retry_after=0.5,
+    )
+    fake_leonardo = FakeLeonardoServer(
+        generation_time=parse_distribution(generation_time), failure_rate=image_failure_rate,
+        latency=parse_distribution(leonardo_latency), rate_limit_rate=leonardo_rate_limit_rate, retry_after=0.5,
+    )
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    runs = []
+    with fake_openai, fake_leonardo:
+        scenarios = []
+        for variant in variants:
+            if variant == "cli":
+                scenarios.append((variant, 5, config.MAX_IMAGES_IN_FLIGHT))  # The CLI uses the defaults
+            elif variant == "leonardo":
+                scenarios += [(variant, 2, concurrency) for concurrency in concurrencies]
+            else:
+                scenarios += [(variant, pages, concurrency) for pages in page_counts for concurrency in concurrencies]
+
+        for variant, pages, concurrency in scenarios:
+            openai_before, leonardo_before = dict(fake_openai.request_counts), dict(fake_leonardo.request_counts)
+            with tempfile.TemporaryDirectory() as home:
+                env = {
+                    "HOME": home,
+                    "OPENAI_API_KEY": "benchmark",
+                    "OPENAI_API_BASE": f"{fake_openai.base_url}/v1",
+                    "LEONARDO_API_KEY": "benchmark",
+                    "LEONARDO_API_URL": fake_leonardo.base_url,
+                    "STORYBOOK_COMPLETION_CACHE": "off",
+                    "STORYBOOK_METRICS": "on",
+                    "STORYBOOK_HEDGE": "on" if variant == "main-hedged" else "off",
+                    "STORYBOOK_HEDGE_MIN_SAMPLES": "5",  # Every scenario starts from an empty HOME, so learn quickly
+                }
+                if variant == "cli":
+                    run = _run_cli(env, cli_runs)
+                else:
+                    process = context.Process(target=_e2e_worker, args=(variant, pages, concurrency, books, env, results))
+                    process.start()
+                    run = results.get()
+                    process.join()
+            run["server_requests"] = {
+                "openai": {k: v - openai_before[k] for k, v in fake_openai.request_counts.items()},
+                "leonardo": {k: v - leonardo_before[k] for k, v in fake_leonardo.request_counts.items()},
+            }
+            runs.append(run)
+
+    return {
+        "benchmark": "e2e",
+        "servers": {
+            "llm_latency": llm_latency,
+            "generation_time": generation_time,
+            "leonardo_latency": leonardo_latency,
+            "image_failure_rate": image_failure_rate,
+            "leonardo_rate_limit_rate": leonardo_rate_limit_rate,
+            "llm_failure_rate": llm_failure_rate,
+            "llm_rate_limit_rate": llm_rate_limit_rate,
+        },
+        "results": runs,
+    }
+
+
+# Packages that take tens to hundreds of milliseconds to import; the entry points load them lazily
+HEAVY_MODULES = ("openai", "aiohttp", "requests", "PIL", "IPython")
+
+
+def _import_profile(module: str) -> dict:
+    """
+    Imports `module` in a fresh interpreter under -X importtime. Returns its cumulative import time,
+    the slowest modules it pulled in (by self time) and which HEAVY_MODULES ended up loaded.
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=repo_dir, capture_output=True, text=True, check=True
+    )
+    # Children are printed before their parent, so everything since the previous top-level
+    # line belongs to the next top-level import
+    pending, total_us, dependencies = [], None, []
+    for line in completed.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0].split(":")[1]), int(fields[1])
+        except ValueError:
+            continue  # Column header
+        name = fields[2]
+        pending.append((self_us, name.strip()))
+        if not name.startswith("  "):  # Top level: one space of padding, no nesting indent
+            if name.strip() == module:
+                total_us, dependencies = cumulative_us, pending
+            pending = []
+    slowest = sorted(dependencies, reverse=True)[:8]
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "slowest_ms": {name: round(self_us / 1000, 1) for self_us, name in slowest},
+        "heavy_modules_loaded": completed.stdout.split(),
+    }
+
+
+def bench_startup(modules: List[str], repeat: int = 5, budget_ms: float = None) -> dict:
+    """
+    Cold-start cost of the entry points: each module's import time in a fresh interpreter (best of
+    `repeat`) and the wall time of `python cli.py --help`. A module that loads one of HEAVY_MODULES at
+    import, or exceeds budget_ms, is listed under "regressions".
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def run(*args) -> None:
+        subprocess.run([sys.executable, *args], cwd=repo_dir, stdout=subprocess.DEVNULL, check=True)
+
+    results, regressions = {}, []
+    for module in modules:
+        profiles = [_import_profile(module) for _ in range(repeat)]
+        best = min(profiles, key=lambda profile: profile["import_ms"])
+        results[module] = best
+        if best["heavy_modules_loaded"]:
+            regressions.append(f"{module} imports {', '.join(best['heavy_modules_loaded'])} at startup")
+        if budget_ms is not None and best["import_ms"] > budget_ms:
+            regressions.append(f"{module} takes {best['import_ms']} ms to import (budget {budget_ms} ms)")
+
+    return {
+        "benchmark": "startup",
+        "interpreter_ms": round(_best_of(lambda: run("-c", "pass"), repeat) * 1000, 1),
+        "cli_help_ms": round(_best_of(lambda: run("cli.py", "--help"), repeat) * 1000, 1),
+        "modules": results,
+        "regressions": regressions,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Storybook pipeline micro-benchmarks.")
+    subcommands = parser.add_subparsers(dest="benchmark", required=True)
+
+    safety = subcommands.add_parser("safety", help="Banned-term matcher vs. list size and text size")
+    safety.add_argument("--terms", type=int, nargs="+", default=[10, 1000, 10000])
+    safety.add_argument("--words", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    split = subcommands.add_parser("split", help="Page splitter speed and page balance")
+    split.add_argument("--words", type=int, nargs="+", default=[1000, 20000, 200000])
+    split.add_argument("--pages", type=int, default=20)
+
+    pdf = subcommands.add_parser("pdf", help="Peak memory and seconds/page of PDF export")
+    pdf.add_argument("--pages", type=int, default=20)
+    pdf.add_argument("--size", type=int, default=1024, help="Width/height of the test illustrations")
+    pdf.add_argument("--dpi", type=int, default=96, help="Target DPI for the downsampled run")
+
+    e2e = subcommands.add_parser("e2e", help="Whole pipelines and the CLI against local fake OpenAI/Leonardo APIs")
+    e2e.add_argument("--variants", nargs="+", default=["main", "main-stream", "main-structured", "main-hedged", "leonardo", "cli"],
+                     choices=["main", "main-stream", "main-structured", "main-hedged", "leonardo", "cli"])
+    e2e.add_argument("--pages", type=int, nargs="+", default=[5, 10])
+    e2e.add_argument("--concurrency", type=int, nargs="+", default=[2, 8], help="max_images_in_flight values")
+    e2e.add_argument("--books", type=int, default=2, help="Books per scenario")
+    e2e.add_argument("--cli-runs", type=int, default=2)
+    e2e.add_argument("--llm-latency", default="lognormal:0.4,0.3", help='e.g. "0.5", "uniform:0.2,1", "exp:0.5"')
+    e2e.add_argument("--generation-time", default="uniform:1,3", help="Seconds until a Leonardo generation completes")
+    e2e.add_argument("--leonardo-latency", default="0.01", help="Response latency of every Leonardo request")
+    e2e.add_argument("--image-failure-rate", type=float, default=0.05)
+    e2e.add_argument("--leonardo-rate-limit-rate", type=float, default=0.02, help="Share of Leonardo API calls answered 429")
+    e2e.add_argument("--llm-failure-rate", type=float, default=0.0)
+    e2e.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+
+    startup = subcommands.add_parser("startup", help="Import time of the entry points and `cli.py --help`")
+    startup.add_argument("--modules", nargs="+", default=["cli", "main", "leonardo", "batch", "worker"])
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--budget-ms", type=float, help="Fail (exit 1) if a module takes longer to import")
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "safety":
+        result = bench_safety(args.terms, args.words)
+    elif args.benchmark == "split":
+        result = bench_split(args.words, args.pages)
+    elif args.benchmark == "pdf":
+        result = bench_pdf(args.pages, args.size, args.dpi)
+    elif args.benchmark == "e2e":
+        result = bench_e2e(
+            args.variants, args.pages, args.concurrency, args.books, args.cli_runs,
+            args.llm_latency, args.generation_time, args.leonardo_latency, args.image_failure_rate,
+            args.leonardo_rate_limit_rate, args.llm_failure_rate, args.llm_rate_limit_rate,
+        )
+    elif args.benchmark == "startup":
+        result = bench_startup(args.modules, args.repeat, args.budget_ms)
+    print(json.dumps(result, indent=2))
+    return 1 if result.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
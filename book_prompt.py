@@ -0,0 +1,47 @@
+from config import DEFAULT_TONE, BANNED_TOPICS, STORY_LENGTH_PAGES  # Imports global tone default, banned content list and story length
+
+def book_prompt(
+    title: str,
+    genre: str,
+    age_group: str = "5–10",
+    tone: str = DEFAULT_TONE,
+    total_pages: int = 20,
+    length_pages: int = STORY_LENGTH_PAGES
+) -> str:
+    """
+    Creates a prompt that asks for the main character, a short list of its visual traits, the story
+    title and every page's text in one JSON reply, replacing the separate character_prompt,
+    visual_signature_prompt and story_prompt calls.
+
+    Parameters:
+        title (str): Title of the story.
+        genre (str): Genre like Adventure, Fantasy, Mystery, etc.
+        age_group (str): Age group the story is intended for (used for tone and vocabulary).
+        tone (str): Narrative tone to use; defaults to a friendly, imaginative voice.
+        total_pages (int): Number of pages the story is printed on; the reply must contain exactly this many.
+        length_pages (int): How long the story is, in picture-book pages (config.STORY_LENGTH_PAGES).
+
+    Returns:
+        str: A formatted prompt for use with a language model like GPT. Parse the reply with
+        utils.parse_book_json.
+    """
+
+    # The prompt includes:
+    # - The same character guidance as character_prompt (name, looks, personality, backstory)
+    # - The same story guidance as story_prompt (tone, age group, banned topics, one scene per page)
+    # - An exact JSON shape, so pages come back already split and no heuristic splitting is needed
+    return f"""You are a children's author writing a {length_pages}-page illustrated story titled "{title}".
+The genre is "{genre}", and the story is for children aged {age_group}.
+
+First create the main character: a memorable name, clear physical traits (color, clothing, species if
+non-human), positive personality traits and a simple, heartwarming backstory, in under 100 words.
+Also sum up only how the character looks (species or kind, colors, clothing and accessories) as a
+short comma-separated list, so every illustration can draw them the same way.
+Then write the story with that character. The tone should be {tone}.
+The story will be printed on {total_pages} pages: each page should describe a distinct scene or moment in the story.
+Avoid any themes of {', '.join(BANNED_TOPICS)}.
+
+Reply with only a JSON object, no other text, in exactly this shape:
+{{"title": "<story title>", "character": "<character description>", "appearance": "<visual traits>",
+ "pages": ["<page 1 text>", "<page 2 text>"]}}
+"pages" must contain exactly {total_pages} strings, one per page, in reading order."""
@@ -1,7 +1,10 @@
 # === Import necessary tools ===
 from typing import Optional  # For optional typing (though not used in this specific function)
 from textwrap import dedent  # Removes common leading whitespace from multiline strings
-from config import BANNED_TOPICS  # A list of inappropriate or disallowed topics for safety
+if __package__:  # Imported as part of the package (see __init__.py)
+    from .config import BANNED_TOPICS  # A list of inappropriate or disallowed topics for safety
+else:  # Run from this folder, like every script here
+    from config import BANNED_TOPICS  # A list of inappropriate or disallowed topics for safety
 
 def character_prompt(title: str, genre: str, age_group: str = "5–10") -> str:
     """
@@ -0,0 +1,158 @@
+import hashlib  # Stable book IDs
+import json
+import os
+import re
+import threading  # Page images finish on several threads at once
+from typing import Any, Callable, List, Optional
+
+import config  # Where manifests are stored
+
+
+def book_id(title: str, genre: str, age_group: str) -> str:
+    """Readable, collision-resistant ID for a book: a slug of the title plus a hash of its inputs."""
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")[:40] or "book"
+    digest = hashlib.sha1(f"{title}\n{genre}\n{age_group}".encode("utf-8")).hexdigest()[:10]
+    return f"{slug}-{digest}"
+
+
+def _image_exists(image_url: str) -> bool:
+    return image_url.startswith(("http://", "https://")) or os.path.exists(image_url)
+
+
+class BookManifest:
+    """
+    Per-book checkpoint of every completed pipeline stage.
+
+    The manifest is a JSON file holding the book's inputs plus the output of each finished stage
+    ("character", "story", "pages", each page's "image_url" and render "profile", "pdf"). It is rewritten atomically
+    every time a stage or page image completes, so a crashed run can resume where it stopped and
+    never pays for the same LLM call or illustration twice.
+
+    A manifest created with path=None keeps everything in memory only; the pipelines use that when
+    checkpointing is turned off, so the same code path works either way.
+    """
+
+    def __init__(self, path: Optional[str], data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_book(
+        cls,
+        title: str,
+        genre: str,
+        age_group: str,
+        directory: Optional[str] = config.CHECKPOINT_DIR,
+    ) -> "BookManifest":
+        """
+        Opens the manifest for this book, resuming it if one already exists.
+        Pass directory=None for an in-memory manifest that is never written to disk.
+        """
+        data = {"title": title, "genre": genre, "age_group": age_group}
+        if directory is None:
+            return cls(None, data)
+
+        path = os.path.join(directory, book_id(title, genre, age_group), "manifest.json")
+        if os.path.exists(path):
+            return cls.load(path)
+        manifest = cls(path, data)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, path: str) -> "BookManifest":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def get(self, name: str, default: Any = None) -> Any:
+        with self._lock:
+            return self.data.get(name, default)
+
+    def set(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.data[name] = value
+            self.save()
+
+    def stage(self, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the stored result of stage `name`, or runs compute() and checkpoints its result.
+        """
+        value = self.get(name)
+        if value is not None:
+            print(f"↩️ Resuming: '{name}' loaded from checkpoint.")
+            return value
+        value = compute()
+        self.set(name, value)
+        return value
+
+    def record_page_image(self, page: dict) -> None:
+        """
+        Stores one finished page's image_url (None for a failed page) and the render profile it was
+        made with, and invalidates the PDF.
+        """
+        with self._lock:
+            for stored in self.data.get("pages") or []:
+                if stored["page"] == page["page"]:
+                    stored["image_url"] = page.get("image_url")
+                    stored["profile"] = page.get("profile") if page.get("image_url") else None
+            self.data["pdf"] = None  # Any previously exported PDF no longer matches the pages
+            self.save()
+
+    def settle_profile(self, requested: Optional[str] = None) -> str:
+        """
+        Records and returns the book's render profile: `requested`, else the one the book was started
+        with, else config.DEFAULT_RENDER_PROFILE. Once any page has an image, the book keeps its profile,
+        so its pages are never a mix of two; re-rendering at another quality is promote_pages' job.
+        """
+        with self._lock:
+            current = self.data.get("profile")
+            rendered = any(page.get("image_url") for page in self.data.get("pages") or [])
+            if requested and current and requested != current and rendered:
+                print(
+                    f"⚠️ '{self.data['title']}' is rendered with the '{current}' profile; keeping it. "
+                    f"Promote its pages (cli.py promote) to re-render them as '{requested}'."
+                )
+                requested = current
+            profile = requested or current or config.DEFAULT_RENDER_PROFILE
+            if profile != current:
+                self.set("profile", profile)
+            return profile
+
+    def pages_missing_images(self) -> List[dict]:
+        """
+        Pages whose illustration has not been generated yet, failed, or whose image file is gone
+        (e.g. evicted from the image cache since). Only local paths can be checked; a remote URL
+        (as older leonardo.py checkpoints stored) counts as present.
+        """
+        with self._lock:
+            return [
+                page for page in self.data.get("pages") or []
+                if not page.get("image_url") or not _image_exists(page["image_url"])
+            ]
+
+    def storybook(self) -> dict:
+        """The storybook dictionary the pipelines return, built from the checkpointed stages."""
+        with self._lock:
+            storybook = {
+                "title": self.data["title"],
+                "genre": self.data["genre"],
+                "character": self.data.get("character"),
+                "story": self.data.get("story"),
+                "pages": self.data.get("pages") or [],
+                "profile": self.data.get("profile"),
+            }
+            if self.path:
+                storybook["manifest"] = self.path
+            return storybook
+
+    def save(self) -> None:
+        """Atomically writes the manifest (no-op for in-memory manifests)."""
+        if self.path is None:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
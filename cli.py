@@ -0,0 +1,242 @@
+"""
+Non-interactive command line for generating storybooks, for scripts, cron jobs and CI.
+
+    python cli.py generate "The Brave Little Fox" Adventure --pages 6 --pdf fox.pdf --json
+    python cli.py generate "The Brave Little Fox" Adventure --profile draft
+    python cli.py series Adventure "Pip and the Kite" "Pip at the Sea" "Pip's Winter" --pdf-dir books/
+    python cli.py promote ~/.storybook/books/<id>/manifest.json --pages 1 2 4 --pdf fox.pdf
+    python cli.py regenerate ~/.storybook/books/<id>/manifest.json
+    python cli.py pdf ~/.storybook/books/<id>/manifest.json fox.pdf
+    python cli.py html ~/.storybook/books/<id>/manifest.json site/fox/
+
+Progress goes to stderr; with --json the finished storybook is printed to stdout as one JSON
+document. Exit codes: 0 when every page has an illustration, 3 when some page images failed
+(re-run `regenerate` on the manifest), 1 on errors (including any failed book of a series) and
+2 on bad arguments.
+
+This module only imports the standard library and config at startup: the pipeline and its heavy
+dependencies (openai, requests, Pillow) load once a command actually runs, so --help and bad
+arguments return immediately. main.py keeps the interactive prompts.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+from typing import Optional
+
+import config
+
+
+def _show_progress(page: dict, done: int, total: int) -> None:
+    status = "🖼️" if page.get("image_url") else "⚠️"
+    print(f"{status} Page {page['page']} ({done}/{total})", file=sys.stderr)
+
+
+def _show_series_progress(title: str, page: dict, done: int, total: int) -> None:
+    status = "🖼️" if page.get("image_url") else "⚠️"
+    print(f"{status} {title}: page {page['page']} ({done}/{total})", file=sys.stderr)
+
+
+def _export_pdf(storybook: dict, output_path: str, dpi: Optional[int]) -> Optional[str]:
+    """
+    Writes the pages that have an illustration to a PDF; returns its path, or None if none had one.
+    dpi=None uses the book's render profile.
+    """
+    from pdf_export import export_pdf  # Pillow is only loaded when a PDF is requested
+    from render_profiles import pdf_dpi
+
+    if dpi is None:
+        dpi = pdf_dpi(storybook.get("profile"))
+    pages = [(page["image_url"], page["text"]) for page in storybook["pages"] if page.get("image_url")]
+    return output_path if export_pdf(pages, output_path, dpi=dpi) else None
+
+
+def _run_series(args: argparse.Namespace) -> dict:
+    from main import run_series_pipeline
+
+    series = run_series_pipeline(
+        args.titles,
+        args.genre,
+        age_group=args.age_group,
+        character=args.character,
+        series_title=args.series_title,
+        max_images_in_flight=args.max_images_in_flight,
+        on_progress=_show_series_progress,
+        force_regenerate=args.force_regenerate,
+        total_pages=args.pages,
+        stream=args.stream,
+        checkpoint_dir=None if args.no_checkpoint else config.CHECKPOINT_DIR,
+        profile=args.profile,
+    )
+    if args.pdf_dir:
+        os.makedirs(args.pdf_dir, exist_ok=True)
+        for number, storybook in enumerate(series["books"], start=1):
+            if "pages" in storybook:
+                storybook["pdf"] = _export_pdf(storybook, os.path.join(args.pdf_dir, f"book-{number:02d}.pdf"), args.dpi)
+    return series
+
+
+def _export_html(storybook: dict, output_dir: str) -> str:
+    """Writes the static web bundle (see html_export.py); returns the path of its index.html."""
+    from html_export import export_html  # Pillow is only loaded when a web bundle is requested
+
+    bundle = export_html(storybook, output_dir)
+    print(f"🌐 Web bundle: {bundle['rendered']} page(s) encoded, {bundle['reused']} unchanged", file=sys.stderr)
+    return os.path.join(output_dir, "index.html")
+
+
+def _run(args: argparse.Namespace) -> dict:
+    if args.command == "series":
+        return _run_series(args)
+    if args.command == "generate":
+        from main import run_story_pipeline
+
+        storybook = run_story_pipeline(
+            args.title,
+            args.genre,
+            age_group=args.age_group,
+            max_images_in_flight=args.max_images_in_flight,
+            on_progress=_show_progress,
+            force_regenerate=args.force_regenerate,
+            total_pages=args.pages,
+            stream=args.stream,
+            checkpoint_dir=None if args.no_checkpoint else config.CHECKPOINT_DIR,
+            structured=args.structured,
+            profile=args.profile,
+        )
+    elif args.command == "regenerate":
+        from main import regenerate_missing_pages
+
+        storybook = regenerate_missing_pages(
+            args.manifest, args.max_images_in_flight, on_progress=_show_progress, force_regenerate=args.force_regenerate
+        )
+    elif args.command == "promote":
+        from main import promote_pages
+
+        storybook = promote_pages(
+            args.manifest, args.pages, args.profile, args.max_images_in_flight, on_progress=_show_progress
+        )
+    else:
+        from checkpoint import BookManifest
+
+        storybook = BookManifest.load(args.manifest).storybook()
+
+    if getattr(args, "pdf", None):
+        storybook["pdf"] = _export_pdf(storybook, args.pdf, args.dpi)
+    if getattr(args, "html", None):
+        storybook["html"] = _export_html(storybook, args.html)
+    return storybook
+
+
+def _print_storybook(storybook: dict) -> None:
+    """Human-readable summary, for runs without --json."""
+    print(f"\n🎉 Storybook '{storybook.get('title')}' ({len(storybook['pages'])} pages)")
+    for page in storybook["pages"]:
+        print(f"\n📖 Page {page['page']}:\n{page['text']}")
+        print(f"🖼️ {page['image_url']}" if page.get("image_url") else "⚠️ No image found.")
+    if storybook.get("pdf"):
+        print(f"\n📄 PDF saved to {storybook['pdf']}")
+    if storybook.get("html"):
+        print(f"🌐 Web page saved to {storybook['html']}")
+    if storybook.get("manifest"):
+        print(f"💾 Checkpoint: {storybook['manifest']}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate illustrated children's storybooks.")
+    parser.add_argument("--json", action="store_true", help="Print the storybook as JSON on stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Hide progress output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write and illustrate a new storybook")
+    generate.add_argument("title")
+    generate.add_argument("genre", help="e.g. Adventure, Fantasy, Animal")
+    generate.add_argument(
+        "--structured",
+        action=argparse.BooleanOptionalAction,
+        default=config.STRUCTURED_GENERATION,
+        help="Write the character and all pages in one JSON reply (falls back to separate calls)",
+    )
+
+    series = commands.add_parser("series", help="Write and illustrate several books about one character at once")
+    series.add_argument("genre", help="e.g. Adventure, Fantasy, Animal")
+    series.add_argument("titles", nargs="+", help="One title per book")
+    series.add_argument("--character", help="Reuse this character description instead of writing a new one")
+    series.add_argument("--series-title", help="Title the character is written for (default: the first title)")
+    series.add_argument("--pdf-dir", metavar="DIR", help="Also export every book as DIR/book-NN.pdf")
+
+    regenerate = commands.add_parser("regenerate", help="Re-render the missing page images of a checkpointed book")
+    regenerate.add_argument("manifest", help="The book's manifest.json")
+
+    promote = commands.add_parser("promote", help="Re-render approved pages of a draft book at final quality")
+    promote.add_argument("manifest", help="The book's manifest.json")
+    promote.add_argument(
+        "--pages", type=int, nargs="+", help="Approved page numbers (default: every page not yet at --profile)"
+    )
+    promote.add_argument("--profile", choices=sorted(config.RENDER_PROFILES), default="final")
+
+    for command in (generate, series):
+        command.add_argument("--age-group", default="5–10")
+        command.add_argument("--pages", type=int, default=5, help="Number of pages (per book)")
+        command.add_argument("--stream", action="store_true", help="Start illustrating pages while the story streams in")
+        command.add_argument("--no-checkpoint", action="store_true", help="Don't save or resume from a checkpoint")
+        command.add_argument(
+            "--profile",
+            choices=sorted(config.RENDER_PROFILES),
+            help=f"Render profile (default: the book's own, else {config.DEFAULT_RENDER_PROFILE})",
+        )
+    for command in (generate, series, regenerate, promote):
+        command.add_argument("--max-images-in-flight", type=int, default=config.MAX_IMAGES_IN_FLIGHT)
+        command.add_argument("--dpi", type=int, help="Downsample PDF images to this DPI (default: the render profile's)")
+    for command in (generate, regenerate, promote):
+        command.add_argument("--pdf", metavar="PATH", help="Also export the book as a PDF")
+        command.add_argument("--html", metavar="DIR", help="Also export the book as a static web page")
+    for command in (generate, series, regenerate):
+        command.add_argument("--force-regenerate", action="store_true", help="Skip the image cache")
+
+    pdf = commands.add_parser("pdf", help="Export a checkpointed book as a PDF")
+    pdf.add_argument("manifest", help="The book's manifest.json")
+    pdf.add_argument("pdf", metavar="output", help="Where to write the PDF")
+    pdf.add_argument("--dpi", type=int, help="Downsample images to this DPI (default: the render profile's)")
+
+    web = commands.add_parser("html", help="Export a checkpointed book as a static web page")
+    web.add_argument("manifest", help="The book's manifest.json")
+    web.add_argument("html", metavar="output", help="Bundle directory (re-exports only re-encode changed pages)")
+    return parser
+
+
+def main(argv: Optional[list] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    # The pipeline reports progress with print(); keep stdout clean for the JSON document
+    progress = open(os.devnull, "w") if args.quiet else sys.stderr
+    try:
+        with contextlib.redirect_stdout(progress):
+            storybook = _run(args)
+    except Exception as e:
+        if args.json:
+            print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.quiet:
+            progress.close()
+
+    books = storybook["books"] if args.command == "series" else [storybook]
+    if args.json:
+        print(json.dumps(storybook, ensure_ascii=False, indent=2))
+    elif not args.quiet:
+        for book in books:
+            if "error" in book:
+                print(f"\n❌ '{book['title']}' failed: {book['error']}")
+            else:
+                _print_storybook(book)
+    if any("error" in book for book in books):
+        return 1
+    return 0 if all(page.get("image_url") for book in books for page in book["pages"]) else 3
+
+
+if __name__ == "__main__":
+    sys.exit(main())
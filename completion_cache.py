@@ -0,0 +1,122 @@
+import hashlib  # Cache keys
+import json
+import os
+import sqlite3  # Durable on-disk store that needs no extra dependency
+from abc import ABC, abstractmethod
+import threading  # Shared between pipeline threads
+import time
+from typing import List, Optional
+
+import config  # Cache location, TTL and size limit
+
+
+class CompletionCacheMiss(LookupError):
+    """Raised in replay mode when a completion is not in the cache."""
+
+
+def make_key(model: str, messages: List[dict], temperature: float) -> str:
+    """Hashes the request fields that determine a ChatCompletion result into a cache key."""
+    payload = json.dumps({"model": model, "messages": messages, "temperature": temperature}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache(ABC):
+    """
+    Interface for ChatCompletion caches, passed to llm.chat_completion(cache=...).
+
+    Subclasses store completion text under the key from make_key().
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """The cached completion, or None on a miss."""
+
+    @abstractmethod
+    def set(self, key: str, content: str) -> None:
+        """Stores a completion."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Removes a completion (no-op if it isn't cached)."""
+
+
+class SQLiteCompletionCache(CompletionCache):
+    """
+    ChatCompletion cache persisted in a SQLite file.
+
+    Entries older than ttl_seconds are treated as misses (None disables expiry), and once more
+    than max_entries are stored the least recently used ones are deleted.
+    """
+
+    def __init__(
+        self,
+        path: str = config.COMPLETION_CACHE_PATH,
+        ttl_seconds: Optional[float] = config.COMPLETION_CACHE_TTL_SECONDS,
+        max_entries: int = config.COMPLETION_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            content, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return content
+
+    def set(self, key: str, content: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, content, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            # Trim to the size limit, dropping the least recently used entries first.
+            self._conn.execute(
+                """
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM completions")
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,3 +1,4 @@
+import os  # Lets deployments point the API settings elsewhere through environment variables
 from typing import Optional  # Optional can be used elsewhere in your codebase
 from textwrap import dedent  # Useful for creating clean multiline strings (used in prompts)
 
@@ -8,15 +9,180 @@ from textwrap import dedent  # Useful for creating clean multiline strings (used
 # like classic illustrated storybooks (think: soft lines, playful, safe imagery).
 DEFAULT_ART_STYLE = "warm, colorful, hand-drawn style suitable for children"
 
+#  Image prompt size
+# Page prompts describe the main character with a short visual signature (species, colors, clothing),
+# derived once per book, instead of the full description with its name and backstory. Prompts are
+# kept within Leonardo's prompt limit: the signature, then the art style, are shortened first and
+# the page's scene text is only cut if it doesn't fit on its own.
+VISUAL_SIGNATURE_MAX_CHARS = 200
+IMAGE_PROMPT_MAX_CHARS = 1000
+
 #  Default tone for storytelling prompts
 # Keeps the story's language and narrative tone safe, fun, and creative.
 DEFAULT_TONE = "friendly and imaginative"
 
+#  Story length
+# Stories are written as long as a 20-page picture book, however many pages they are printed on:
+# fewer pages means more text per page, not a shorter story.
+STORY_LENGTH_PAGES = 20
+
 #  Banned topics list
 # These are words or themes that should never appear in a children's book.
 # You use this to filter input prompts and also reinforce safety in AI instructions.
 BANNED_TOPICS = ['violence', 'drugs', 'kill', 'blood', 'weapon', 'death']
 
+#  Banned terms used by the safety scanner (saftey.py)
+# A term matches words that start with it, so "kill" also flags "killers" and "blood" flags "bloodthirsty",
+# but "kill" no longer flags "skill". Only stems the topics above don't start with need listing.
+# This list can grow to thousands of terms (multi-word phrases are fine) without slowing the scan down.
+BANNED_TERMS = BANNED_TOPICS + ['violent', 'drug']
+
+#  Maximum number of page illustrations generated at the same time
+# Each Leonardo request spends most of its time waiting on the remote queue, so running a few
+# pages in parallel makes a book take roughly as long as its slowest page instead of the sum of all pages.
+MAX_IMAGES_IN_FLIGHT = 4
+
+#  Bulk generation (batch.py)
+# Books generated at the same time, and image generations in flight across all of those books.
+BATCH_WORKERS = 4
+BATCH_MAX_IMAGES_IN_FLIGHT = 16
+
+#  Leonardo.Ai API settings
+# The model and generation parameters every illustration is requested with.
+# LEONARDO_API_URL can be overridden (e.g. to point at fake_leonardo.py during development).
+LEONARDO_API_URL = os.getenv("LEONARDO_API_URL", "https://cloud.leonardo.ai/api/rest/v1")
+LEONARDO_MODEL_ID = "e316348f-7773-490e-adcd-46757c738eb7"  # Leonardo Creative v2
+LEONARDO_IMAGE_WIDTH = 1024
+LEONARDO_IMAGE_HEIGHT = 1024
+LEONARDO_GUIDANCE_SCALE = 8  # Controls how closely the image follows the prompt
+LEONARDO_INFERENCE_STEPS = 30  # Number of steps for generating the image
+
+#  Leonardo.Ai connection behaviour
+# Timeouts are (connect, read) seconds. Polling starts fast and backs off (with jitter) up to the
+# max delay, and the rate limiter keeps us under the account's request quota; a 429 response
+# pauses every caller sharing the client for as long as the server's Retry-After asks.
+LEONARDO_CONNECT_TIMEOUT = 5
+LEONARDO_READ_TIMEOUT = 30
+LEONARDO_POOL_SIZE = 16  # Keep-alive connections kept open per host
+LEONARDO_MAX_RETRIES = 3  # Retries for 429 / 5xx responses before giving up
+LEONARDO_POLL_INITIAL_DELAY = 1.0
+LEONARDO_POLL_MAX_DELAY = 8.0
+LEONARDO_POLL_TIMEOUT = 40.0  # Give up on a generation after this many seconds
+LEONARDO_REQUESTS_PER_SECOND = 5.0
+LEONARDO_BURST = 10
+LEONARDO_POLLER_WORKERS = 4  # Status checks the batch poller runs at the same time
+
+#  Hedged image requests
+# With hedging on, a page whose generation is still unfinished after LEONARDO_HEDGE_PERCENTILE of
+# recent completion times (for the same image size and steps) gets a duplicate generation with the
+# same prompt; whichever finishes first is used and the other is no longer polled. Every hedge costs
+# credits, so a book hedges at most LEONARDO_HEDGE_MAX_PER_BOOK pages. Completion times are kept in
+# LEONARDO_LATENCY_PATH, so each run starts from what earlier runs observed.
+LEONARDO_HEDGE = os.getenv("STORYBOOK_HEDGE", "off") == "on"
+LEONARDO_HEDGE_PERCENTILE = 0.9
+LEONARDO_HEDGE_MAX_PER_BOOK = 2
+LEONARDO_HEDGE_MIN_SAMPLES = int(os.getenv("STORYBOOK_HEDGE_MIN_SAMPLES", "20"))  # Completions needed before the percentile is trusted
+LEONARDO_HEDGE_WINDOW = 200  # Most recent completions the percentile is learned from
+LEONARDO_LATENCY_PATH = os.getenv(
+    "STORYBOOK_LATENCY_FILE", os.path.join(os.path.expanduser("~"), ".storybook", "leonardo_latency.json")
+)
+
+#  Generated image cache
+# Identical prompts + generation settings always give us an equivalent illustration, so finished
+# images are kept on disk and reused instead of paying Leonardo credits again.
+# The least recently used images are evicted once the cache grows past IMAGE_CACHE_MAX_BYTES.
+IMAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), "leonardo_images", "cache")
+IMAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+#  OpenAI settings
+OPENAI_MODEL = "gpt-4"
+OPENAI_TEMPERATURE = 0.7
+# Structured generation: one call returns the character and every page's text as JSON, instead of a
+# character call, a story call and the heuristic page splitter. A reply that doesn't parse falls back
+# to the two-call path. STORYBOOK_STRUCTURED=on makes it the default for every entry point.
+STRUCTURED_GENERATION = os.getenv("STORYBOOK_STRUCTURED", "off") == "on"
+
+#  ChatCompletion cache
+# Character and story completions are stored in SQLite keyed on model, messages and temperature,
+# so re-running a book (or retrying after an image failure) skips the LLM round trips.
+# COMPLETION_CACHE_MODE: "on" reads and fills the cache, "off" always calls OpenAI, and
+# "replay" never calls OpenAI at all (a miss is an error) for deterministic re-runs and tests.
+COMPLETION_CACHE_MODES = ("on", "off", "replay")
+COMPLETION_CACHE_MODE = os.getenv("STORYBOOK_COMPLETION_CACHE", "on")
+COMPLETION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".storybook", "completions.sqlite3")
+COMPLETION_CACHE_TTL_SECONDS = 30 * 24 * 3600  # 30 days; None keeps entries forever
+COMPLETION_CACHE_MAX_ENTRIES = 10000
+
+#  Checkpoints
+# Each book's finished stages (character, story, pages, page images, PDF) are saved to
+# CHECKPOINT_DIR/<book id>/manifest.json so an interrupted run resumes instead of starting over.
+CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".storybook", "books")
+
+#  PDF export
+# Pages are written to the PDF one at a time. Set PDF_DPI to downsample illustrations larger than
+# PDF_PAGE_WIDTH_INCHES * PDF_DPI pixels (smaller files, faster export); None keeps full resolution.
+PDF_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # Adjust path if needed
+PDF_FONT_SIZE = 24  # For a 1024px-wide page; scaled with the image width
+PDF_PAGE_WIDTH_INCHES = 8.0
+PDF_DPI = None
+PDF_JPEG_QUALITY = 85
+
+#  HTML export
+# A static web bundle of a book: every illustration is resized to each of HTML_IMAGE_WIDTHS (never
+# upscaled) as WebP and JPEG, and the browser picks one through srcset. The first HTML_EAGER_PAGES
+# pages load right away; the rest are lazy-loaded as the reader scrolls to them.
+HTML_IMAGE_WIDTHS = (320, 640, 1024)
+HTML_WEBP_QUALITY = 80
+HTML_JPEG_QUALITY = 82
+HTML_EAGER_PAGES = 1
+HTML_EXPORT_PROCESSES = min(4, os.cpu_count() or 1)  # Processes resizing and encoding the images
+
+#  Render profiles
+# Named illustration settings, applied to the Leonardo request and the exported PDF. "draft" is for
+# previewing layout and text: small, few inference steps, quick and cheap. "final" is full quality.
+# A draft book can later be promoted: only its approved pages are re-rendered with "final".
+RENDER_PROFILES = {
+    "draft": {"width": 512, "height": 512, "guidance_scale": 7, "num_inference_steps": 10, "pdf_dpi": 72},
+    "final": {
+        "width": LEONARDO_IMAGE_WIDTH,
+        "height": LEONARDO_IMAGE_HEIGHT,
+        "guidance_scale": LEONARDO_GUIDANCE_SCALE,
+        "num_inference_steps": LEONARDO_INFERENCE_STEPS,
+        "pdf_dpi": PDF_DPI,
+    },
+}
+DEFAULT_RENDER_PROFILE = os.getenv("STORYBOOK_RENDER_PROFILE", "final")
+
+#  Instrumentation
+# Stage timings and counters (poll attempts, retries, cache hits, OpenAI tokens). Each book's trace is
+# written next to its manifest as trace.json; set STORYBOOK_METRICS_TEXTFILE to also keep a Prometheus
+# textfile of the process-wide histograms up to date. STORYBOOK_METRICS=off turns recording off.
+METRICS_ENABLED = os.getenv("STORYBOOK_METRICS", "on") != "off"
+METRICS_TEXTFILE = os.getenv("STORYBOOK_METRICS_TEXTFILE")  # e.g. /var/lib/node_exporter/storybook.prom
+
+#  HTTP service (service.py)
+# Books are admitted into a bounded in-process queue (requests beyond SERVICE_MAX_QUEUED_BOOKS get a
+# 429) and at most SERVICE_MAX_CONCURRENT_BOOKS are generated at once. Blocking work (LLM calls, file
+# I/O, PDF export) shares SERVICE_BLOCKING_WORKERS threads; image polling needs no thread at all.
+SERVICE_HOST = os.getenv("STORYBOOK_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("STORYBOOK_SERVICE_PORT", "8080"))
+SERVICE_MAX_CONCURRENT_BOOKS = 8
+SERVICE_MAX_QUEUED_BOOKS = 100
+SERVICE_BLOCKING_WORKERS = 16
+SERVICE_MAX_FINISHED_JOBS = 1000  # Oldest finished jobs are forgotten beyond this (their files stay on disk)
+
+#  Durable job queue and workers (job_queue.py, worker.py)
+# Jobs are stored in a SQLite file that any number of worker processes (on one host, or on several
+# hosts sharing the file) claim with leases. A worker that stops heartbeating loses its lease after
+# JOB_LEASE_SECONDS and the job is retried elsewhere, up to JOB_MAX_ATTEMPTS times in total.
+JOB_QUEUE_PATH = os.getenv("STORYBOOK_JOB_QUEUE", os.path.join(os.path.expanduser("~"), ".storybook", "jobs.sqlite3"))
+JOB_LEASE_SECONDS = 120
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30  # Seconds before a failed job (or one with failed pages) is tried again
+WORKER_JOBS_PER_PROCESS = 2  # Books each worker process generates at once (I/O-bound, threads)
+WORKER_CPU_PROCESSES = 2  # Processes per worker for CPU-bound work (PDF page rendering)
+WORKER_IDLE_SLEEP = 2.0  # Seconds between claims when the queue is empty
+
 """
      NOTES ON AGE APPROPRIATENESS:
 
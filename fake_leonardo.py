@@ -0,0 +1,206 @@
+import argparse  # Command-line options when run as a standalone server
+import json
+import random  # Simulated generation times and failures
+import struct  # Building a tiny valid PNG without needing Pillow
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+
+
+def _tiny_png(width: int = 8, height: int = 8, rgb=(255, 200, 120)) -> bytes:
+    """Returns the bytes of a small solid-colour PNG."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(rgb) * width
+    raw = row * height
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeLeonardoServer:
+    """
+    Local stand-in for the Leonardo.Ai generations API, for development and testing.
+
+    Implements POST /generations, GET /generations/{id} and GET /images/{id}.png with the same
+    JSON shapes the real API returns. Each generation becomes COMPLETE after `generation_time`
+    seconds (a number, or a callable returning one per job) and fails with probability
+    `failure_rate`. Every request waits `latency` seconds before it is answered (a number or a
+    callable, like generation_time), and API requests are rejected with a 429 and a Retry-After of
+    `retry_after` seconds with probability `rate_limit_rate`.
+    Point LeonardoClient(base_url=server.base_url) at it, or set LEONARDO_API_URL.
+
+        with FakeLeonardoServer(generation_time=0.5) as server:
+            client = LeonardoClient(api_key="test", base_url=server.base_url)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        generation_time: Union[float, Callable[[], float]] = 1.0,
+        failure_rate: float = 0.0,
+        latency: Union[float, Callable[[], float]] = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+    ):
+        self.generation_time = generation_time
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.image_bytes = _tiny_png()
+        self.generations = {}  # generationId -> {"ready_at": float, "failed": bool, "prompt": str}
+        self.request_counts = {"submit": 0, "status": 0, "image": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLeonardoServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-leonardo", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeLeonardoServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def _delay(self) -> None:
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rate_limited(self) -> bool:
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            self._count("rate_limited")
+            return True
+        return False
+
+    def _new_generation(self, prompt: str) -> str:
+        delay = self.generation_time() if callable(self.generation_time) else self.generation_time
+        generation_id = str(uuid.uuid4())
+        with self._lock:
+            self.generations[generation_id] = {
+                "ready_at": time.monotonic() + delay,
+                "failed": random.random() < self.failure_rate,
+                "prompt": prompt,
+            }
+        return generation_id
+
+    def _status(self, generation_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self.generations.get(generation_id)
+        if job is None:
+            return None
+        if time.monotonic() < job["ready_at"]:
+            return {"id": generation_id, "status": "PENDING", "generated_images": []}
+        if job["failed"]:
+            return {"id": generation_id, "status": "FAILED", "generated_images": []}
+        image_url = f"{self.base_url}/images/{generation_id}.png"
+        return {"id": generation_id, "status": "COMPLETE", "generated_images": [{"id": generation_id, "url": image_url}]}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass  # Keep test output quiet
+
+            def _send(self, code: int, body: bytes, content_type: str = "application/json", headers=None) -> None:
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, code: int, obj, headers=None) -> None:
+                self._send(code, json.dumps(obj).encode(), headers=headers)
+
+            def _reject_rate_limited(self) -> bool:
+                """Answers with a 429 (and returns True) for the configured share of API requests."""
+                if not server._rate_limited():
+                    return False
+                self._json(429, {"error": "Too many requests"}, headers={"Retry-After": str(server.retry_after)})
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server._delay()
+                if self.path.rstrip("/").endswith("/generations"):
+                    if self._reject_rate_limited():
+                        return
+                    server._count("submit")
+                    generation_id = server._new_generation(payload.get("prompt", ""))
+                    self._json(200, {"sdGenerationJob": {"generationId": generation_id, "apiCreditCost": 1}})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                server._delay()
+                if len(parts) >= 2 and parts[-2] == "generations":
+                    if self._reject_rate_limited():
+                        return
+                    server._count("status")
+                    status = server._status(parts[-1])
+                    if status is None:
+                        self._json(404, {"error": "unknown generation"})
+                    else:
+                        self._json(200, {"generations_by_pk": status})
+                elif len(parts) >= 2 and parts[-2] == "images":
+                    server._count("image")
+                    self._send(200, server.image_bytes, content_type="image/png")
+                else:
+                    self._json(404, {"error": "not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Leonardo.Ai API for local development.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--generation-time", type=float, default=1.0, help="Seconds each generation takes")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of generations that fail")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of API requests that get a 429")
+    args = parser.parse_args()
+
+    fake = FakeLeonardoServer(
+        port=args.port,
+        generation_time=args.generation_time,
+        failure_rate=args.failure_rate,
+        latency=args.latency,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    print(f"Fake Leonardo API listening on {fake.base_url} (set LEONARDO_API_URL to use it)")
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
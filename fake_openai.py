@@ -0,0 +1,220 @@
+import argparse  # Command-line options when run as a standalone server
+import json
+import random  # Simulated latencies, failures and rate limits
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+
+# Harmless vocabulary for generated stories (nothing here may trip the safety matcher)
+_WORDS = (
+    "the little fox found a shiny red kite near the river and smiled at the friendly duck who "
+    "was painting clouds on a sunny morning while the wind sang softly over green hills"
+).split()
+
+_PAGE_COUNT_PATTERN = re.compile(r"(\d+)-page")
+_JSON_REPLY_MARKER = "Reply with only a JSON object"  # book_prompt asks for character and pages as JSON
+_SIGNATURE_MARKER = "comma-separated visual traits"  # visual_signature_prompt
+_APPEARANCE = "small orange fox, blue scarf, round green eyes"
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(_WORDS, k=rng.randint(6, 14))).capitalize() + "."
+
+
+def fake_completion(messages: list, seed: Optional[int] = None) -> str:
+    """
+    Plausible reply to a storybook prompt: a story with one "Page N:" line per requested page when
+    the prompt asks for an N-page story, the character and pages as JSON when it asks for JSON, a
+    list of visual traits for a visual signature prompt, otherwise a short character description.
+    """
+    prompt = messages[-1]["content"] if messages else ""
+    rng = random.Random(seed if seed is not None else prompt)
+    match = _PAGE_COUNT_PATTERN.search(prompt)
+    if match and _JSON_REPLY_MARKER in prompt:
+        pages = [" ".join(_sentence(rng) for _ in range(rng.randint(2, 4))) for _ in range(int(match.group(1)))]
+        character = "Pip is a small orange fox with a blue scarf. " + _sentence(rng)
+        return json.dumps({"title": "A Sunny Day", "character": character, "appearance": _APPEARANCE, "pages": pages})
+    if _SIGNATURE_MARKER in prompt:
+        return _APPEARANCE
+    if match:
+        pages = int(match.group(1))
+        lines = [f"Page {n}: " + " ".join(_sentence(rng) for _ in range(rng.randint(2, 4))) for n in range(1, pages + 1)]
+        return "Title: A Sunny Day\n" + "\n".join(lines)
+    return "Pip is a small orange fox with a blue scarf. " + " ".join(_sentence(rng) for _ in range(3))
+
+
+class FakeOpenAIServer:
+    """
+    Local stand-in for OpenAI's Chat Completions API (POST /v1/chat/completions), for development
+    and benchmarking.
+
+    Replies follow the real JSON shapes, including "usage" and stream=True server-sent events.
+    Every request waits `latency` seconds before replying (a number, or a callable returning one per
+    request); a request fails with a 500 with probability `failure_rate`, and is rejected with a 429
+    and a Retry-After header with probability `rate_limit_rate`. Point the openai package at it with
+    openai.api_base = server.base_url + "/v1" (or OPENAI_API_BASE).
+
+        with FakeOpenAIServer(latency=0.2) as server:
+            openai.api_base = server.base_url + "/v1"
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Union[float, Callable[[], float]] = 0.0,
+        failure_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        stream_chunk_words: int = 3,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunk_words = stream_chunk_words
+        self.request_counts = {"completion": 0, "stream": 0, "failed": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def _delay(self) -> None:
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass  # Keep benchmark output quiet
+
+            def _json(self, code: int, obj, headers: Optional[dict] = None) -> None:
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _error(self, code: int, message: str, kind: str, headers: Optional[dict] = None) -> None:
+                self._json(code, {"error": {"message": message, "type": kind, "param": None, "code": None}}, headers)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._error(404, "Unknown endpoint.", "invalid_request_error")
+                    return
+
+                server._delay()
+                roll = random.random()
+                if roll < server.rate_limit_rate:
+                    server._count("rate_limited")
+                    self._error(429, "Rate limit reached.", "requests", {"Retry-After": str(server.retry_after)})
+                    return
+                if roll < server.rate_limit_rate + server.failure_rate:
+                    server._count("failed")
+                    self._error(500, "The server had an error while processing your request.", "server_error")
+                    return
+
+                model = payload.get("model", "gpt-4")
+                content = fake_completion(payload.get("messages") or [])
+                if payload.get("stream"):
+                    server._count("stream")
+                    self._stream(model, content)
+                else:
+                    server._count("completion")
+                    self._complete(model, payload.get("messages") or [], content)
+
+            def _complete(self, model: str, messages: list, content: str) -> None:
+                prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+                completion_tokens = len(content.split())
+                self._json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+            def _stream(self, model: str, content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_event(data: str) -> None:
+                    event = f"data: {data}\n\n".encode()
+                    self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                words = re.split(r"(?<=\s)", content)  # Keep whitespace (including newlines) attached
+                step = max(1, server.stream_chunk_words)
+                for i in range(0, len(words), step):
+                    send_event(json.dumps({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": "".join(words[i:i + step])}, "finish_reason": None}],
+                    }))
+                send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI Chat Completions API for local development.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each reply")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that return 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests that return 429")
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(
+        port=args.port, latency=args.latency, failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate
+    )
+    print(f"Fake OpenAI API listening on {fake.base_url} (set OPENAI_API_BASE={fake.base_url}/v1 to use it)")
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
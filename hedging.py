@@ -0,0 +1,126 @@
+import contextvars  # The book's hedge budget follows the code into page threads, like its trace
+import json
+import math
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import config  # Hedging percentile, budget and where latencies are kept
+
+
+class LatencyTracker:
+    """
+    Recent Leonardo generation times, per kind of request (image size and steps), from which the
+    hedging threshold is learned.
+
+    Only the last `window` samples per kind count, so the threshold follows Leonardo's current queue.
+    With a path, samples are also kept in a small JSON file, so a short-lived process (one CLI run
+    per book) starts from what earlier runs saw instead of from nothing.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        window: int = config.LEONARDO_HEDGE_WINDOW,
+        min_samples: int = config.LEONARDO_HEDGE_MIN_SAMPLES,
+    ):
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                self._samples = {key: deque(values, maxlen=window) for key, values in stored.items()}
+            except (OSError, ValueError, AttributeError):
+                pass  # Unreadable history: start learning again
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(round(seconds, 3))
+            if self.path:
+                self._save()
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """The q-th (0–1) nearest-rank percentile of recent samples, or None with too few of them."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, self.min_samples):
+            return None
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def _save(self) -> None:
+        """Atomically writes the samples (caller holds the lock)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({key: list(values) for key, values in self._samples.items()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HedgeBudget:
+    """How many duplicate generations one book may still start; shared by its page threads."""
+
+    def __init__(self, max_hedges: int):
+        self.max_hedges = max_hedges
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """Uses up one hedge if any are left."""
+        with self._lock:
+            if self.used >= self.max_hedges:
+                return False
+            self.used += 1
+            return True
+
+
+_default_tracker: Optional[LatencyTracker] = None
+_default_tracker_lock = threading.Lock()
+_current_budget: contextvars.ContextVar = contextvars.ContextVar("storybook_hedge_budget", default=None)
+
+
+def get_default_latency_tracker() -> LatencyTracker:
+    """Returns the process-wide tracker backed by config.LEONARDO_LATENCY_PATH, creating it on first use."""
+    global _default_tracker
+    with _default_tracker_lock:
+        if _default_tracker is None:
+            _default_tracker = LatencyTracker(config.LEONARDO_LATENCY_PATH)
+        return _default_tracker
+
+
+def current_budget() -> Optional[HedgeBudget]:
+    """The hedge budget of the book being generated by this thread, if any."""
+    return _current_budget.get()
+
+
+@contextmanager
+def book_budget(max_hedges: Optional[int] = None) -> Iterator[HedgeBudget]:
+    """
+    Gives the block (one book) its own hedge budget: at most max_hedges duplicate generations
+    (config.LEONARDO_HEDGE_MAX_PER_BOOK by default, 0 when hedging is turned off). Work handed
+    to executors keeps the budget when wrapped with instrumentation.bind().
+    """
+    if max_hedges is None:
+        max_hedges = config.LEONARDO_HEDGE_MAX_PER_BOOK if config.LEONARDO_HEDGE else 0
+    budget = HedgeBudget(max_hedges)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def hedge_summary(counters: dict) -> dict:
+    """Hedges started, hedges that won, and the hedge rate (hedges per image request) from instrumentation counters."""
+    image_requests = counters.get("leonardo.image_requests", 0)
+    hedges = counters.get("leonardo.hedges", 0)
+    return {
+        "hedges": int(hedges),
+        "hedge_wins": int(counters.get("leonardo.hedge_wins", 0)),
+        "hedge_rate": round(hedges / image_requests, 3) if image_requests else 0.0,
+    }
@@ -0,0 +1,193 @@
+import hashlib  # Page fingerprints, so an unchanged page is not re-encoded
+import html
+import json
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor  # Images are resized and encoded in parallel
+from itertools import repeat
+from typing import Optional, Sequence
+
+import config  # Image widths, encoder quality and how many pages load eagerly
+
+MANIFEST_NAME = "book.json"
+IMAGE_DIR = "images"
+
+
+def page_hash(image_path: str, widths: Sequence[int]) -> str:
+    """
+    Fingerprint of everything a page's image variants depend on: the illustration's bytes and the
+    export settings. Equal hashes mean the variants from the last export can be reused as they are.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(widths), config.HTML_WEBP_QUALITY, config.HTML_JPEG_QUALITY]).encode())
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_variants(image_path: str, output_dir: str, stem: str, widths: Sequence[int]) -> list:
+    """
+    Writes the illustration resized to every width in `widths` (those wider than the image are
+    replaced by its own width) as JPEG, and as WebP when Pillow supports it, to
+    output_dir/images/<stem>-<width>.<ext>. A plain top-level function, so it can run in a process pool.
+
+    Returns one {"width", "height", "jpeg", "webp"} dict per variant, narrowest first, with paths
+    relative to output_dir ("webp" is None without WebP support).
+    """
+    from PIL import Image, features  # Only the export processes need Pillow
+
+    webp = features.check("webp")
+    variants = []
+    with Image.open(image_path) as img:
+        source = img.convert("RGB")
+    for width in sorted({min(width, source.width) for width in widths}):
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        variant = {"width": width, "height": height, "jpeg": f"{IMAGE_DIR}/{stem}-{width}.jpg", "webp": None}
+        resized.save(os.path.join(output_dir, variant["jpeg"]), format="JPEG", quality=config.HTML_JPEG_QUALITY, optimize=True, progressive=True)
+        if webp:
+            variant["webp"] = f"{IMAGE_DIR}/{stem}-{width}.webp"
+            resized.save(os.path.join(output_dir, variant["webp"]), format="WEBP", quality=config.HTML_WEBP_QUALITY, method=4)
+        variants.append(variant)
+    source.close()
+    return variants
+
+
+def _srcset(variants: list, key: str) -> str:
+    return ", ".join(f"{html.escape(variant[key])} {variant['width']}w" for variant in variants)
+
+
+def render_page_html(page: dict, eager: bool) -> str:
+    """One page as a <section>: a <picture> with WebP/JPEG srcsets (lazy unless eager) above the text."""
+    text = "".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in page["text"].split("\n") if paragraph.strip())
+    variants = page.get("variants")
+    if not variants:
+        return f'<section class="page" id="page-{page["page"]}">{text}</section>'
+
+    largest = variants[-1]
+    sizes = f"(max-width: {largest['width']}px) 100vw, {largest['width']}px"
+    loading = 'loading="eager" fetchpriority="high"' if eager else 'loading="lazy"'
+    webp = variants[-1]["webp"] and f'<source type="image/webp" srcset="{_srcset(variants, "webp")}" sizes="{sizes}">'
+    return (
+        f'<section class="page" id="page-{page["page"]}"><picture>{webp or ""}'
+        f'<img src="{html.escape(largest["jpeg"])}" srcset="{_srcset(variants, "jpeg")}" sizes="{sizes}" '
+        f'width="{largest["width"]}" height="{largest["height"]}" {loading} decoding="async" '
+        f'alt="Illustration for page {page["page"]}"></picture>{text}</section>'
+    )
+
+
+def render_book_html(manifest: dict) -> str:
+    title = html.escape(manifest["title"] or "Storybook")
+    character = f'<p class="character">{html.escape(manifest["character"])}</p>' if manifest.get("character") else ""
+    pages = "\n".join(
+        render_page_html(page, eager=number < config.HTML_EAGER_PAGES) for number, page in enumerate(manifest["pages"])
+    )
+    # Explicit width/height on every <img> lets the browser reserve the space, so lazy images don't shift the page
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ margin: 0 auto; max-width: 1024px; padding: 1rem; font: 1.25rem/1.6 Georgia, serif; color: #222; }}
+.page {{ margin-bottom: 3rem; }}
+img {{ display: block; width: 100%; height: auto; border-radius: 8px; }}
+.character {{ font-style: italic; color: #555; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{character}
+{pages}
+</body>
+</html>
+"""
+
+
+def _load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def export_html(
+    storybook: dict,
+    output_dir: str,
+    widths: Sequence[int] = config.HTML_IMAGE_WIDTHS,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """
+    Exports a storybook as a static web bundle: output_dir/index.html, the image variants under
+    output_dir/images/ and a compact JSON manifest, output_dir/book.json.
+
+    Parameters:
+        storybook: The storybook dict returned by the pipelines (title, character, pages).
+        output_dir: Bundle directory; exporting into it again only re-encodes pages whose
+            illustration (or the export settings) changed since the last export.
+        widths: Image widths for srcset.
+        executor: Optional (process) pool for resizing and encoding; by default a pool of
+            config.HTML_EXPORT_PROCESSES processes is started when more than one page needs it.
+
+    Returns:
+        dict: The manifest written to book.json, plus "rendered" and "reused" page counts.
+    """
+    os.makedirs(os.path.join(output_dir, IMAGE_DIR), exist_ok=True)
+    previous = {page["page"]: page for page in _load_manifest(output_dir).get("pages", [])}
+
+    pages, stale = [], []
+    for page in storybook["pages"]:
+        entry = {"page": page["page"], "text": page["text"], "hash": None, "variants": None}
+        image_path = page.get("image_url")
+        if image_path and os.path.exists(image_path):
+            entry["hash"] = page_hash(image_path, widths)
+            old = previous.get(page["page"])
+            if old and old.get("hash") == entry["hash"] and all(
+                os.path.exists(os.path.join(output_dir, path))
+                for variant in old["variants"] for path in (variant["jpeg"], variant["webp"]) if path
+            ):
+                entry["variants"] = old["variants"]  # Unchanged: keep last export's files
+            else:
+                stale.append((entry, image_path))
+        pages.append(entry)
+
+    if stale:
+        # Files are named after the hash, so pages sharing an illustration share one set of variants
+        sources = {entry["hash"]: image_path for entry, image_path in stale}
+        print(f"🖼️ Encoding image variants for {len(stale)} page(s)...")
+        args = (list(sources.values()), repeat(output_dir), [digest[:16] for digest in sources], repeat(tuple(widths)))
+        if executor is not None:
+            results = list(executor.map(render_variants, *args))
+        elif len(sources) == 1:
+            results = list(map(render_variants, *args))
+        else:
+            # "spawn": the pipeline's threads may still be running, which fork() can't copy safely
+            with ProcessPoolExecutor(
+                max_workers=min(len(sources), config.HTML_EXPORT_PROCESSES), mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                results = list(pool.map(render_variants, *args))
+        variants_by_hash = dict(zip(sources, results))
+        for entry, _ in stale:
+            entry["variants"] = variants_by_hash[entry["hash"]]
+
+    manifest = {"title": storybook.get("title"), "character": storybook.get("character"), "pages": pages}
+    _write_atomic(os.path.join(output_dir, "index.html"), render_book_html(manifest))
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+
+    # Variants of replaced illustrations are no longer referenced
+    referenced = {path for page in pages for variant in page["variants"] or [] for path in (variant["jpeg"], variant["webp"]) if path}
+    for name in os.listdir(os.path.join(output_dir, IMAGE_DIR)):
+        if f"{IMAGE_DIR}/{name}" not in referenced:
+            os.remove(os.path.join(output_dir, IMAGE_DIR, name))
+
+    return dict(manifest, rendered=len(stale), reused=sum(page["variants"] is not None for page in pages) - len(stale))
@@ -0,0 +1,233 @@
+import atexit  # Saves the default cache's last-used times when the process exits
+import hashlib  # Cache keys and content-addressed filenames
+import json
+import os
+import threading  # Pages are generated concurrently, so the index is shared between threads
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl  # Serialises index writes between processes sharing the cache directory
+except ImportError:  # Windows: writes still merge with the index on disk, just without the lock
+    fcntl = None
+
+import config  # Cache location and size budget
+import instrumentation  # Hit/miss counters
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache for generated illustrations.
+
+    Entries are looked up by a key derived from everything that determines the image (prompt,
+    model and generation parameters, see make_key). Image files are stored once under the SHA-256
+    of their bytes, so two keys that produced identical images share a file. When the total size
+    goes over max_bytes the least recently used entries are evicted.
+
+    index.json maps each key to its file, size and last-used time, so the cache survives restarts.
+    Several processes (workers, the service, batch runs) may share one cache directory: every write
+    happens under a lock file, merges the index on disk with this process's changes and replaces it
+    atomically, and a key missing from memory is looked up on disk before counting as a miss.
+    Cache hits only update last-used times in memory; they are written with the next put() (or flush()).
+    """
+
+    def __init__(self, directory: str = config.IMAGE_CACHE_DIR, max_bytes: int = config.IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._removed = set()  # Keys dropped here since the last write, so merging doesn't bring them back
+        self._dirty = False  # Last-used times changed since the last write
+
+    @staticmethod
+    def make_key(
+        prompt: str,
+        model_id: str,
+        width: int,
+        height: int,
+        guidance_scale: float,
+        num_inference_steps: int,
+    ) -> str:
+        """Hashes every parameter that affects the generated image into a cache key."""
+        payload = json.dumps(
+            {
+                "prompt": prompt,
+                "model_id": model_id,
+                "width": width,
+                "height": height,
+                "guidance_scale": guidance_scale,
+                "num_inference_steps": num_inference_steps,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached image path for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                # Another process may have cached it since we loaded the index
+                self._merge(self._load_index())
+                entry = self._index.get(key)
+            if entry is not None:
+                path = os.path.join(self.objects_dir, entry["file"])
+                if os.path.exists(path):
+                    entry["last_used"] = time.time()
+                    self._dirty = True
+                    self.hits += 1
+                    instrumentation.count("image_cache.hits")
+                    return path
+                # File was removed behind our back; forget the entry.
+                del self._index[key]
+                self._removed.add(key)
+            self.misses += 1
+            instrumentation.count("image_cache.misses")
+            return None
+
+    def put(self, key: str, image_path: str) -> str:
+        """
+        Moves a freshly downloaded image into the cache and returns its cached path.
+
+        The file is renamed to the SHA-256 of its contents (keeping the extension); if an
+        identical image is already stored, the new copy is simply dropped.
+        """
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        extension = os.path.splitext(image_path)[1] or ".png"
+        filename = digest.hexdigest() + extension
+        cached_path = os.path.join(self.objects_dir, filename)
+
+        with self._lock, self._index_lock():
+            if os.path.exists(cached_path):
+                os.remove(image_path)
+            else:
+                os.replace(image_path, cached_path)
+            self._merge(self._load_index())
+            self._index[key] = {
+                "file": filename,
+                "size": os.path.getsize(cached_path),
+                "last_used": time.time(),
+            }
+            self._removed.discard(key)
+            self._evict()
+            self._save_index()
+        return cached_path
+
+    def flush(self) -> None:
+        """Writes last-used times of cache hits that haven't been saved yet."""
+        with self._lock:
+            if not self._dirty and not self._removed:
+                return
+            with self._index_lock():
+                self._merge(self._load_index())
+                self._save_index()
+
+    def get_or_create(self, key: str, create: Callable[[], str], bypass: bool = False) -> str:
+        """
+        Returns the cached image for `key`, calling create() to produce it on a miss.
+
+        create() must return the path of a local image file, which is then moved into the cache.
+        With bypass=True the cache is not consulted (the image is always regenerated), but the
+        new image still replaces the cached one.
+        """
+        if not bypass:
+            cached_path = self.get(key)
+            if cached_path:
+                return cached_path
+        return self.put(key, create())
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters plus the current entry count and size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes(),
+            }
+
+    def _total_bytes(self) -> int:
+        # Files shared by several keys are only counted once.
+        sizes = {entry["file"]: entry["size"] for entry in self._index.values()}
+        return sum(sizes.values())
+
+    def _evict(self) -> None:
+        """Drops least recently used entries until the cache fits in max_bytes (caller holds the lock)."""
+        total = self._total_bytes()
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            del self._index[key]
+            self._removed.add(key)
+            self.evictions += 1
+            # Only delete the file once no other key points at the same content.
+            if not any(other["file"] == entry["file"] for other in self._index.values()):
+                total -= entry["size"]
+                try:
+                    os.remove(os.path.join(self.objects_dir, entry["file"]))
+                except FileNotFoundError:
+                    pass
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _merge(self, disk_index: dict) -> None:
+        """
+        Folds entries written by other processes into the in-memory index (caller holds the lock).
+        The more recently used version of a key wins; keys this process dropped stay dropped.
+        """
+        for key, entry in disk_index.items():
+            if key in self._removed:
+                continue
+            mine = self._index.get(key)
+            if mine is None or entry["last_used"] > mine["last_used"]:
+                self._index[key] = entry
+
+    @contextmanager
+    def _index_lock(self):
+        """Holds the cache directory's lock file, so only one process writes index.json at a time."""
+        with open(self.index_path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            yield
+
+    def _save_index(self) -> None:
+        """Writes the index (caller holds both locks and has merged the index on disk)."""
+        # Write to a unique temp file and rename so a crash never leaves a half-written index,
+        # and two writers never write to (or rename away) each other's temp file.
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._removed.clear()
+        self._dirty = False
+
+
+_default_cache: Optional[ImageCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_image_cache() -> ImageCache:
+    """Returns the process-wide ImageCache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+            atexit.register(_default_cache.flush)
+        return _default_cache
@@ -0,0 +1,125 @@
+import os
+import uuid  # Collision-free filenames (and temp files), even for downloads started at the same moment
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from leonardo_client import LeonardoClient  # Loaded lazily: requests is only needed to actually download
+
+# Magic bytes -> Pillow format name, so we know what we downloaded without decoding it
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+]
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+FORMATS_BY_EXTENSION = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP", ".gif": "GIF"}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Identifies an image format from its first bytes (None if unknown)."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in _SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def _temp_path(folder: str) -> str:
+    """A hidden temp file beside the destination (same filesystem, so os.replace is atomic)."""
+    return os.path.join(folder, f".download-{uuid.uuid4().hex}.part")
+
+
+def unique_image_path(folder: str, prefix: str, extension: str) -> str:
+    """A readable, timestamped filename that can't collide with a concurrent download."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(folder, f"{prefix}_{timestamp}_{uuid.uuid4().hex}{extension}")
+
+
+def _transcode(path: str, image_format: str, max_size: Optional[Tuple[int, int]]) -> None:
+    """Decodes `path`, converts/resizes it and atomically rewrites it in place."""
+    from PIL import Image  # Only needed when a conversion was actually requested
+
+    with Image.open(path) as img:
+        if max_size:
+            img.draft("RGB", max_size)  # Cheap reduced-scale decode for JPEGs
+        converted = img.convert("RGB") if image_format == "JPEG" and img.mode != "RGB" else img.copy()
+    if max_size:
+        converted.thumbnail(max_size, Image.LANCZOS)
+
+    tmp_path = _temp_path(os.path.dirname(path) or ".")
+    try:
+        with open(tmp_path, "xb") as f:
+            converted.save(f, format=image_format)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def download_image_file(
+    url: str,
+    filename: Optional[str] = None,
+    folder: str = ".",
+    prefix: str = "leonardo_image",
+    image_format: Optional[str] = None,
+    max_size: Optional[Tuple[int, int]] = None,
+    client: Optional["LeonardoClient"] = None,
+) -> str:
+    """
+    Streams an image to disk and returns its path.
+
+    The response is written chunk by chunk into a temp file beside the destination and renamed into
+    place only once complete, so readers never see a partial file and concurrent downloads never
+    overwrite each other. The bytes are stored exactly as served; Pillow is only involved when a
+    different format or a resize is requested.
+
+    Parameters:
+        url (str): Image URL.
+        filename (Optional[str]): Exact destination. Its extension picks the format (e.g. ".jpg").
+            When omitted, a unique name is generated in `folder` with the image's real extension.
+        folder (str): Destination folder when no filename is given.
+        prefix (str): Filename prefix for generated names.
+        image_format (Optional[str]): Pillow format to store ("JPEG", "PNG", ...); defaults to the
+            filename's extension, or to whatever format was downloaded.
+        max_size (Optional[Tuple[int, int]]): Downscale to fit within this (width, height).
+        client (Optional[LeonardoClient]): Client whose pooled session to use.
+    """
+    from leonardo_client import get_default_client  # requests loads on the first download
+
+    client = client or get_default_client()
+    folder = (os.path.dirname(filename) or ".") if filename else folder
+    os.makedirs(folder, exist_ok=True)
+
+    tmp_path = _temp_path(folder)
+    try:
+        head = b""
+        with open(tmp_path, "xb") as f, client.fetch(url, stream=True) as response:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                f.write(chunk)
+
+        source_format = sniff_format(head)
+        if image_format is None and filename:
+            image_format = FORMATS_BY_EXTENSION.get(os.path.splitext(filename)[1].lower())
+        image_format = image_format or source_format
+
+        # Only decode when the stored bytes would otherwise be wrong
+        if max_size or (image_format and image_format != source_format):
+            image_format = image_format or "PNG"
+            _transcode(tmp_path, image_format, max_size)
+
+        if filename is None:
+            filename = unique_image_path(folder, prefix, EXTENSIONS.get(image_format, ".png"))
+        os.replace(tmp_path, filename)
+        return filename
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,15 +1,28 @@
 from typing import Optional  # Allows art_style to be optional
 from textwrap import dedent  # (Not used in this function, but useful for multiline strings if needed later)
-from config import DEFAULT_ART_STYLE  # Default visual style for image generation prompts
+if __package__:  # Imported as part of the package (see __init__.py)
+    from .config import DEFAULT_ART_STYLE, IMAGE_PROMPT_MAX_CHARS  # Default visual style and Leonardo's prompt limit
+    from .utils import shorten  # Trims at a comma or space, never mid-word
+else:  # Run from this folder, like every script here
+    from config import DEFAULT_ART_STYLE, IMAGE_PROMPT_MAX_CHARS  # Default visual style and Leonardo's prompt limit
+    from utils import shorten  # Trims at a comma or space, never mid-word
 
-def image_prompt(character_description: str, scene_text: str, art_style: Optional[str] = None) -> str:
+def image_prompt(
+    character_description: str,
+    scene_text: str,
+    art_style: Optional[str] = None,
+    max_chars: int = IMAGE_PROMPT_MAX_CHARS,
+) -> str:
     """
     Generates a prompt string for an AI image generation model (like Leonardo.Ai).
     
     Parameters:
-        character_description (str): Description of the main character (e.g., name, appearance).
+        character_description (str): How the main character looks; normally the book's compact visual
+            signature (see visual_signature.py) rather than the full description.
         scene_text (str): Narrative text describing the scene on the page.
         art_style (Optional[str]): Optional custom style for the illustration. Defaults to a child-friendly style.
+        max_chars (int): Length budget for the whole prompt. The character, then the style, are shortened
+            to fit; the scene text is kept whole unless it is longer than the budget by itself.
     
     Returns:
         str: A complete prompt combining scene, character, and art style.
@@ -18,13 +31,22 @@ def image_prompt(character_description: str, scene_text: str, art_style: Optiona
     # Use the custom art_style if provided; otherwise fall back to a safe default.
     # This helps keep visual consistency and avoids inappropriate styles like realism or horror.
     style = art_style or DEFAULT_ART_STYLE
+    scene_text = " ".join(scene_text.split())
+    character_description = " ".join(character_description.split())
 
     # Construct the final image prompt:
     # - Asks the AI to "illustrate" a scene (clear intent)
     # - Combines the current scene's text and the character’s appearance
     # - Ends with stylistic instruction to ensure visual appropriateness
-    return (
-        f"Illustrate this children's book scene: {scene_text} "
-        f"The main character appears as: {character_description} "
-        f"Use a {style}."
-    )
+    scene_part = f"Illustrate this children's book scene: {scene_text}"
+    character_prefix = " The main character appears as: "
+    style_part = f" Use a {style}."
+
+    # Whatever the scene and style leave of the budget goes to the character
+    room = max_chars - len(scene_part) - len(style_part) - len(character_prefix) - 1  # 1 for the closing "."
+    character = shorten(character_description, room).rstrip(".")
+    if not character:
+        # Not even a few words of the character fit: keep the style if it does, else the scene alone
+        style_part = style_part if len(scene_part) + len(style_part) <= max_chars else ""
+        return shorten(scene_part, max_chars) + style_part
+    return f"{scene_part}{character_prefix}{character}.{style_part}"
@@ -0,0 +1,75 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed  # Runs page renders side by side
+from typing import Callable, Dict, List, Optional  # Type hints for the render and progress callbacks
+from config import MAX_IMAGES_IN_FLIGHT  # Default cap on simultaneous image generations
+from instrumentation import bind  # Page renders stay attributed to the book's trace
+
+
+def generate_page_images(
+    pages: List[dict],
+    render_page: Callable[[dict], Optional[str]],
+    max_in_flight: int = MAX_IMAGES_IN_FLIGHT,
+    on_progress: Optional[Callable[[dict, int, int], None]] = None,
+    executor: Optional[Executor] = None,
+) -> List[dict]:
+    """
+    Generates the illustration for every page concurrently.
+
+    Parameters:
+        pages (List[dict]): Page dictionaries that already contain an "image_prompt".
+        render_page (Callable): Called with a page dict, returns the image path/URL for that page.
+        max_in_flight (int): Maximum number of pages rendered at the same time.
+        on_progress (Optional[Callable]): Called as on_progress(page, done, total) after each page
+            finishes, whether it succeeded or not.
+        executor (Optional[Executor]): Shared executor to render on instead of a private pool, so several
+            books running at once share one concurrency budget (max_in_flight is then ignored).
+
+    Returns:
+        List[dict]: The same page list, in its original order, with "image_url" set on every page
+        (None for pages whose image failed).
+    """
+    total = len(pages)
+    if total == 0:
+        return pages
+
+    if executor is not None:
+        futures = {executor.submit(bind(render_page), page): page for page in pages}
+        collect_page_images(futures, on_progress)
+        return pages
+
+    # Never start more threads than there are pages to render.
+    workers = max(1, min(max_in_flight, total))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-image") as pool:
+        # Map each future back to its page so results land on the right page regardless of finish order.
+        futures = {pool.submit(bind(render_page), page): page for page in pages}
+        collect_page_images(futures, on_progress)
+
+    return pages
+
+
+def collect_page_images(
+    futures: Dict[Future, dict],
+    on_progress: Optional[Callable[[dict, int, int], None]] = None,
+) -> None:
+    """
+    Waits for already-started page renders and stores each result as the page's "image_url".
+
+    Parameters:
+        futures (Dict[Future, dict]): Each render future mapped to the page it belongs to.
+        on_progress (Optional[Callable]): Called as on_progress(page, done, total) as pages finish.
+    """
+    total = len(futures)
+    done = 0
+    for future in as_completed(futures):
+        page = futures[future]
+        try:
+            page["image_url"] = future.result()
+            print(f"✅ Page {page['page']} image generated.")
+        except Exception as e:
+            # One failed page must not take the rest of the book down with it.
+            print(f"❌ Page {page['page']} image failed: {e}")
+            page["image_url"] = None
+
+        done += 1
+        if on_progress:
+            on_progress(page, done, total)
@@ -0,0 +1,253 @@
+import contextvars  # The active book trace follows the code into page threads
+import json
+import os
+import threading  # Spans and counters are recorded from many threads at once
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import config  # Whether metrics are on and where the Prometheus textfile goes
+
+# Upper bounds (seconds) of the latency histogram buckets, from cache hits up to slow generations
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Trace:
+    """
+    Timeline of one book: every timed span plus the book's own counters.
+
+    Spans are stored flat as (name, start offset, duration, thread, attributes), which is enough to
+    see what ran in parallel and where the time went. The trace is written as JSON per book.
+    """
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, duration: float, attrs: dict, error: Optional[str] = None) -> None:
+        span = {
+            "name": name,
+            "start": round(started - self._origin, 6),
+            "duration": round(duration, 6),
+            "thread": threading.current_thread().name,
+        }
+        if attrs:
+            span["attrs"] = attrs
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, dict]:
+        """Per span name: how many times it ran, total and slowest duration."""
+        summary = {}
+        with self._lock:
+            for span in self.spans:
+                entry = summary.setdefault(span["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                entry["count"] += 1
+                entry["total_seconds"] += span["duration"]
+                entry["max_seconds"] = max(entry["max_seconds"], span["duration"])
+        for entry in summary.values():
+            entry["total_seconds"] = round(entry["total_seconds"], 6)
+        return summary
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "duration": round(time.perf_counter() - self._origin, 6),
+            "summary": self.summary(),
+            "counters": counters,
+            "spans": spans,
+        }
+
+    def save(self, path: str) -> str:
+        """Atomically writes the trace as JSON and returns the path."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+class MetricsRegistry:
+    """
+    Process-wide latency histograms (one per span name) and counters, across every book.
+
+    Histograms use fixed buckets, so recording a span is a short loop over the bucket bounds and a
+    dict update under a lock. prometheus_text() renders everything in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}  # span name -> [bucket counts..., +Inf count, sum]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """Counters, plus count/sum/mean per span name."""
+        with self._lock:
+            histograms = {name: list(values) for name, values in self._histograms.items()}
+            counters = dict(self._counters)
+        spans = {}
+        for name, values in histograms.items():
+            count = sum(values[:-1])
+            spans[name] = {"count": count, "total_seconds": round(values[-1], 6), "mean_seconds": round(values[-1] / count, 6)}
+        return {"spans": spans, "counters": counters}
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            histograms = {name: list(values) for name, values in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP storybook_span_seconds Duration of storybook pipeline stages and API calls.",
+            "# TYPE storybook_span_seconds histogram",
+        ]
+        for name in sorted(histograms):
+            values = histograms[name]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                lines.append(f'storybook_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'storybook_span_seconds_bucket{{span="{name}",le="+Inf"}} {cumulative}')
+            lines.append(f'storybook_span_seconds_sum{{span="{name}"}} {values[-1]:.6f}')
+            lines.append(f'storybook_span_seconds_count{{span="{name}"}} {cumulative}')
+
+        for name in sorted(counters):
+            metric = "storybook_" + name.replace(".", "_").replace("-", "_") + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {counters[name]}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> str:
+        """Atomically writes prometheus_text() to `path` (for node_exporter's textfile collector)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_registry = MetricsRegistry()
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("storybook_trace", default=None)
+
+
+def get_registry() -> MetricsRegistry:
+    """Returns the process-wide metrics registry."""
+    return _registry
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the book being generated by this thread, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Makes `trace` the current trace for the duration of the block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    """
+    Times the block as span `name`: recorded on the current book's trace and in the process-wide
+    histogram. Exceptions are recorded on the span and re-raised.
+    """
+    if not config.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _registry.observe(name, duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, started, duration, attrs, error)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Adds `value` to counter `name`, process-wide and on the current book's trace."""
+    if not config.METRICS_ENABLED:
+        return
+    _registry.count(name, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wraps fn to run in a copy of the caller's context, so work handed to an executor is still
+    attributed to the current book's trace. Bind once per submit: a context can't be entered by
+    two threads at the same time.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def book_trace(name: str, path: Optional[str] = None, **attrs) -> Iterator[Trace]:
+    """
+    Traces one book: the block runs as the "pipeline" span of a fresh Trace. On exit the trace is
+    written to `path` (if given) and the Prometheus textfile is refreshed (if configured).
+    """
+    trace = Trace(name, **attrs)
+    try:
+        with tracing(trace), span("pipeline"):
+            yield trace
+    finally:
+        if config.METRICS_ENABLED:
+            if path:
+                trace.save(path)
+            if config.METRICS_TEXTFILE:
+                _registry.write_textfile(config.METRICS_TEXTFILE)
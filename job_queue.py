@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3  # Durable, file-based store shared by every worker process (and host)
+import threading  # Job threads and their heartbeat threads share one connection
+import time
+from typing import Any, Dict, Optional
+
+import config  # Queue location, lease length and retry budget
+
+
+class Job:
+    """One claimed job, as handed to a worker."""
+
+    def __init__(
+        self, job_id: int, payload: dict, attempts: int, max_attempts: int, lease_owner: str, lease_expires: float
+    ):
+        self.id = job_id
+        self.payload = payload
+        self.attempts = attempts  # Including this one
+        self.max_attempts = max_attempts
+        self.lease_owner = lease_owner
+        self.lease_expires = lease_expires
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id}, attempts={self.attempts}/{self.max_attempts}, payload={self.payload!r})"
+
+    @property
+    def last_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file, safe to share between processes.
+
+    Workers claim() a job by taking a lease on it for lease_seconds and must heartbeat() to keep it.
+    A worker that crashes simply stops heartbeating: once its lease expires the job is handed to
+    the next claim() again. Every claim counts as an attempt; a job that fails (or loses its lease)
+    max_attempts times is marked failed for good.
+
+    Claims run in a BEGIN IMMEDIATE transaction, so two workers can never take the same job. Several
+    hosts can share the queue through a network filesystem only if it implements POSIX locks
+    correctly; pass wal=False there, since WAL mode needs shared memory on a single host.
+    Each process should open its own JobQueue; one instance can be shared by that process's threads.
+    """
+
+    def __init__(
+        self,
+        path: str = config.JOB_QUEUE_PATH,
+        lease_seconds: float = config.JOB_LEASE_SECONDS,
+        max_attempts: int = config.JOB_MAX_ATTEMPTS,
+        wal: bool = True,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: every transaction below is opened explicitly
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        if wal:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, available_at)")
+
+    def enqueue(self, payload: dict, max_attempts: Optional[int] = None) -> int:
+        """Adds a job and returns its id."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (payload, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(payload, ensure_ascii=False), max_attempts or self.max_attempts, now, now, now),
+            )
+        return cursor.lastrowid
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """
+        Leases the oldest runnable job to worker_id: a queued job, or a running one whose lease has
+        expired. Returns None when there is nothing to do.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Takes the write lock up front, so claims never race
+            try:
+                # Expired leases that have used up their attempts are failed instead of retried
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', error = COALESCE(error, 'Lease expired.'),
+                        lease_owner = NULL, updated_at = ?
+                    WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+                    """,
+                    (now, now),
+                )
+                row = self._conn.execute(
+                    """
+                    SELECT id, payload, attempts, max_attempts FROM jobs
+                    WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?)
+                    ORDER BY id LIMIT 1
+                    """,
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                job_id, payload, attempts, max_attempts = row
+                lease_expires = now + self.lease_seconds
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                        lease_expires = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (worker_id, lease_expires, now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job(job_id, json.loads(payload), attempts + 1, max_attempts, worker_id, lease_expires)
+
+    def _update_own(self, job: Job, assignments: str, params: tuple) -> bool:
+        """
+        Runs `UPDATE jobs SET <assignments>` only while `job` still holds its lease. The attempt number
+        is part of the check, so a worker can't touch a job that was re-claimed after its lease expired
+        (not even by itself).
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND status = 'running' AND lease_owner = ? AND attempts = ?",
+                params + (job.id, job.lease_owner, job.attempts),
+            )
+        return bool(cursor.rowcount)
+
+    def heartbeat(self, job: Job) -> bool:
+        """Extends the job's lease. Returns False if the lease was lost (expired and re-claimed)."""
+        now = time.time()
+        if not self._update_own(job, "lease_expires = ?, updated_at = ?", (now + self.lease_seconds, now)):
+            return False
+        job.lease_expires = now + self.lease_seconds
+        return True
+
+    def complete(self, job: Job, result: Any = None) -> bool:
+        """Marks the job done. Returns False (and changes nothing) if this worker no longer holds it."""
+        return self._update_own(
+            job,
+            "status = 'done', result = ?, error = NULL, lease_owner = NULL, updated_at = ?",
+            (json.dumps(result, ensure_ascii=False), time.time()),
+        )
+
+    def fail(self, job: Job, error: str, retry_delay: float = 0.0) -> bool:
+        """
+        Records a failed attempt. The job is queued again after retry_delay seconds while it has
+        attempts left, and marked failed otherwise. Returns False if this worker no longer holds it.
+        """
+        now = time.time()
+        return self._update_own(
+            job,
+            """
+            status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            available_at = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            """,
+            (now + retry_delay, error, now),
+        )
+
+    def get(self, job_id: int) -> Optional[dict]:
+        """The job's full record (payload and result decoded), or None."""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        record = dict(zip([column[0] for column in cursor.description], row))
+        record["payload"] = json.loads(record["payload"])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        for status, count in rows:
+            counts[status] = count
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -2,130 +2,137 @@
 
 from dotenv import load_dotenv
 import os
-import openai
-import requests
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
 
 from character_prompt import character_prompt
 from story_prompt import story_prompt
 from image_prompt import image_prompt
 from story_title_prompt import story_title_prompt
 from utils import split_story_into_pages
+from saftey import validate_safe_output
+from image_stage import generate_page_images
+from llm import chat_completion
+from checkpoint import BookManifest
+from image_download import download_image_file
+import instrumentation
+import hedging
+import config
+from render_profiles import image_params, pdf_dpi
+from visual_signature import derive_visual_signature
 
 # Load API keys
-load_dotenv()
+load_dotenv()  # OPENAI_API_KEY is picked up when llm.py first imports openai
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 LEONARDO_API_KEY = os.getenv("LEONARDO_API_KEY")
 
-def generate_image(prompt: str, width: int = 1024, height: int = 1024) -> str:
+def generate_image(prompt: str, profile=None) -> str:
     """
     Generate image from Leonardo.Ai
+    Size, steps and guidance come from the render profile (config.RENDER_PROFILES)
     """
-    headers = {
-        "Authorization": f"Bearer {LEONARDO_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "prompt": prompt,
-        "width": width,
-        "height": height,
-        "num_images": 1,
-        "guidance_scale": 7.5,
-        "num_inference_steps": 30
-    }
-
-    response = requests.post("https://cloud.leonardo.ai/api/rest/v1/generations", headers=headers, json=data)
-    
-    if response.status_code != 200:
-        raise Exception(f"Leonardo API Error: {response.status_code} - {response.text}")
-    
-    image_url = response.json()["generations"][0]["generated_images"][0]["url"]
-    return image_url
+    from leonardo_poller import get_default_poller  # Loads requests on first use
+
+    with instrumentation.span("image.submit"):
+        future = get_default_poller().submit(prompt, **image_params(profile))
+    with instrumentation.span("image.poll"):
+        return future.result()
 
 def save_image_from_url(url, filename):
     """
     Download and save image from URL
+    The image is streamed to disk and only re-encoded if its format doesn't match the filename
     """
-    response = requests.get(url)
-    image = Image.open(BytesIO(response.content))
-    image.save(filename)
-    return filename
+    with instrumentation.span("image.download"):
+        return download_image_file(url, filename)
 
-def create_pdf(storybook, output_path="storybook.pdf"):
+def create_pdf(storybook, output_path="storybook.pdf", image_dir=".", dpi=config.PDF_DPI):
     """
     Create a PDF from the storybook content
+    Pages are streamed to disk one at a time (constant memory); pass dpi to downsample large images
+    Returns output_path, or None if no page images were available
     """
-    pages = []
-    font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # Adjust path if needed
-    font_size = 24
-
-    for page in storybook["pages"]:
-        img_path = f"page_{page['page']}.jpg"
-        if not os.path.exists(img_path):
-            continue
-        img = Image.open(img_path).convert("RGB")
-        draw = ImageDraw.Draw(img)
-
-        # Add text
-        font = ImageFont.truetype(font_path, font_size)
-        text = page["text"]
-        draw.text((50, 50), text, font=font, fill="black")
-
-        pages.append(img)
-
-    if pages:
-        pages[0].save(output_path, save_all=True, append_images=pages[1:])
+    from pdf_export import export_pdf  # Pillow is only loaded when a PDF is made
+
+    pages = (
+        (os.path.join(image_dir, f"page_{page['page']}.jpg"), page["text"])
+        for page in storybook["pages"]
+    )
+
+    if export_pdf(pages, output_path, dpi=dpi):
         print(f"PDF saved to {output_path}")
+        return output_path
     else:
         print("No pages were available to save.")
-
-def run_story_pipeline(title: str, genre: str, age_group: str = "5–10"):
-    # Step 1: Character generation
-    char_msg = character_prompt(title, genre, age_group)
-    char_response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": char_msg}],
-        temperature=0.7
-    )
-    character = char_response["choices"][0]["message"]["content"].strip()
-    print(f"Character Created:\n{character}\n")
-
-    # Step 2: Story generation
-    story_msg = story_prompt(title, genre, character)
-    story_response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": story_msg}],
-        temperature=0.7
-    )
-    story = story_response["choices"][0]["message"]["content"].strip()
-    print("Story Generated.")
-
-    # Step 3: Split story into pages
-    pages = split_story_into_pages(story, total_pages=2)
-
-    # Step 4: Generate images with Leonardo
-    for page in pages:
-        page["image_prompt"] = image_prompt(character, page["text"])
-        try:
-            page["image_url"] = generate_image(page["image_prompt"])
-            print(f"Page {page['page']} image generated.")
-            image_path = f"page_{page['page']}.jpg"
-            save_image_from_url(page["image_url"], image_path)
-        except Exception as e:
-            print(f"Page {page['page']} image failed: {e}")
-            page["image_url"] = None
-
-    storybook = {
-        "title": title,
-        "genre": genre,
-        "character": character,
-        "pages": pages
-    }
-
-    create_pdf(storybook)
-    return storybook
+        return None
+
+def run_story_pipeline(
+    title: str,
+    genre: str,
+    age_group: str = "5–10",
+    max_images_in_flight: int = config.MAX_IMAGES_IN_FLIGHT,
+    on_progress=None,
+    checkpoint_dir=config.CHECKPOINT_DIR,
+    profile=None,
+):
+    # Every finished stage is checkpointed, so re-running the same book resumes where it stopped
+    manifest = BookManifest.for_book(title, genre, age_group, directory=checkpoint_dir)
+    image_dir = os.path.dirname(manifest.path) if manifest.path else "."
+
+    # Render profile: "draft" previews quickly at low resolution, "final" is full quality.
+    # A book that already has illustrations keeps the profile they were made with.
+    profile = manifest.settle_profile(profile)
+
+    # Stage timings and counters go to trace.json beside the manifest
+    trace_path = os.path.join(image_dir, "trace.json") if manifest.path else None
+    with instrumentation.book_trace(title, trace_path, genre=genre, age_group=age_group), hedging.book_budget():
+        # Step 1: Character generation
+        char_msg = character_prompt(title, genre, age_group)
+        with instrumentation.span("character"):
+            character = manifest.stage(
+                "character", lambda: chat_completion(char_msg, validate=lambda reply: validate_safe_output(reply, "character"))
+            )
+        print(f"Character Created:\n{character}\n")
+
+        # Step 2: Story generation
+        story_msg = story_prompt(title, genre, character)
+        with instrumentation.span("story"):
+            story = manifest.stage(
+                "story", lambda: chat_completion(story_msg, validate=lambda reply: validate_safe_output(reply, "story"))
+            )
+        print("Story Generated.")
+
+        # Step 3: Split story into pages
+        def split_pages():
+            # Image prompts describe the character by its looks only, not the whole description
+            appearance = manifest.stage("visual_signature", lambda: derive_visual_signature(character))
+            pages = split_story_into_pages(story, total_pages=2)
+            for page in pages:
+                validate_safe_output(page["text"], f"page {page['page']}")
+                page["image_prompt"] = image_prompt(appearance, page["text"])
+            return pages
+
+        with instrumentation.span("split"):
+            manifest.stage("pages", split_pages)
+
+        # Step 4: Generate images with Leonardo, several pages at a time (skipping pages already done)
+        def render_page(page):
+            page["profile"] = profile
+            image_url = generate_image(page["image_prompt"], profile)
+            # The page keeps the local file, like main.py's pages; Leonardo's URL expires anyway
+            return save_image_from_url(image_url, os.path.join(image_dir, f"page_{page['page']}.jpg"))
+
+        def record_progress(page, done, total):
+            manifest.record_page_image(page)
+            if on_progress:
+                on_progress(page, done, total)
+
+        missing = manifest.pages_missing_images()
+        with instrumentation.span("images", pages=len(missing)):
+            generate_page_images(missing, render_page, max_in_flight=max_images_in_flight, on_progress=record_progress)
+
+        storybook = manifest.storybook()
+        with instrumentation.span("pdf"):
+            manifest.stage("pdf", lambda: create_pdf(storybook, image_dir=image_dir, dpi=pdf_dpi(profile)))
+        return storybook
 
 if __name__ == "__main__":
     print("Welcome to the Storybook Creator!")
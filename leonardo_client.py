@@ -0,0 +1,238 @@
+import os  # Reads the Leonardo API key from the environment
+import random  # Jitter for the polling backoff
+import threading  # The client and its rate limiter are shared between page threads
+import time  # Sleeping between polls and tracking rate-limit tokens
+from email.utils import parsedate_to_datetime  # Retry-After can be an HTTP date instead of seconds
+from typing import Optional
+
+import requests  # HTTP client; a single Session keeps TLS connections alive between calls
+from requests.adapters import HTTPAdapter
+
+import config  # Leonardo endpoint, model, timeouts, polling and rate-limit settings
+import instrumentation  # Retry and rate-limit counters
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill at `rate` per second up to `capacity`; every request takes one token and
+    waits when the bucket is empty. `pause()` blocks all callers until a given time, which is
+    how a 429 Retry-After from the server is honoured across every thread sharing the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # Refill for the time elapsed since the last call.
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stops handing out tokens for the next `seconds` seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after_seconds(response: requests.Response, default: float) -> float:
+    """Parses a Retry-After header (seconds or HTTP date), falling back to `default`."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class LeonardoClient:
+    """
+    Pooled client for the Leonardo.Ai generations API.
+
+    One instance is meant to be shared by every pipeline in the process (see get_default_client),
+    so submits, status polls and image downloads all reuse the same keep-alive connections and
+    draw from the same rate-limit budget.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = config.LEONARDO_API_URL,
+        model_id: str = config.LEONARDO_MODEL_ID,
+        connect_timeout: float = config.LEONARDO_CONNECT_TIMEOUT,
+        read_timeout: float = config.LEONARDO_READ_TIMEOUT,
+        pool_size: int = config.LEONARDO_POOL_SIZE,
+        max_retries: int = config.LEONARDO_MAX_RETRIES,
+        poll_initial_delay: float = config.LEONARDO_POLL_INITIAL_DELAY,
+        poll_max_delay: float = config.LEONARDO_POLL_MAX_DELAY,
+        poll_timeout: float = config.LEONARDO_POLL_TIMEOUT,
+        requests_per_second: float = config.LEONARDO_REQUESTS_PER_SECOND,
+        burst: int = config.LEONARDO_BURST,
+    ):
+        self.api_key = api_key or os.getenv("LEONARDO_API_KEY")
+        if not self.api_key:
+            raise ValueError("API key is missing. Set the LEONARDO_API_KEY environment variable.")
+
+        self.base_url = base_url.rstrip("/")
+        self.model_id = model_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.poll_initial_delay = poll_initial_delay
+        self.poll_max_delay = poll_max_delay
+        self.poll_timeout = poll_timeout
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+
+        # One session with a connection pool large enough for every concurrent page.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def _auth_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def _request(self, method: str, url: str, rate_limited: bool = True, **kwargs) -> requests.Response:
+        """
+        Sends a request through the shared session.
+
+        API calls wait on the rate limiter; 429 and 5xx responses are retried (429s pause the
+        limiter for the server's Retry-After) up to max_retries times before the error is raised.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if rate_limited:
+                self.rate_limiter.acquire()
+            response = self.session.request(method, url, **kwargs)
+
+            if attempt < self.max_retries:
+                if response.status_code == 429:
+                    delay = _retry_after_seconds(response, default=2 ** attempt)
+                    print(f"⏳ Leonardo rate limit hit, waiting {delay:.1f}s")
+                    instrumentation.count("leonardo.rate_limited")
+                    instrumentation.count("leonardo.retries")
+                    self.rate_limiter.pause(delay)
+                    response.close()
+                    continue
+                if response.status_code >= 500:
+                    instrumentation.count("leonardo.retries")
+                    response.close()
+                    time.sleep(random.uniform(0, 2 ** attempt))
+                    continue
+
+            response.raise_for_status()
+            return response
+
+    def submit(
+        self,
+        prompt: str,
+        width: int = config.LEONARDO_IMAGE_WIDTH,
+        height: int = config.LEONARDO_IMAGE_HEIGHT,
+        guidance_scale: float = config.LEONARDO_GUIDANCE_SCALE,
+        num_inference_steps: int = config.LEONARDO_INFERENCE_STEPS,
+    ) -> str:
+        """Submits a generation job and returns its generationId."""
+        data = {
+            "prompt": prompt,
+            "modelId": self.model_id,
+            "num_images": 1,
+            "width": width,
+            "height": height,
+            "guidance_scale": guidance_scale,
+            "num_inference_steps": num_inference_steps,
+        }
+        try:
+            response = self._request("POST", f"{self.base_url}/generations", headers=self._auth_headers, json=data)
+            return response.json()["sdGenerationJob"]["generationId"]
+        except Exception as e:
+            raise RuntimeError(f"Failed to submit generation: {e}")
+
+    def get_image_url(self, generation_id: str) -> Optional[str]:
+        """
+        Checks a generation once.
+
+        Returns the first image URL when the generation is complete, None while it is still
+        running, and raises RuntimeError if Leonardo reports the generation as failed.
+        """
+        response = self._request("GET", f"{self.base_url}/generations/{generation_id}", headers=self._auth_headers)
+        generation = response.json().get("generations_by_pk") or {}
+        if generation.get("status") == "FAILED":
+            raise RuntimeError(f"Leonardo generation {generation_id} failed.")
+        images = generation.get("generated_images") or []
+        return images[0]["url"] if images else None
+
+    def poll_delays(self):
+        """Yields the wait before each status check: exponential backoff with jitter."""
+        attempt = 0
+        while True:
+            delay = min(self.poll_max_delay, self.poll_initial_delay * 2 ** attempt)
+            # "Equal jitter": keep at least half the delay so polls don't bunch up.
+            yield random.uniform(delay / 2, delay)
+            attempt += 1
+
+    def wait_for_image(self, generation_id: str) -> str:
+        """Polls a generation until it finishes and returns its image URL."""
+        deadline = time.monotonic() + self.poll_timeout
+        for delay in self.poll_delays():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            instrumentation.count("leonardo.poll_attempts")
+            try:
+                image_url = self.get_image_url(generation_id)
+            except requests.RequestException as e:
+                print(f"⚠️ Polling error: {e}")
+                instrumentation.count("leonardo.poll_errors")
+                continue  # Continue polling rather than giving up immediately
+            if image_url:
+                return image_url
+
+        raise TimeoutError("Leonardo image generation timed out.")
+
+    def generate(self, prompt: str, **params) -> str:
+        """Submits a prompt, waits for it to finish and returns the image URL."""
+        return self.wait_for_image(self.submit(prompt, **params))
+
+    def fetch(self, url: str, stream: bool = False) -> requests.Response:
+        """GETs a generated image (CDN requests don't count against the API rate limit)."""
+        return self._request("GET", url, rate_limited=False, stream=stream)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: Optional[LeonardoClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> LeonardoClient:
+    """Returns the process-wide LeonardoClient, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LeonardoClient()
+        return _default_client
@@ -0,0 +1,264 @@
+import heapq  # Outstanding jobs ordered by when they are next due for a status check
+import itertools  # Tie-breaker so jobs due at the same moment never get compared
+import threading  # The scheduler loop runs in one background thread
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor  # Futures handed back to callers
+from typing import Optional
+
+import requests  # Only for catching transient HTTP errors while polling
+
+import config  # Polling timeout and the number of status checks allowed in flight
+import hedging  # Learned completion times and each book's hedge budget
+import instrumentation  # Poll attempts are counted against the book that submitted the job
+from leonardo_client import LeonardoClient, get_default_client
+
+
+class _Request:
+    """
+    One image the caller asked for. It is normally served by a single generation, but a hedged
+    request has two racing for the same future: the first to finish resolves it.
+    """
+
+    def __init__(self, future: Future, prompt: Optional[str], params: dict, budget: Optional[hedging.HedgeBudget]):
+        self.future = future
+        self.prompt = prompt  # None for track(): a generation we didn't submit can't be duplicated
+        self.params = params
+        self.budget = budget
+        self.started = time.monotonic()
+        self.hedged = False
+        self.outstanding = 1  # Generations still being polled
+        self.lock = threading.Lock()
+
+
+class _Job:
+    """Book-keeping for one outstanding generation."""
+
+    def __init__(self, generation_id: str, request: _Request, delays, deadline: float, is_hedge: bool = False):
+        self.generation_id = generation_id
+        self.request = request
+        self.delays = delays  # This job's own backoff schedule
+        self.deadline = deadline
+        self.submitted = time.monotonic()
+        self.is_hedge = is_hedge
+        self.trace = instrumentation.current_trace()  # The submitting book's trace, if any
+
+
+class BatchPoller:
+    """
+    Tracks many Leonardo generations from a single scheduler loop.
+
+    Instead of every page thread sleeping in its own polling loop, callers submit a prompt (or an
+    existing generationId) and get a concurrent.futures.Future back. One background thread keeps
+    all outstanding jobs in a heap keyed by their next due time, hands due status checks to a small
+    fixed pool of HTTP workers, and resolves each future with the image URL when it is ready.
+    Every job keeps its own exponential backoff, so a process can hold hundreds of jobs in
+    flight with a handful of threads.
+
+    Hedging: every completion time is recorded in a LatencyTracker. A generation submitted while
+    its book has hedges left (hedging.book_budget()) that is still unfinished once
+    config.LEONARDO_HEDGE_PERCENTILE of recent completions of the same size had finished gets a
+    duplicate generation with the same prompt. The first of the two to finish resolves the future;
+    the other is no longer polled.
+    """
+
+    def __init__(
+        self,
+        client: Optional[LeonardoClient] = None,
+        poll_timeout: Optional[float] = None,
+        max_concurrent_checks: int = config.LEONARDO_POLLER_WORKERS,
+        latency_tracker: Optional[hedging.LatencyTracker] = None,
+        hedge_percentile: float = config.LEONARDO_HEDGE_PERCENTILE,
+    ):
+        self.client = client or get_default_client()
+        self.poll_timeout = poll_timeout if poll_timeout is not None else self.client.poll_timeout
+        self.latency = latency_tracker or hedging.get_default_latency_tracker()
+        self.hedge_percentile = hedge_percentile
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._checks = ThreadPoolExecutor(max_workers=max_concurrent_checks, thread_name_prefix="leonardo-poll")
+        self._thread = threading.Thread(target=self._run, name="leonardo-poller", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, **params) -> Future:
+        """
+        Submits a generation and returns a Future that resolves to its image URL. It may be hedged
+        if the calling book has hedges left (see hedging.book_budget()).
+        """
+        instrumentation.count("leonardo.image_requests")
+        generation_id = self.client.submit(prompt, **params)
+        return self._start(generation_id, prompt, params, hedging.current_budget())
+
+    def track(self, generation_id: str) -> Future:
+        """Starts polling an already-submitted generation and returns a Future for its image URL."""
+        return self._start(generation_id, None, {}, None)
+
+    def _start(self, generation_id: str, prompt: Optional[str], params: dict, budget) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        request = _Request(future, prompt, params, budget)
+        self._schedule(_Job(generation_id, request, self.client.poll_delays(), time.monotonic() + self.poll_timeout))
+        return future
+
+    def pending(self) -> int:
+        """Number of generations still waiting to finish."""
+        with self._cond:
+            return len(self._heap)
+
+    def close(self) -> None:
+        """Stops the scheduler loop and fails any job that has not finished yet."""
+        with self._cond:
+            self._closed = True
+            jobs = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for job in jobs:
+            self._resolve(job.request, error=RuntimeError("Leonardo poller was closed."))
+        self._thread.join()
+        self._checks.shutdown(wait=True)
+
+    def _latency_key(self, params: dict) -> str:
+        """Completion times are learned per image size and step count, which drive generation time."""
+        width = params.get("width", config.LEONARDO_IMAGE_WIDTH)
+        height = params.get("height", config.LEONARDO_IMAGE_HEIGHT)
+        steps = params.get("num_inference_steps", config.LEONARDO_INFERENCE_STEPS)
+        return f"{width}x{height}/{steps}"
+
+    def _hedge_at(self, job: _Job) -> Optional[float]:
+        """When the job's request should be hedged, or None if it can't be (yet)."""
+        request = job.request
+        if job.is_hedge or request.hedged or request.prompt is None:
+            return None
+        if request.budget is None or request.budget.used >= request.budget.max_hedges:
+            return None
+        threshold = self.latency.percentile(self._latency_key(request.params), self.hedge_percentile)
+        return None if threshold is None else request.started + threshold
+
+    def _schedule(self, job: _Job) -> None:
+        """Queues the job's next status check after its next backoff delay (or when it is due a hedge)."""
+        due = min(time.monotonic() + next(job.delays), job.deadline)
+        hedge_at = self._hedge_at(job)
+        if hedge_at is not None:
+            due = min(due, max(hedge_at, time.monotonic()))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Leonardo poller was closed.")
+            heapq.heappush(self._heap, (due, next(self._counter), job))
+            self._cond.notify()
+
+    def _run(self) -> None:
+        """Scheduler loop: waits for the earliest due job(s) and dispatches their status checks."""
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+
+            for job in due:
+                self._checks.submit(self._check, job)
+
+    def _check(self, job: _Job) -> None:
+        """Polls one generation once, then resolves, hedges or reschedules it."""
+        request = job.request
+        if request.future.done():  # Already resolved (the poller was closed, or the other generation won)
+            return
+        with instrumentation.tracing(job.trace):
+            instrumentation.count("leonardo.poll_attempts")
+            try:
+                image_url = self.client.get_image_url(job.generation_id)
+            except requests.RequestException as e:
+                print(f"⚠️ Polling error: {e}")
+                instrumentation.count("leonardo.poll_errors")
+                image_url = None  # Transient; keep polling until the deadline
+            except Exception as e:
+                self._job_failed(job, e)  # Leonardo reported the generation as failed
+                return
+
+            if image_url:
+                now = time.monotonic()
+                key = self._latency_key(request.params)
+                self.latency.record(key, now - job.submitted)
+                if self._resolve(request, result=image_url) and job.is_hedge:
+                    instrumentation.count("leonardo.hedge_wins")
+                    # Censored sample for the original that lost: it has taken at least this long.
+                    # Without it only the fast hedge is learned, and the threshold drifts too low.
+                    self.latency.record(key, now - request.started)
+                return
+            if time.monotonic() >= job.deadline:
+                # Censored sample: it took at least this long, which should still raise the percentile
+                self.latency.record(self._latency_key(request.params), self.poll_timeout)
+                self._job_failed(job, TimeoutError("Leonardo image generation timed out."))
+                return
+            self._maybe_hedge(job)
+
+        try:
+            self._schedule(job)
+        except RuntimeError as e:
+            self._resolve(request, error=e)
+
+    def _maybe_hedge(self, job: _Job) -> None:
+        """Submits a duplicate generation if the job's request is overdue and its book has a hedge left."""
+        hedge_at = self._hedge_at(job)
+        if hedge_at is None or time.monotonic() < hedge_at:
+            return
+        request = job.request
+        with request.lock:
+            if request.hedged or not request.budget.take():
+                return
+            request.hedged = True
+        try:
+            generation_id = self.client.submit(request.prompt, **request.params)
+        except Exception as e:
+            print(f"⚠️ Could not hedge a slow image generation: {e}")
+            return  # The original generation carries on alone
+        instrumentation.count("leonardo.hedges")
+        print(f"🪄 Image is slower than usual, racing a second generation ({generation_id}).")
+        with request.lock:
+            request.outstanding += 1
+        hedge = _Job(generation_id, request, self.client.poll_delays(), time.monotonic() + self.poll_timeout, is_hedge=True)
+        try:
+            self._schedule(hedge)
+        except RuntimeError:
+            pass  # Closing; close() fails the request
+
+    def _job_failed(self, job: _Job, error: BaseException) -> None:
+        """One generation failed: the request fails only if no other generation is still racing for it."""
+        request = job.request
+        with request.lock:
+            request.outstanding -= 1
+            last = request.outstanding <= 0
+        if last:
+            self._resolve(request, error=error)
+
+    @staticmethod
+    def _resolve(request: _Request, result: Optional[str] = None, error: Optional[BaseException] = None) -> bool:
+        """Settles the request's future; returns False if another thread already had."""
+        try:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+        except InvalidStateError:
+            return False  # Already resolved by another thread (e.g. close() racing a status check)
+        return True
+
+
+_default_poller: Optional[BatchPoller] = None
+_default_poller_lock = threading.Lock()
+
+
+def get_default_poller() -> BatchPoller:
+    """Returns the process-wide BatchPoller (built on the default client), creating it on first use."""
+    global _default_poller
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = BatchPoller()
+        return _default_poller
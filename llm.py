@@ -0,0 +1,162 @@
+import os
+import threading
+from typing import Callable, Iterator, List, Optional, Union
+
+import config  # Model defaults and completion cache settings
+import instrumentation  # LLM call timings, cache hits and token usage
+from completion_cache import CompletionCache, CompletionCacheMiss, SQLiteCompletionCache, make_key
+
+
+_default_cache: Optional[CompletionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_completion_cache() -> CompletionCache:
+    """Returns the process-wide SQLite completion cache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SQLiteCompletionCache()
+        return _default_cache
+
+
+def _openai():
+    """
+    Imports the openai package on first use: it pulls in aiohttp and takes ~0.3 s to load, which
+    commands that never call the API (--help, cached replays, PDF exports) shouldn't pay for.
+    """
+    import openai
+
+    if not openai.api_key:
+        openai.api_key = os.getenv("OPENAI_API_KEY")  # In case openai was imported before .env was loaded
+    return openai
+
+
+def _count_token_usage(response) -> None:
+    """Adds a completion's reported token usage to the openai.*_tokens counters."""
+    usage = response.get("usage") or {}
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        if usage.get(field):
+            instrumentation.count(f"openai.{field}", usage[field])
+
+
+def _cache_mode(mode: Optional[str]) -> str:
+    """The cache mode to use (config.COMPLETION_CACHE_MODE by default); a typo is an error, not "on"."""
+    mode = mode or config.COMPLETION_CACHE_MODE
+    if mode not in config.COMPLETION_CACHE_MODES:
+        raise ValueError(
+            f"Unknown completion cache mode {mode!r} (STORYBOOK_COMPLETION_CACHE); use one of {', '.join(config.COMPLETION_CACHE_MODES)}."
+        )
+    return mode
+
+
+def _validated(content: str, validate: Optional[Callable[[str], object]], cache: Optional[CompletionCache], key: Optional[str]) -> str:
+    """
+    Runs validate(content), if given. A reply that fails is dropped from the cache (when it came
+    from there), so the next run asks the API again instead of replaying it; the error propagates.
+    """
+    if validate is not None:
+        try:
+            validate(content)
+        except Exception:
+            if cache is not None:
+                cache.delete(key)
+            raise
+    return content
+
+
+def chat_completion(
+    prompt: Union[str, List[dict]],
+    model: str = config.OPENAI_MODEL,
+    temperature: float = config.OPENAI_TEMPERATURE,
+    cache: Optional[CompletionCache] = None,
+    mode: Optional[str] = None,
+    validate: Optional[Callable[[str], object]] = None,
+) -> str:
+    """
+    Sends a prompt to OpenAI's ChatCompletion API and returns the reply text.
+
+    Parameters:
+        prompt (str | List[dict]): A user message, or a full list of chat messages.
+        model (str): The chat model to use.
+        temperature (float): Sampling temperature.
+        cache (Optional[CompletionCache]): Cache to use; defaults to the process-wide cache.
+        mode (Optional[str]): "on" (use and fill the cache), "off" (always call the API) or
+            "replay" (only answer from the cache, raising CompletionCacheMiss on a miss).
+            Defaults to config.COMPLETION_CACHE_MODE.
+        validate (Optional[Callable]): Check run on the reply (e.g. a safety check) that raises if
+            it is unusable. Only replies that pass are cached, and a cached reply that no longer
+            passes is evicted, so one bad completion is never replayed.
+
+    Returns:
+        str: The stripped content of the first choice.
+    """
+    mode = _cache_mode(mode)
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+
+    if mode != "off":
+        cache = cache or get_default_completion_cache()
+        key = make_key(model, messages, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            instrumentation.count("completion_cache.hits")
+            return _validated(cached, validate, cache, key)
+        instrumentation.count("completion_cache.misses")
+        if mode == "replay":
+            raise CompletionCacheMiss(f"No cached completion for this {model} request (replay mode).")
+
+    with instrumentation.span("llm.completion", model=model):
+        response = _openai().ChatCompletion.create(model=model, messages=messages, temperature=temperature)
+    content = response["choices"][0]["message"]["content"].strip()
+    _count_token_usage(response)
+
+    _validated(content, validate, None, None)
+    if mode != "off":
+        cache.set(key, content)
+    return content
+
+
+def stream_chat_completion(
+    prompt: Union[str, List[dict]],
+    model: str = config.OPENAI_MODEL,
+    temperature: float = config.OPENAI_TEMPERATURE,
+    cache: Optional[CompletionCache] = None,
+    mode: Optional[str] = None,
+    validate: Optional[Callable[[str], object]] = None,
+) -> Iterator[str]:
+    """
+    Streaming version of chat_completion: yields the reply text as it arrives.
+
+    Uses the same cache and modes as chat_completion. A cached reply is yielded in one piece;
+    a streamed reply is stored in the cache once the stream completes. Joining and stripping the
+    yielded chunks gives exactly what chat_completion would return. validate runs on the whole
+    reply: before a cached reply is yielded, and at the end of a stream, before it is cached (it
+    raises out of the iteration, after the chunks were already yielded).
+    """
+    mode = _cache_mode(mode)
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+
+    if mode != "off":
+        cache = cache or get_default_completion_cache()
+        key = make_key(model, messages, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            instrumentation.count("completion_cache.hits")
+            yield _validated(cached, validate, cache, key)
+            return
+        instrumentation.count("completion_cache.misses")
+        if mode == "replay":
+            raise CompletionCacheMiss(f"No cached completion for this {model} request (replay mode).")
+
+    # Streamed responses carry no usage block, so only the call's duration is recorded
+    parts = []
+    with instrumentation.span("llm.completion", model=model, stream=True):
+        for chunk in _openai().ChatCompletion.create(model=model, messages=messages, temperature=temperature, stream=True):
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    content = _validated("".join(parts).strip(), validate, None, None)
+    if mode != "off":
+        cache.set(key, content)
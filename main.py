@@ -1,80 +1,80 @@
 # === Import necessary libraries and local modules ===
 from dotenv import load_dotenv  # Loads environment variables from .env file
 import os
-import openai  # OpenAI API for character and story generation
 from character_prompt import character_prompt  # Custom module to generate character prompt
 from story_prompt import story_prompt  # Custom module to generate story prompt
+from book_prompt import book_prompt  # Character and pre-split pages in one JSON reply
 from image_prompt import image_prompt  # Custom module to create image prompts
-from utils import split_story_into_pages  # Utility to split a story into multiple pages
+from utils import split_story_into_pages, StreamingPageSplitter, parse_book_json, BookReplyError  # Split a story into pages (all at once, while streaming, or from JSON)
 import config  # (Assumed) configuration file for global settings
-from saftey import validate_safe_input  # Function to check if input is safe (e.g., no bad content)
+from saftey import validate_safe_input, validate_safe_output  # Safety checks for user input and generated content
 from story_title_prompt import story_title_prompt  # Unused in this script but potentially helpful
-from IPython.display import Image, display  # Used to visually display generated images in notebooks
+from image_stage import generate_page_images, collect_page_images  # Renders page illustrations concurrently
+from llm import chat_completion, stream_chat_completion  # Cached OpenAI ChatCompletion calls
+from concurrent.futures import Future, ThreadPoolExecutor  # Starts page images while the story is still streaming
+from contextlib import contextmanager
+from typing import Callable, Optional
 
 # === Load API keys from .env file ===
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")  # Set OpenAI API key
+load_dotenv()  # OPENAI_API_KEY is picked up when llm.py first imports openai
 LEONARDO_API_KEY = os.getenv("LEONARDO_API_KEY")  # Set Leonardo API key for image generation
 
 # === Set up configuration for Leonardo image model ===
-MODEL_ID = "e316348f-7773-490e-adcd-46757c738eb7"  # Specific model ID for Leonardo Creative v2
+MODEL_ID = config.LEONARDO_MODEL_ID  # Specific model ID for Leonardo Creative v2
 
-import requests  # Used for making HTTP requests to Leonardo.Ai
-import time  # Used for polling/waiting between image generation checks
-from datetime import datetime  # Used to generate unique filenames for image saving
+from image_download import download_image_file  # Streaming, atomic image downloads
+from image_cache import ImageCache, get_default_image_cache  # Reuses images for identical prompts
+from checkpoint import BookManifest  # Per-book checkpoints so interrupted runs can resume
+import instrumentation  # Per-stage timings, counters and per-book traces
+import hedging  # Each book may race a few duplicate generations against slow images
+from render_profiles import get_render_profile, image_params  # Draft/final illustration settings
+from visual_signature import clean_visual_signature, derive_visual_signature, heuristic_visual_signature  # Short character looks for image prompts
 
-def generate_image(prompt: str) -> str:
+def generate_image(prompt: str, force_regenerate: bool = False, profile: Optional[str] = None) -> str:
     """
     Sends a prompt to Leonardo.Ai to generate an image, waits for completion, and downloads it.
     Returns the local path to the saved image.
+
+    Images are cached on disk by prompt and generation settings, so an identical request is served
+    from the cache without calling Leonardo. Pass force_regenerate=True to bypass the cache.
+    profile names the render profile in config.RENDER_PROFILES (default: config.DEFAULT_RENDER_PROFILE).
     """
+    if not force_regenerate:
+        cached_path = find_cached_image(prompt, profile)
+        if cached_path:
+            return cached_path
+    future = submit_image(prompt, profile)
+    with instrumentation.span("image.poll"):
+        image_url = future.result()
+    return store_image(prompt, profile, image_url)
+
+# generate_image in three steps, so the service can await the poll instead of blocking a thread on it
+
+def _image_cache_key(prompt: str, profile: Optional[str]) -> str:
+    return ImageCache.make_key(prompt, MODEL_ID, **image_params(profile))
+
+def find_cached_image(prompt: str, profile: Optional[str] = None) -> Optional[str]:
+    """The cached illustration for this prompt and render profile, or None."""
+    return get_default_image_cache().get(_image_cache_key(prompt, profile))
+
+def submit_image(prompt: str, profile: Optional[str] = None) -> Future:
+    """Submits a generation with the render profile's parameters; returns a Future for its image URL."""
+    from leonardo_poller import get_default_poller  # One loop polls every outstanding generation (loads requests on first use)
+
     # Make sure API key exists
     if not LEONARDO_API_KEY:
         raise ValueError("API key is missing. Set the LEONARDO_API_KEY environment variable.")
 
-    # Endpoint and headers for the Leonardo API
-    url = "https://cloud.leonardo.ai/api/rest/v1/generations"
-    headers = {
-        "Authorization": f"Bearer {LEONARDO_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # Image generation parameters
-    data = {
-        "prompt": prompt,
-        "modelId": MODEL_ID,
-        "num_images": 1,
-        "width": 1024,
-        "height": 1024,
-        "guidance_scale": 8,  # Controls how closely image follows the prompt
-        "num_inference_steps": 30  # Number of steps for generating the image
-    }
-
+    # The shared poller submits through the pooled client and tracks the job in its single polling loop
     print(f"🖼️ Sending to Leonardo: {prompt[:100]}...")  # Truncated for readability
-    try:
-        # Submit image generation job
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        generation_id = response.json()["sdGenerationJob"]["generationId"]
-    except Exception as e:
-        raise RuntimeError(f"Failed to submit generation: {e}")
-
-    # === Polling the API to check when image generation is complete ===
-    status_url = f"https://cloud.leonardo.ai/api/rest/v1/generations/{generation_id}"
-    for _ in range(20):  # Try polling every 2 seconds, up to 40 seconds
-        time.sleep(2)
-        try:
-            status_response = requests.get(status_url, headers=headers)
-            status_response.raise_for_status()
-            images = status_response.json().get("generations_by_pk", {}).get("generated_images", [])
-            if images:
-                image_url = images[0]["url"]
-                return download_image(image_url)
-        except Exception as e:
-            print(f"⚠️ Polling error: {e}")
-            continue  # Continue polling rather than giving up immediately
-
-    raise TimeoutError("Leonardo image generation timed out.")
+    with instrumentation.span("image.submit"):
+        return get_default_poller().submit(prompt, **image_params(profile))
+
+def store_image(prompt: str, profile: Optional[str], image_url: str) -> str:
+    """Downloads a finished generation into the image cache and returns its local path."""
+    with instrumentation.span("image.download"):
+        path = download_image(image_url)
+    return get_default_image_cache().put(_image_cache_key(prompt, profile), path)
 
 def download_image(url: str, folder_name="leonardo_images") -> str:
     """
@@ -84,79 +84,459 @@ def download_image(url: str, folder_name="leonardo_images") -> str:
     # Determine local folder path in the user's home directory
     home_dir = os.path.expanduser("~")
     folder_path = os.path.join(home_dir, folder_name)
-    os.makedirs(folder_path, exist_ok=True)  # Create folder if it doesn't exist
-
-    # Generate a unique filename using timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(folder_path, f"leonardo_image_{timestamp}.png")
 
     try:
-        # Download and save image
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(filename, "wb") as f:
-            f.write(response.content)
+        # Stream straight to disk under a unique name (no decoding or re-encoding of the image)
+        filename = download_image_file(url, folder=folder_path, prefix="leonardo_image")
         print(f"💾 Image saved to: {filename}")
         return filename
     except Exception as e:
         raise RuntimeError(f"Failed to download image: {e}")
 
-def run_story_pipeline(title: str, genre: str, age_group: str = "5–10"):
+def split_into_illustrated_pages(story: str, appearance: str, total_pages: int) -> list:
+    """
+    Splits the story into pages, checks every page's text and attaches its image prompt.
+    appearance is the book's visual signature of the main character (see visual_signature.py).
+    """
+    pages = split_story_into_pages(story, total_pages=total_pages)
+    for page in pages:
+        validate_safe_output(page["text"], f"page {page['page']}")
+        page["image_prompt"] = image_prompt(appearance, page["text"])  # Create image prompt
+    return pages
+
+# === Pipeline stages ===
+# Each stage is checkpointed in the book's manifest and returns the stored result when resuming.
+# run_story_pipeline calls them directly; service.py runs the same functions on its thread pool.
+
+def open_book(title: str, genre: str, age_group: str, checkpoint_dir=config.CHECKPOINT_DIR, profile: Optional[str] = None):
+    """
+    Opens (or resumes) the book's manifest and settles its render profile (see
+    BookManifest.settle_profile): a book with illustrations keeps the profile they were made with.
+    Returns (manifest, profile).
+    """
+    if profile:
+        get_render_profile(profile)  # Fail fast on an unknown profile, before any API call
+    manifest = BookManifest.for_book(title, genre, age_group, directory=checkpoint_dir)
+    return manifest, manifest.settle_profile(profile)
+
+@contextmanager
+def book_run(manifest, title: str, **attrs):
+    """Traces the block as one book (trace.json beside the manifest) and gives it its own hedge budget."""
+    trace_path = os.path.join(os.path.dirname(manifest.path), "trace.json") if manifest.path else None
+    with instrumentation.book_trace(title, trace_path, **attrs) as trace, hedging.book_budget():
+        yield trace
+
+def structured_stage(manifest, title: str, genre: str, age_group: str, total_pages: int) -> None:
+    """Steps 1–3 in one call: checkpoints character, signature, story and pages from one JSON reply, if it parses."""
+    if manifest.get("character") is not None:
+        return
+    with instrumentation.span("book"):
+        book = generate_structured_book(title, genre, age_group, total_pages)
+    if book:
+        # Checkpointed like the separate stages, so the steps below just resume from them
+        for name in ("character", "visual_signature", "story", "pages"):
+            manifest.set(name, book[name])
+        print(f"✅ Character and {total_pages} pages written in one call.")
+
+def character_stage(manifest, title: str, genre: str, age_group: str) -> str:
+    """Step 1: a character based on title and genre."""
+    char_msg = character_prompt(title, genre, age_group)
+    with instrumentation.span("character"):
+        character = manifest.stage(
+            "character", lambda: chat_completion(char_msg, validate=lambda reply: validate_safe_output(reply, "character"))  # Cached on re-runs
+        )
+    print(f"\n✅ Character Created:\n{character}\n")
+    return character
+
+def visual_signature_stage(manifest, character: str) -> str:
+    """Step 1b: the short visual signature of the character used in every image prompt."""
+    return manifest.stage("visual_signature", lambda: derive_visual_signature(character))
+
+def story_stage(manifest, title: str, genre: str, character: str, total_pages: int) -> str:
+    """Step 2: the story with the character."""
+    story_msg = story_prompt(title, genre, character, total_pages=total_pages)
+    with instrumentation.span("story"):
+        story = manifest.stage(
+            "story", lambda: chat_completion(story_msg, validate=lambda reply: validate_safe_output(reply, "story"))  # Cached on re-runs
+        )
+    print("✅ Story Generated.\n")
+    return story
+
+def pages_stage(manifest, story: str, appearance: Callable[[], str], total_pages: int) -> list:
+    """Step 3: the story divided into pages with image prompts. appearance() returns the visual signature."""
+    with instrumentation.span("split"):
+        return manifest.stage("pages", lambda: split_into_illustrated_pages(story, appearance(), total_pages))
+
+def pages_to_render(manifest, force_regenerate: bool = False) -> list:
+    """Step 4's pages: those without an image, or every page with force_regenerate (so it works on a finished book too)."""
+    return list(manifest.get("pages") or []) if force_regenerate else manifest.pages_missing_images()
+
+def _start_visual_signature(manifest, character: str) -> Future:
+    """
+    Loads the book's visual signature from its checkpoint, or derives it on a background thread so
+    the extra LLM call overlaps the story call. Returns a future for the signature.
+    """
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="visual-signature")
+    future = pool.submit(instrumentation.bind(visual_signature_stage), manifest, character)
+    pool.shutdown(wait=False)  # The thread exits once the signature is done
+    return future
+
+def _illustrated_book(reply: str, total_pages: int) -> dict:
+    """
+    Parses a reply to book_prompt, checks all of its text and attaches the image prompts.
+    Raises BookReplyError if the reply can't be used and ValueError if its content is unsafe.
+    """
+    book = parse_book_json(reply, total_pages)
+    character = validate_safe_output(book["character"], "character")
+    # No extra round trip for the signature: use the reply's own, or the description's visual sentences
+    appearance = clean_visual_signature(book["appearance"]) or heuristic_visual_signature(character)
+    validate_safe_output(appearance, "visual signature")
+    for page in book["pages"]:
+        validate_safe_output(page["text"], f"page {page['page']}")
+        page["image_prompt"] = image_prompt(appearance, page["text"])
+    return {"character": character, "visual_signature": appearance, "story": book["story"], "pages": book["pages"]}
+
+def generate_structured_book(title: str, genre: str, age_group: str, total_pages: int):
+    """
+    Writes the character, its visual signature and every page with a single LLM call (see book_prompt).
+    Returns {"character", "visual_signature", "story", "pages"} with image prompts attached, or None if the reply
+    couldn't be parsed, in which case the caller falls back to separate character and story calls.
+    Unsafe content raises ValueError like the two-call path does. Only a usable, safe reply is cached.
+    """
+    try:
+        reply = chat_completion(
+            book_prompt(title, genre, age_group=age_group, total_pages=total_pages),
+            validate=lambda reply: _illustrated_book(reply, total_pages),
+        )
+    except BookReplyError as e:
+        instrumentation.count("structured_book.fallbacks")
+        print(f"⚠️ Structured reply unusable ({e}); falling back to separate character and story calls.")
+        return None
+    return _illustrated_book(reply, total_pages)
+
+def _stream_story_with_images(
+    story_msg, appearance, total_pages, max_images_in_flight, on_progress, force_regenerate, image_executor=None,
+    on_story=None, profile=None,
+):
+    """
+    Streams the story and starts each page's illustration as soon as that page is complete,
+    so LLM latency overlaps with image latency. appearance is a future for the book's visual signature.
+    Pages started early are only kept if they match the final split; any others are re-rendered.
+    on_story, if given, is called as on_story(story, pages) once the full story has been split.
+    Returns (story, pages).
+    """
+    splitter = StreamingPageSplitter(total_pages)
+    own_pool = image_executor is None
+    pool = ThreadPoolExecutor(max_workers=max_images_in_flight, thread_name_prefix="page-image") if own_pool else image_executor
+    try:
+        started = {}  # image prompt -> future, for pages started before the story finished
+
+        def start(prompt):
+            return pool.submit(instrumentation.bind(generate_image), prompt, force_regenerate, profile)
+
+        # The whole story is safety-checked at the end of the stream, before it is cached
+        for chunk in stream_chat_completion(story_msg, validate=lambda story: validate_safe_output(story, "story")):
+            for page in splitter.feed(chunk):
+                validate_safe_output(page["text"], f"page {page['page']}")  # Never illustrate unsafe text
+                prompt = image_prompt(appearance.result(), page["text"])
+                print(f"⚡ Page {page['page']} written, starting its image early.")
+                started[prompt] = start(prompt)
+
+        story = splitter.text.strip()
+        print("✅ Story Generated.\n")
+
+        # The final split is authoritative; reuse early images only where the page text matches
+        pages = splitter.finish()
+        futures = {}
+        for page in pages:
+            page["image_prompt"] = image_prompt(appearance.result(), page["text"])
+            page["profile"] = profile
+            future = started.pop(page["image_prompt"], None) or start(page["image_prompt"])
+            futures[future] = page
+
+        if on_story:
+            on_story(story, pages)
+
+        for stale in started.values():
+            stale.cancel()  # Early pages that didn't survive the final split
+
+        collect_page_images(futures, on_progress)
+    finally:
+        if own_pool:
+            pool.shutdown(wait=True)
+
+    return story, pages
+
+def _render_missing_pages(
+    manifest, max_images_in_flight, on_progress, force_regenerate, image_executor=None, profile=None, pages=None,
+):
+    """
+    Generates images for the manifest's pages that don't have one yet (or for `pages`, if given),
+    with the render profile `profile`, checkpointing each page as it finishes.
+    """
+    def record_progress(page, done, total):
+        manifest.record_page_image(page)  # Persist every finished page straight away
+        if on_progress:
+            on_progress(page, done, total)
+
+    # Failed pages end up with image_url = None; page order is preserved
+    missing = pages_to_render(manifest) if pages is None else pages
+    for page in missing:
+        page["profile"] = profile  # Checkpointed with the image, so a draft page can be told from a final one
+    with instrumentation.span("images", pages=len(missing), profile=profile):
+        generate_page_images(
+            missing,
+            lambda page: generate_image(page["image_prompt"], force_regenerate, profile),  # Generate and download image
+            max_in_flight=max_images_in_flight,
+            on_progress=record_progress,
+            executor=image_executor,
+        )
+
+def run_story_pipeline(
+    title: str,
+    genre: str,
+    age_group: str = "5–10",
+    max_images_in_flight: int = config.MAX_IMAGES_IN_FLIGHT,
+    on_progress=None,
+    force_regenerate: bool = False,
+    total_pages: int = 5,
+    stream: bool = False,
+    image_executor=None,
+    checkpoint_dir=config.CHECKPOINT_DIR,
+    structured: bool = config.STRUCTURED_GENERATION,
+    profile: Optional[str] = None,
+    character: Optional[str] = None,
+    visual_signature: Optional[str] = None,
+):
     """
     Generates a complete storybook including:
     1. Character generation
     2. Story creation
     3. Splitting the story into pages
-    4. Image generation per page
+    4. Image generation per page (up to max_images_in_flight pages at once)
+
+    on_progress, if given, is called as on_progress(page, done, total) after each page image finishes.
+    force_regenerate=True skips the image cache and pays for fresh illustrations of every page, even
+    pages a checkpointed run already illustrated.
+    stream=True streams the story and starts illustrating each page as soon as it has been written.
+    image_executor, if given, is a shared executor that renders the images (so several books share one
+    concurrency budget); max_images_in_flight then no longer applies.
+    structured=True asks for the character and all pages in one JSON reply, saving a round trip and the
+    page-splitting step (stream is then ignored); if the reply doesn't parse, steps 1–3 run as usual.
+    profile picks the render profile ("draft" for quick low-res previews, "final"); a resumed book keeps
+    the profile its illustrations were made with, even if another is passed. Approved draft pages are
+    re-rendered at final quality with promote_pages.
+    character (and optionally its visual_signature) reuses an existing character instead of writing a
+    new one, as run_series_pipeline does for every book of a series; the structured call is then skipped.
+
+    Every completed stage is checkpointed to a per-book manifest under checkpoint_dir, and a re-run of
+    the same title/genre/age_group resumes from it, skipping finished stages and pages.
+    Pass checkpoint_dir=None to disable checkpointing.
+    Stage timings and counters (poll attempts, retries, cache hits, tokens) are written to trace.json
+    in the same folder; see instrumentation.py.
     """
     # Optional: Validate input for safety (e.g., avoid harmful prompts)
     if not validate_safe_input(title) or not validate_safe_input(genre):
         raise ValueError("Unsafe input detected. Please revise your title/genre.")
 
-    # === Step 1: Generate a character based on title and genre ===
-    char_msg = character_prompt(title, genre, age_group)
-    char_response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": char_msg}],
-        temperature=0.7
-    )
-    character = char_response.choices[0].message["content"].strip()
-    print(f"\n✅ Character Created:\n{character}\n")
+    manifest, profile = open_book(title, genre, age_group, checkpoint_dir, profile)
+    if character and manifest.get("character") is None:
+        # Checkpointed as if step 1 (and 1b) had run, so the steps below pick them up
+        manifest.set("character", validate_safe_output(character, "character"))
+        visual_signature = clean_visual_signature(visual_signature or "")
+        if visual_signature:
+            manifest.set("visual_signature", visual_signature)
+    elif character and manifest.get("character") != character:
+        # Resuming would silently keep the old character, e.g. a book that no longer matches its series
+        raise ValueError(
+            f"'{title}' was checkpointed with a different character. Pass that character, "
+            f"or delete the checkpoint at {manifest.path} to start the book over."
+        )
 
-    # === Step 2: Create the story with the character ===
-    story_msg = story_prompt(title, genre, character)
-    story_response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": story_msg}],
-        temperature=0.7
-    )
-    story = story_response.choices[0].message["content"].strip()
-    print("✅ Story Generated.\n")
+    # Timings and counters for every stage land in trace.json beside the manifest
+    with book_run(manifest, title, genre=genre, age_group=age_group, stream=stream, profile=profile):
+        # === Steps 1–3 in one call (optional): character, story and pages from a single JSON reply ===
+        if structured:
+            structured_stage(manifest, title, genre, age_group, total_pages)
 
-    # === Step 3: Divide story into 5 logical pages ===
-    pages = split_story_into_pages(story, total_pages=5)
+        # === Step 1: Generate a character based on title and genre ===
+        character = character_stage(manifest, title, genre, age_group)
 
-    # === Step 4: Generate one image per page ===
-    for page in pages:
-        page["image_prompt"] = image_prompt(character, page["text"])  # Create image prompt
-        try:
-            page["image_url"] = generate_image(page["image_prompt"])  # Generate and download image
-            print(f"✅ Page {page['page']} image generated.")
-        except Exception as e:
-            print(f"❌ Page {page['page']} image failed: {e}")
-            page["image_url"] = None  # Handle failure gracefully
-
-    # Return full storybook data
-    return {
-        "title": title,
-        "genre": genre,
-        "character": character,
-        "story": story,
-        "pages": pages
-    }
+        # === Step 1b: Short visual signature of the character for the image prompts (while the story is written) ===
+        appearance = _start_visual_signature(manifest, character) if manifest.get("pages") is None else None
+
+        # === Step 2: Create the story with the character ===
+        if stream and manifest.get("story") is None:
+            story_msg = story_prompt(title, genre, character, total_pages=total_pages)
+            # Steps 2–4 overlap: pages are split and illustrated while the story is still arriving
+            def checkpoint_story(story, pages):
+                manifest.set("story", story)
+                manifest.set("pages", pages)
+
+            def record_progress(page, done, total):
+                manifest.record_page_image(page)
+                if on_progress:
+                    on_progress(page, done, total)
+
+            with instrumentation.span("story_and_images"):
+                _stream_story_with_images(
+                    story_msg, appearance, total_pages, max_images_in_flight, record_progress, force_regenerate,
+                    image_executor, on_story=checkpoint_story, profile=profile,
+                )
+            return manifest.storybook()
+
+        story = story_stage(manifest, title, genre, character, total_pages)
+
+        # === Step 3: Divide story into logical pages ===
+        pages_stage(manifest, story, lambda: appearance.result(), total_pages)
+
+        # === Step 4: Generate one image per page (that doesn't have one yet), several pages at a time ===
+        pages = pages_to_render(manifest, force_regenerate)
+        _render_missing_pages(manifest, max_images_in_flight, on_progress, force_regenerate, image_executor, profile, pages)
+
+        # Return full storybook data
+        return manifest.storybook()
+
+def regenerate_missing_pages(
+    manifest_path: str,
+    max_images_in_flight: int = config.MAX_IMAGES_IN_FLIGHT,
+    on_progress=None,
+    force_regenerate: bool = False,
+):
+    """
+    Re-renders only the pages of a checkpointed book whose image_url is None, so one failed page
+    doesn't cost a whole book. manifest_path is the "manifest" entry of a returned storybook.
+    Returns the updated storybook.
+    """
+    manifest = BookManifest.load(manifest_path)
+    missing = manifest.pages_missing_images()
+    print(f"🔁 Regenerating {len(missing)} page image(s) for '{manifest.get('title')}'.")
+    with hedging.book_budget():
+        _render_missing_pages(manifest, max_images_in_flight, on_progress, force_regenerate, profile=manifest.get("profile"))
+    return manifest.storybook()
+
+def promote_pages(
+    manifest_path: str,
+    approved_pages=None,
+    profile: str = "final",
+    max_images_in_flight: int = config.MAX_IMAGES_IN_FLIGHT,
+    on_progress=None,
+):
+    """
+    Re-renders the approved pages of a (draft) book with a better render profile, keeping their text
+    and image prompts. approved_pages is a list of page numbers (None: every page not already rendered
+    with `profile`). A page whose new render fails keeps its draft image, so the book stays complete;
+    it is reported with image_url None to on_progress and can simply be promoted again.
+    Returns the updated storybook. Its "profile" becomes `profile` only once every page has been
+    rendered with it; a partial promotion leaves the book's profile as it was.
+    """
+    get_render_profile(profile)
+    manifest = BookManifest.load(manifest_path)
+    pages = manifest.get("pages") or []
+    if approved_pages is None:
+        approved_pages = [page["page"] for page in pages if page.get("profile") != profile]
+    unknown = set(approved_pages) - {page["page"] for page in pages}
+    if unknown:
+        raise ValueError(f"No such page(s) in this book: {sorted(unknown)}")
+
+    # Render into copies, so a failed render never overwrites the approved draft image
+    promoted = [dict(page, profile=profile) for page in pages if page["page"] in set(approved_pages)]
+    print(f"⬆️ Promoting {len(promoted)} page(s) of '{manifest.get('title')}' to the '{profile}' profile.")
+
+    def record_progress(page, done, total):
+        if page["image_url"]:
+            manifest.record_page_image(page)
+        if on_progress:
+            on_progress(page, done, total)
+
+    with instrumentation.span("promote", pages=len(promoted), profile=profile), hedging.book_budget():
+        generate_page_images(
+            promoted,
+            lambda page: generate_image(page["image_prompt"], False, profile),
+            max_in_flight=max_images_in_flight,
+            on_progress=record_progress,
+        )
+    if all(page.get("profile") == profile for page in manifest.get("pages") or []):
+        manifest.set("profile", profile)  # The whole book is now at this quality; re-renders use it too
+    return manifest.storybook()
+
+def run_series_pipeline(
+    titles,
+    genre: str,
+    age_group: str = "5–10",
+    character: Optional[str] = None,
+    series_title: Optional[str] = None,
+    max_images_in_flight: int = config.MAX_IMAGES_IN_FLIGHT,
+    books_in_flight: Optional[int] = None,
+    on_progress=None,
+    **book_options,
+):
+    """
+    Generates several books about the same character at once.
+
+    The character is written once (from series_title, or the first title), unless an existing
+    character description is passed, and its visual signature is derived once; every book then
+    reuses both, so all pages of all books share one character prompt fragment. The books' story
+    calls run concurrently (books_in_flight at a time, default all of them) and all their pages are
+    illustrated from one shared image pool of max_images_in_flight, so the series takes about as
+    long as its slowest book. on_progress, if given, is called as on_progress(title, page, done, total).
+    Other keyword arguments (total_pages, stream, profile, ...) go to every run_story_pipeline call;
+    image_executor and visual_signature are set by the series itself and can't be passed. Titles must
+    be unique (two books with the same title would share one checkpoint), and a book checkpointed with
+    a different character than the series' fails rather than silently keeping it.
+
+    Returns {"character", "visual_signature", "books"}, with one storybook per title in order; a
+    book that failed is {"title": ..., "error": ...} instead, so it doesn't cost the rest of the series.
+    """
+    titles = list(titles)
+    if not titles:
+        raise ValueError("A series needs at least one title.")
+    duplicates = sorted({title for title in titles if titles.count(title) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate title(s) in the series: {', '.join(duplicates)}")
+    managed = sorted({"image_executor", "visual_signature"} & set(book_options))
+    if managed:
+        # Every book must use the series' shared image pool and character signature
+        raise TypeError(f"run_series_pipeline() sets {', '.join(managed)} itself; don't pass it.")
+    for title in [series_title or titles[0], *titles, genre]:
+        if not validate_safe_input(title):
+            raise ValueError("Unsafe input detected. Please revise your titles/genre.")
+
+    with instrumentation.span("series.character"):
+        if character is None:
+            character = chat_completion(
+                character_prompt(series_title or titles[0], genre, age_group),
+                validate=lambda reply: validate_safe_output(reply, "character"),
+            )
+        signature = derive_visual_signature(character)
+    print(f"\n✅ Series Character:\n{character}\n🎨 {signature}\n")
+
+    def run_book(title):
+        progress = (lambda page, done, total: on_progress(title, page, done, total)) if on_progress else None
+        return run_story_pipeline(
+            title, genre, age_group, on_progress=progress, image_executor=image_pool,
+            character=character, visual_signature=signature, **book_options,
+        )
+
+    books = []
+    with ThreadPoolExecutor(max_workers=max_images_in_flight, thread_name_prefix="series-image") as image_pool, \
+            ThreadPoolExecutor(max_workers=books_in_flight or len(titles), thread_name_prefix="series-book") as book_pool:
+        futures = [book_pool.submit(instrumentation.bind(run_book), title) for title in titles]
+        for title, future in zip(titles, futures):
+            try:
+                books.append(future.result())
+            except Exception as e:
+                print(f"❌ '{title}' failed: {e}")
+                books.append({"title": title, "error": str(e)})
+    return {"character": character, "visual_signature": signature, "books": books}
 
 # === CLI Entry Point ===
 if __name__ == "__main__":
+    try:
+        from IPython.display import Image, display  # Shows images inline when run inside IPython/Jupyter
+    except ImportError:
+        display = None  # Plain terminal: print the image paths instead
+
     print("📚 Welcome to the Storybook Creator!")
 
     # Get user input for story title and genre
@@ -174,7 +554,9 @@ if __name__ == "__main__":
         # Print each page's text and show its image if available
         for page in storybook["pages"]:
             print(f"\n📖 Page {page['page']}:\n{page['text']}")
-            if page["image_url"]:
+            if page["image_url"] and display:
                 display(Image(filename=page["image_url"]))  # Display image from local file
+            elif page["image_url"]:
+                print(f"🖼️ {page['image_url']}")
             else:
                 print("⚠️ No image found.")
@@ -0,0 +1,267 @@
+import io
+import os
+from functools import lru_cache  # Fonts are loaded once per (path, size), not once per page
+from itertools import repeat
+from concurrent.futures import Executor  # Optional process pool for rendering pages
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+import config  # Page size, font and JPEG settings for exported PDFs
+
+
+@lru_cache(maxsize=8)
+def load_font(font_path: str = config.PDF_FONT_PATH, size: int = config.PDF_FONT_SIZE):
+    """Loads a TrueType font once and reuses it; falls back to Pillow's built-in font if missing."""
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+class TextLayout:
+    """
+    Word-wraps page text for one font, caching the measured width of every word it has seen.
+
+    Stories reuse the same vocabulary page after page, so after the first few pages almost every
+    width comes from the cache instead of asking FreeType to measure the glyphs again.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self._widths = {}
+        self.space_width = self.width(" ")
+        ascent, descent = font.getmetrics() if hasattr(font, "getmetrics") else (font.size, 0)
+        self.line_height = int((ascent + descent) * 1.25)
+
+    def width(self, word: str) -> float:
+        width = self._widths.get(word)
+        if width is None:
+            width = self._widths[word] = self.font.getlength(word)
+        return width
+
+    def wrap(self, text: str, max_width: float) -> list:
+        """Greedy word wrap of `text` into lines no wider than max_width (long words get their own line)."""
+        lines = []
+        current, current_width = [], 0.0
+        for word in text.split():
+            word_width = self.width(word)
+            extra = word_width if not current else self.space_width + word_width
+            if current and current_width + extra > max_width:
+                lines.append(" ".join(current))
+                current, current_width = [word], word_width
+            else:
+                current.append(word)
+                current_width += extra
+        if current:
+            lines.append(" ".join(current))
+        return lines
+
+
+@lru_cache(maxsize=16)
+def _text_layout(font_path: str, font_size: int) -> TextLayout:
+    """One TextLayout per (font, size) per process, so word widths stay cached across pages and books."""
+    return TextLayout(load_font(font_path, font_size))
+
+
+class StreamingPdfWriter:
+    """
+    Writes a PDF one page at a time, straight to disk.
+
+    Each page is a single full-page JPEG (embedded as-is with DCTDecode, so nothing is re-encoded by
+    the writer). Only the byte offsets of written objects are kept in memory, so memory use does not
+    grow with the number of pages. Use as a context manager or call close() to finish the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3  # 1 = catalog, 2 = page tree (written at the end)
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _begin_object(self, object_id: int) -> None:
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f"{object_id} 0 obj\n".encode("ascii"))
+
+    def _write_object(self, object_id: int, body: bytes) -> None:
+        self._begin_object(object_id)
+        self._file.write(body + b"\nendobj\n")
+
+    def _write_stream(self, object_id: int, dictionary: str, data: bytes) -> None:
+        self._begin_object(object_id)
+        self._file.write(f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode("ascii"))
+        self._file.write(data)
+        self._file.write(b"\nendstream\nendobj\n")
+
+    def add_jpeg_page(self, jpeg: bytes, pixel_size: Tuple[int, int], page_size: Tuple[float, float]) -> None:
+        """Adds a page showing one JPEG (pixel_size = its width/height) stretched over page_size points."""
+        image_id, content_id, page_id = self._next_id, self._next_id + 1, self._next_id + 2
+        self._next_id += 3
+        width, height = page_size
+
+        self._write_stream(
+            image_id,
+            f"/Type /XObject /Subtype /Image /Width {pixel_size[0]} /Height {pixel_size[1]} "
+            "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode",
+            jpeg,
+        )
+        self._write_stream(content_id, "", f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q".encode("ascii"))
+        self._write_object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+                f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode("ascii"),
+        )
+        self._page_ids.append(page_id)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode("ascii"))
+
+        xref_offset = self._file.tell()
+        size = self._next_id
+        self._file.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode("ascii"))
+        for object_id in range(1, size):
+            self._file.write(f"{self._offsets[object_id]:010d} 00000 n \n".encode("ascii"))
+        self._file.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+        self._file.close()
+
+    def __enter__(self) -> "StreamingPdfWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def render_page_jpeg(
+    image_path: str,
+    text: str,
+    layout: Optional[TextLayout],
+    max_pixels: Optional[int] = None,
+    quality: int = config.PDF_JPEG_QUALITY,
+) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    Produces the JPEG for one PDF page: the illustration, downsampled so its longest side is at most
+    max_pixels, with the page text wrapped across the top. A JPEG with no text and no resize needed
+    is passed through byte-for-byte.
+
+    Returns (jpeg_bytes, (width, height)).
+    """
+    with Image.open(image_path) as img:
+        needs_resize = max_pixels is not None and max(img.size) > max_pixels
+        if not text.strip() and not needs_resize and img.format == "JPEG" and img.mode == "RGB":
+            size = img.size
+            with open(image_path, "rb") as f:
+                return f.read(), size
+
+        if needs_resize:
+            # draft() lets the JPEG decoder skip straight to a smaller scale instead of decoding full size
+            img.draft("RGB", (max_pixels, max_pixels))
+        page = img.convert("RGB")
+
+    if needs_resize and max(page.size) > max_pixels:
+        page.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+
+    if text.strip() and layout is not None:
+        margin = min(max(16, page.width // 20), page.width // 4)  # Tiny images still get a valid text box
+        lines = layout.wrap(text, page.width - 2 * margin)
+        draw = ImageDraw.Draw(page)
+        box_height = len(lines) * layout.line_height + margin
+        # A white panel behind the text keeps it readable over any illustration
+        draw.rectangle((margin // 2, margin // 2, page.width - margin // 2, margin // 2 + box_height), fill="white")
+        y = margin
+        for line in lines:
+            draw.text((margin, y), line, font=layout.font, fill="black")
+            y += layout.line_height
+
+    buffer = io.BytesIO()
+    page.save(buffer, format="JPEG", quality=quality)
+    size = page.size
+    page.close()
+    return buffer.getvalue(), size
+
+
+def render_pdf_page(
+    image_path: str,
+    text: str,
+    max_pixels: Optional[int] = None,
+    font_path: str = config.PDF_FONT_PATH,
+) -> Optional[Tuple[bytes, Tuple[int, int]]]:
+    """
+    Renders one PDF page (see render_page_jpeg) with its text scaled to the image width.
+    Returns None if the image file is missing. A plain top-level function, so it can run in a
+    process pool.
+    """
+    if not os.path.exists(image_path):
+        return None
+    with Image.open(image_path) as probe:  # Reads only the header
+        width, height = probe.size
+    if max_pixels and max(width, height) > max_pixels:
+        # max_pixels caps the longest side, so a portrait page ends up narrower than max_pixels
+        width = max(1, round(width * max_pixels / max(width, height)))
+    # Scale the text with the image so it has the same physical size at any resolution
+    font_size = max(10, round(config.PDF_FONT_SIZE * width / 1024))
+    return render_page_jpeg(image_path, text, _text_layout(font_path, font_size), max_pixels)
+
+
+def export_pdf(
+    pages: Iterable[Tuple[str, str]],
+    output_path: str,
+    dpi: Optional[int] = config.PDF_DPI,
+    page_width_inches: float = config.PDF_PAGE_WIDTH_INCHES,
+    font_path: str = config.PDF_FONT_PATH,
+    executor: Optional[Executor] = None,
+) -> int:
+    """
+    Streams (image_path, text) pairs into a PDF, holding only one page image in memory at a time.
+
+    Parameters:
+        pages: (image_path, page_text) for each page, in order; missing image files are skipped.
+        output_path: Where to write the PDF.
+        dpi: Target resolution; images larger than page_width_inches * dpi are downsampled.
+            None keeps every image at full resolution.
+        page_width_inches: Physical page width; the height follows each image's aspect ratio.
+        font_path: TrueType font for the page text.
+        executor: Optional (process) pool that decodes, resizes and draws the pages in parallel;
+            the PDF itself is still written here, in page order. Rendered pages are then held until
+            written, so memory grows with the number of pages in flight.
+
+    Returns:
+        int: Number of pages written.
+    """
+    max_pixels = int(page_width_inches * dpi) if dpi else None
+    if executor is not None:
+        pages = list(pages)
+        rendered = executor.map(
+            render_pdf_page,
+            [image_path for image_path, _ in pages],
+            [text for _, text in pages],
+            repeat(max_pixels),
+            repeat(font_path),
+        )
+    else:
+        rendered = (render_pdf_page(image_path, text, max_pixels, font_path) for image_path, text in pages)
+
+    with StreamingPdfWriter(output_path) as writer:
+        for page in rendered:
+            if page is None:
+                continue
+            jpeg, (pixel_width, pixel_height) = page
+            points_width = page_width_inches * 72
+            writer.add_jpeg_page(jpeg, (pixel_width, pixel_height), (points_width, points_width * pixel_height / pixel_width))
+
+        count = writer.page_count
+
+    if count == 0:
+        os.remove(output_path)
+    return count
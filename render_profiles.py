@@ -0,0 +1,33 @@
+from typing import Optional
+
+import config  # The profiles themselves and the default one
+
+
+def get_render_profile(name: Optional[str] = None) -> dict:
+    """
+    Returns the settings of render profile `name` (config.DEFAULT_RENDER_PROFILE if None).
+
+    Raises:
+        ValueError: If there is no such profile in config.RENDER_PROFILES.
+    """
+    name = name or config.DEFAULT_RENDER_PROFILE
+    try:
+        return config.RENDER_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown render profile '{name}'. Choose one of: {', '.join(config.RENDER_PROFILES)}.")
+
+
+def image_params(profile: Optional[str] = None) -> dict:
+    """Leonardo generation parameters for page illustrations rendered with `profile`."""
+    settings = get_render_profile(profile)
+    return {
+        "width": settings["width"],
+        "height": settings["height"],
+        "guidance_scale": settings["guidance_scale"],  # Controls how closely image follows the prompt
+        "num_inference_steps": settings["num_inference_steps"],  # Number of steps for generating the image
+    }
+
+
+def pdf_dpi(profile: Optional[str] = None) -> Optional[int]:
+    """Resolution the PDF export downsamples `profile` illustrations to (None keeps full resolution)."""
+    return get_render_profile(profile).get("pdf_dpi")
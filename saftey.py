@@ -1,21 +1,130 @@
-from typing import Optional  # Optional is imported for consistency, though not used here
-from textwrap import dedent  # Useful for formatting strings, not used directly in this function
-from config import BANNED_TOPICS  # List of disallowed topics to help filter unsafe content
+import re  # Word tokenizer used by the matcher
+import threading  # The shared matcher is built lazily from several threads
+from typing import Dict, Iterable, List, Optional  # Type hints for the matcher and batch API
+if __package__:  # Imported as part of the package (see __init__.py)
+    from .config import BANNED_TERMS  # Disallowed words and phrases to help filter unsafe content
+else:  # Run from this folder, like every script here
+    from config import BANNED_TERMS  # Disallowed words and phrases to help filter unsafe content
+
+# A "word" for matching purposes: runs of letters/digits/underscores (Unicode-aware)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class SafetyMatcher:
+    """
+    Word-prefix matcher for a (potentially very large) list of banned terms.
+
+    Terms are compiled once into lower-cased word tuples. Scanning tokenizes the text in a single regex
+    pass; single-word terms are then looked up by the prefixes of each distinct word, and multi-word
+    terms only at positions whose word starts some banned phrase. The cost grows with the length of
+    the text, not with the number of banned terms.
+    A term matches the words that start with it, like the regex \bkill\w*: "kill" matches "Kill!",
+    "killers" and "killing" but not "skill". In a multi-word term such as "bad guy" the last word is
+    matched the same way and the others exactly, so it matches "bad  guys" or "bad-guy".
+    """
+
+    def __init__(self, terms: Iterable[str] = BANNED_TERMS):
+        self._words = {}  # single banned word -> the original term, reported back on a match
+        self._phrases = {}  # all but the last word of a phrase -> [(last word, the original term)]
+        for term in terms:
+            words = tuple(_WORD_PATTERN.findall(term.lower()))
+            if len(words) == 1:
+                self._words.setdefault(words[0], term)
+            elif words:
+                self._phrases.setdefault(words[:-1], []).append((words[-1], term))
+
+        self._word_lengths = sorted({len(word) for word in self._words})
+        self._phrase_starts = frozenset(head[0] for head in self._phrases)
+        self._phrase_lengths = sorted({len(head) for head in self._phrases})
+
+    def find_terms(self, text: str) -> List[str]:
+        """Returns the banned terms found in `text`, sorted and without duplicates."""
+        tokens = _WORD_PATTERN.findall(text.lower())
+
+        # Single words: look up every prefix length a banned word can have, once per distinct token
+        words = self._words
+        found = set()
+        for token in set(tokens):
+            for length in self._word_lengths:
+                if length > len(token):
+                    break
+                term = words.get(token[:length])
+                if term is not None:
+                    found.add(term)
+
+        # Multi-word phrases: only check windows starting at a word that begins some phrase
+        if self._phrase_starts:
+            starts = self._phrase_starts
+            for start, token in enumerate(tokens):
+                if token not in starts:
+                    continue
+                for length in self._phrase_lengths:
+                    candidates = self._phrases.get(tuple(tokens[start:start + length]))
+                    if candidates and start + length < len(tokens):
+                        last = tokens[start + length]
+                        found.update(term for word, term in candidates if last.startswith(word))
+        return sorted(found)
+
+    def is_safe(self, text: str) -> bool:
+        """True if `text` contains none of the banned terms."""
+        return not self.find_terms(text)
+
+    def scan(self, texts: Iterable[str]) -> List[List[str]]:
+        """Batch version of find_terms: one list of matched terms per input text."""
+        return [self.find_terms(text) for text in texts]
+
+
+_default_matcher: Optional[SafetyMatcher] = None
+_default_matcher_lock = threading.Lock()
+
+
+def get_default_matcher() -> SafetyMatcher:
+    """Returns the shared matcher for config.BANNED_TERMS, compiling it on first use."""
+    global _default_matcher
+    with _default_matcher_lock:
+        if _default_matcher is None:
+            _default_matcher = SafetyMatcher()
+        return _default_matcher
+
 
 def validate_safe_input(text: str) -> bool:
     """
     Performs a basic safety check to ensure the input text does not include banned content.
-    
+
     Parameters:
         text (str): The input string to check (e.g., title, genre, prompt).
 
     Returns:
-        bool: True if the input is safe (i.e., contains none of the banned topics), False otherwise.
+        bool: True if the input is safe (i.e., contains none of the banned terms), False otherwise.
     """
 
-    # Convert the input text to lowercase to make the check case-insensitive.
-    lowered = text.lower()
+    # Case-insensitive word-prefix match against every banned term in one pass.
+    return get_default_matcher().is_safe(text)
+
 
-    # Check if any banned topic is present in the input.
-    # Returns False if any banned word is found.
-    return not any(word in lowered for word in BANNED_TOPICS)
+def find_unsafe_content(texts: Dict[str, str]) -> Dict[str, List[str]]:
+    """
+    Scans several named texts at once (e.g. {"character": ..., "page 3": ...}).
+
+    Returns:
+        Dict[str, List[str]]: The banned terms found, keyed by name; only unsafe texts are included.
+    """
+    names = list(texts)
+    results = get_default_matcher().scan(texts[name] for name in names)
+    return {name: terms for name, terms in zip(names, results) if terms}
+
+
+def validate_safe_output(text: str, label: str = "generated text") -> str:
+    """
+    Checks generated content (character descriptions, stories, page text) before it is used.
+
+    Returns:
+        str: The text unchanged, so calls can wrap an LLM result directly.
+
+    Raises:
+        ValueError: If the text contains banned terms.
+    """
+    terms = get_default_matcher().find_terms(text)
+    if terms:
+        raise ValueError(f"Unsafe content detected in {label}: {', '.join(terms)}")
+    return text
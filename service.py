@@ -0,0 +1,425 @@
+"""
+Asynchronous HTTP API for story generation: submit a book, poll its progress, fetch the result.
+
+    python service.py --port 8080
+
+    POST /books                        {"title": ..., "genre": ..., "age_group": ..., "total_pages": 5,
+                                        "structured": false, "profile": "draft" | "final"}
+                                       -> 202 {"id": ..., "status_url": ...}  (429 when the queue is full)
+    GET  /books/{id}                   Status, current stage and per-page progress
+    GET  /books/{id}/result            The finished storybook (409 while it is still being made)
+    GET  /books/{id}/pdf               The exported PDF
+    GET  /books/{id}/pages/{n}/image   One page's illustration
+    GET  /healthz                      Queue depth and running books
+    GET  /metrics                      Prometheus metrics (see instrumentation.py)
+
+Each book runs as a coroutine, not a thread. The short blocking steps (LLM calls, manifest writes,
+downloads, PDF export) go to one shared, bounded thread pool, and waiting for Leonardo is an await on
+the shared BatchPoller's future, so hundreds of books can be in flight with a handful of threads.
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from aiohttp import web  # Async HTTP server
+
+import config
+import instrumentation  # Per-book traces and the /metrics endpoint
+import main as pipeline  # The pipeline stages, shared with main.run_story_pipeline
+from checkpoint import BookManifest, book_id
+from pdf_export import export_pdf
+from render_profiles import pdf_dpi
+from saftey import validate_safe_input
+
+MAX_TOTAL_PAGES = 40
+QUEUE_FULL_RETRY_AFTER = 30  # Seconds suggested to clients turned away by admission control
+
+
+class BookJob:
+    """One submitted book: its inputs, where it is in the pipeline and, once done, its files."""
+
+    def __init__(
+        self,
+        title: str,
+        genre: str,
+        age_group: str,
+        total_pages: int,
+        force_regenerate: bool = False,
+        structured: bool = config.STRUCTURED_GENERATION,
+        profile: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.genre = genre
+        self.age_group = age_group
+        self.total_pages = total_pages
+        self.force_regenerate = force_regenerate
+        self.structured = structured
+        self.profile = profile  # Render profile; None resumes the book's own (or the default)
+        self.book_id = book_id(title, genre, age_group)
+
+        self.status = "queued"  # queued -> running -> done | failed
+        self.stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.manifest: Optional[BookManifest] = None
+        self.page_status = {}  # page number -> "rendering" | "done" | "failed"
+        self.pdf_path: Optional[str] = None
+
+    def pages(self) -> list:
+        return (self.manifest.get("pages") or []) if self.manifest else []
+
+    def to_dict(self) -> dict:
+        pages = [
+            {
+                "page": page["page"],
+                "status": "done" if page.get("image_url") else self.page_status.get(page["page"], "pending"),
+            }
+            for page in self.pages()
+        ]
+        return {
+            "id": self.id,
+            "title": self.title,
+            "genre": self.genre,
+            "age_group": self.age_group,
+            "profile": self.profile,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "total": len(pages),
+                "done": sum(page["status"] == "done" for page in pages),
+                "failed": sum(page["status"] == "failed" for page in pages),
+            },
+            "pages": pages,
+        }
+
+
+class StoryService:
+    """
+    In-process job queue that generates books concurrently on one event loop.
+
+    Admission control: at most max_queued_books wait in the queue (submit() raises asyncio.QueueFull
+    beyond that), and max_concurrent_books worker coroutines take books off it, so that many are
+    generated at once. Submitting a book that is already queued or running returns the existing job.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_books: int = config.SERVICE_MAX_CONCURRENT_BOOKS,
+        max_queued_books: int = config.SERVICE_MAX_QUEUED_BOOKS,
+        blocking_workers: int = config.SERVICE_BLOCKING_WORKERS,
+        checkpoint_dir: Optional[str] = config.CHECKPOINT_DIR,
+        max_finished_jobs: int = config.SERVICE_MAX_FINISHED_JOBS,
+    ):
+        self.max_concurrent_books = max_concurrent_books
+        self.max_queued_books = max_queued_books
+        self.blocking_workers = blocking_workers
+        self.checkpoint_dir = checkpoint_dir
+        self.max_finished_jobs = max_finished_jobs
+
+        self.jobs = {}  # job id -> BookJob
+        self._active = {}  # book id -> queued or running BookJob
+        self._finished = deque()  # finished job ids, oldest first
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queued_books)
+        self._executor = ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix="story-blocking")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent_books)]
+
+    async def stop(self) -> None:
+        """Cancels running books (their checkpoints are kept, so a resubmit resumes them)."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def running(self) -> int:
+        return sum(job.status == "running" for job in self._active.values())
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def submit(self, job: BookJob) -> BookJob:
+        """Queues a book and returns its job (or the existing job for the same book)."""
+        existing = self._active.get(job.book_id)
+        if existing is not None:
+            return existing
+        self._queue.put_nowait(job)  # Raises asyncio.QueueFull when the service is saturated
+        self.jobs[job.id] = job
+        self._active[job.book_id] = job
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _blocking(self, fn, *args, **kwargs):
+        """Runs a blocking call on the shared pool, keeping the book's trace attached."""
+        call = instrumentation.bind(functools.partial(fn, *args, **kwargs))
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def _run_job(self, job: BookJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            await self._generate_book(job)
+            job.status = "done"
+            print(f"🎉 Book '{job.title}' ({job.id}) finished.")
+        except asyncio.CancelledError:
+            job.status, job.error = "failed", "Service stopped."
+            raise
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            print(f"❌ Book '{job.title}' ({job.id}) failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            job.stage = None
+            self._active.pop(job.book_id, None)
+            self._forget_old_jobs(job)
+
+    def _forget_old_jobs(self, job: BookJob) -> None:
+        self._finished.append(job.id)
+        while len(self._finished) > self.max_finished_jobs:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    async def _generate_book(self, job: BookJob) -> None:
+        """main.run_story_pipeline's stages, each run on the shared pool and awaited instead of blocking."""
+        job.manifest, job.profile = await self._blocking(
+            pipeline.open_book, job.title, job.genre, job.age_group, self.checkpoint_dir, job.profile
+        )
+        manifest = job.manifest
+
+        with pipeline.book_run(manifest, job.title, genre=job.genre, age_group=job.age_group, job=job.id, profile=job.profile):
+            if job.structured:
+                job.stage = "book"
+                await self._blocking(pipeline.structured_stage, manifest, job.title, job.genre, job.age_group, job.total_pages)
+
+            job.stage = "character"
+            character = await self._blocking(pipeline.character_stage, manifest, job.title, job.genre, job.age_group)
+
+            # The character's visual signature (for image prompts) is derived while the story is written
+            appearance = None
+            if manifest.get("pages") is None:
+                appearance = asyncio.ensure_future(self._blocking(pipeline.visual_signature_stage, manifest, character))
+
+            job.stage = "story"
+            try:
+                story = await self._blocking(pipeline.story_stage, manifest, job.title, job.genre, character, job.total_pages)
+
+                job.stage = "split"
+                signature = await appearance if appearance is not None else None
+                await self._blocking(pipeline.pages_stage, manifest, story, lambda: signature, job.total_pages)
+            finally:
+                if appearance is not None:
+                    appearance.cancel()  # The story failed before the signature was needed
+
+            job.stage = "images"
+            pages = pipeline.pages_to_render(manifest, job.force_regenerate)
+            with instrumentation.span("images", pages=len(pages)):
+                await asyncio.gather(*(self._render_page(job, page) for page in pages))
+
+            job.stage = "pdf"
+            with instrumentation.span("pdf"):
+                job.pdf_path = await self._blocking(manifest.stage, "pdf", lambda: self._export_pdf(job))
+
+    async def _render_page(self, job: BookJob, page: dict) -> None:
+        """Illustrates one page; a failure only marks that page, never the whole book."""
+        job.page_status[page["page"]] = "rendering"
+        page["profile"] = job.profile
+        try:
+            page["image_url"] = await self._generate_image(page["image_prompt"], job.force_regenerate, job.profile)
+            job.page_status[page["page"]] = "done"
+            print(f"✅ Page {page['page']} of '{job.title}' image generated.")
+        except Exception as e:
+            page["image_url"] = None
+            job.page_status[page["page"]] = "failed"
+            print(f"❌ Page {page['page']} of '{job.title}' image failed: {e}")
+        await self._blocking(job.manifest.record_page_image, page)
+
+    async def _generate_image(self, prompt: str, force_regenerate: bool, profile: Optional[str] = None) -> str:
+        """main.generate_image without a blocked thread: the poll is awaited, not waited on."""
+        if not force_regenerate:
+            cached_path = await self._blocking(pipeline.find_cached_image, prompt, profile)
+            if cached_path:
+                return cached_path
+        future = await self._blocking(pipeline.submit_image, prompt, profile)
+        with instrumentation.span("image.poll"):
+            image_url = await asyncio.wrap_future(future)
+        return await self._blocking(pipeline.store_image, prompt, profile, image_url)
+
+    def _export_pdf(self, job: BookJob) -> Optional[str]:
+        """Writes the book's PDF beside its manifest (or in the temp dir without checkpoints)."""
+        folder = os.path.dirname(job.manifest.path) if job.manifest.path else tempfile.gettempdir()
+        output_path = os.path.join(folder, f"{job.book_id}.pdf")
+        pages = ((page["image_url"], page["text"]) for page in job.pages() if page.get("image_url"))
+        return output_path if export_pdf(pages, output_path, dpi=pdf_dpi(job.profile)) else None
+
+
+# === HTTP handlers ===
+
+def _job_or_404(request: web.Request) -> BookJob:
+    job = request.app["service"].jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text='{"error": "Unknown book id."}', content_type="application/json")
+    return job
+
+
+def _job_links(job: BookJob) -> dict:
+    base = f"/books/{job.id}"
+    return {"status_url": base, "result_url": f"{base}/result", "pdf_url": f"{base}/pdf"}
+
+
+async def submit_book(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        return web.json_response({"error": "Request body must be JSON."}, status=400)
+    if not isinstance(body, dict):
+        return web.json_response({"error": "Request body must be a JSON object."}, status=400)
+
+    title = str(body.get("title") or "").strip()
+    genre = str(body.get("genre") or "").strip()
+    if not title or not genre:
+        return web.json_response({"error": "Both title and genre are required."}, status=400)
+    if not validate_safe_input(title) or not validate_safe_input(genre):
+        return web.json_response({"error": "Unsafe input detected. Please revise your title/genre."}, status=400)
+    try:
+        total_pages = int(body.get("total_pages", 5))
+    except (TypeError, ValueError):
+        total_pages = 0
+    if not 1 <= total_pages <= MAX_TOTAL_PAGES:
+        return web.json_response({"error": f"total_pages must be between 1 and {MAX_TOTAL_PAGES}."}, status=400)
+
+    profile = body.get("profile")
+    if profile is not None and profile not in config.RENDER_PROFILES:
+        return web.json_response(
+            {"error": f"profile must be one of: {', '.join(config.RENDER_PROFILES)}."}, status=400
+        )
+
+    job = BookJob(
+        title,
+        genre,
+        str(body.get("age_group") or "5–10"),
+        total_pages,
+        bool(body.get("force_regenerate")),
+        bool(body.get("structured", config.STRUCTURED_GENERATION)),
+        profile,
+    )
+    service = request.app["service"]
+    try:
+        accepted = service.submit(job)
+    except asyncio.QueueFull:
+        return web.json_response(
+            {"error": "Too many books are queued, please retry later."},
+            status=429,
+            headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)},
+        )
+    status = 202 if accepted is job else 200  # 200: the same book was already in progress
+    return web.json_response({"id": accepted.id, "status": accepted.status, **_job_links(accepted)}, status=status)
+
+
+async def book_status(request: web.Request) -> web.Response:
+    job = _job_or_404(request)
+    return web.json_response({**job.to_dict(), **_job_links(job)})
+
+
+async def book_result(request: web.Request) -> web.Response:
+    job = _job_or_404(request)
+    if job.status != "done":
+        return web.json_response({"id": job.id, "status": job.status, "stage": job.stage, "error": job.error}, status=409)
+    storybook = job.manifest.storybook()
+    storybook["pdf"] = job.pdf_path
+    return web.json_response(storybook)
+
+
+async def book_pdf(request: web.Request) -> web.StreamResponse:
+    job = _job_or_404(request)
+    if job.status != "done" or not job.pdf_path or not os.path.exists(job.pdf_path):
+        return web.json_response({"id": job.id, "status": job.status, "error": "No PDF available."}, status=409)
+    return web.FileResponse(job.pdf_path, headers={"Content-Type": "application/pdf"})
+
+
+async def page_image(request: web.Request) -> web.StreamResponse:
+    job = _job_or_404(request)
+    number = request.match_info["page"]
+    for page in job.pages():
+        if str(page["page"]) == number and page.get("image_url") and os.path.exists(page["image_url"]):
+            return web.FileResponse(page["image_url"])
+    return web.json_response({"error": f"No image for page {number} yet."}, status=404)
+
+
+async def healthz(request: web.Request) -> web.Response:
+    service = request.app["service"]
+    return web.json_response({
+        "queued": service.queued,
+        "running": service.running,
+        "max_concurrent_books": service.max_concurrent_books,
+        "max_queued_books": service.max_queued_books,
+    })
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=instrumentation.get_registry().prometheus_text(), content_type="text/plain")
+
+
+def create_app(service: Optional[StoryService] = None) -> web.Application:
+    """Builds the aiohttp application around a StoryService (started and stopped with the app)."""
+    app = web.Application()
+    app["service"] = service or StoryService()
+
+    async def start_service(app):
+        await app["service"].start()
+
+    async def stop_service(app):
+        await app["service"].stop()
+
+    app.on_startup.append(start_service)
+    app.on_cleanup.append(stop_service)
+    app.router.add_post("/books", submit_book)
+    app.router.add_get("/books/{job_id}", book_status)
+    app.router.add_get("/books/{job_id}/result", book_result)
+    app.router.add_get("/books/{job_id}/pdf", book_pdf)
+    app.router.add_get("/books/{job_id}/pages/{page}/image", page_image)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve story generation over HTTP.")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--max-concurrent-books", type=int, default=config.SERVICE_MAX_CONCURRENT_BOOKS)
+    parser.add_argument("--max-queued-books", type=int, default=config.SERVICE_MAX_QUEUED_BOOKS)
+    parser.add_argument("--blocking-workers", type=int, default=config.SERVICE_BLOCKING_WORKERS)
+    args = parser.parse_args(argv)
+
+    service = StoryService(args.max_concurrent_books, args.max_queued_books, args.blocking_workers)
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
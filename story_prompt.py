@@ -1,13 +1,18 @@
 from typing import Optional  # Allows optional function arguments (used here for 'tone')
 from textwrap import dedent  # Useful for formatting multiline prompt strings (optional in this case)
-from config import DEFAULT_TONE, BANNED_TOPICS  # Imports global tone default and banned content list
+if __package__:  # Imported as part of the package (see __init__.py)
+    from .config import DEFAULT_TONE, BANNED_TOPICS, STORY_LENGTH_PAGES  # Imports global tone default, banned content list and story length
+else:  # Run from this folder, like every script here
+    from config import DEFAULT_TONE, BANNED_TOPICS, STORY_LENGTH_PAGES  # Imports global tone default, banned content list and story length
 
 def story_prompt(
     title: str,
     genre: str,
     character_description: str,
     tone: str = DEFAULT_TONE,
-    age_group: str = "5–10"
+    age_group: str = "5–10",
+    total_pages: int = 20,
+    length_pages: int = STORY_LENGTH_PAGES
 ) -> str:
     """
     Creates a structured prompt for generating a full children's story.
@@ -18,6 +23,8 @@ def story_prompt(
         character_description (str): Description of the main character (name, traits, backstory).
         tone (str): Narrative tone to use; defaults to a friendly, imaginative voice.
         age_group (str): Age group the story is intended for (used for tone and vocabulary).
+        total_pages (int): Number of pages the story is printed on; each is labelled "Page N:" so it can be split reliably.
+        length_pages (int): How long the story is, in picture-book pages (config.STORY_LENGTH_PAGES).
     
     Returns:
         str: A formatted prompt for use with a language model like GPT.
@@ -27,10 +34,13 @@ def story_prompt(
     # - Title, genre, character description for context
     # - Desired tone and age group to guide language complexity and positivity
     # - Banned topics to ensure safe storytelling
-    return f"""Write a 20-page illustrated children's story titled "{title}".
+    # - Explicit "Page N:" labels so the story can be split into pages (even while it is still streaming)
+    # - The length is independent of the page count, so a 5-page book still gets a full-length story
+    return f"""Write a {length_pages}-page illustrated children's story titled "{title}".
 The genre is "{genre}", and the main character is described as follows:
 
 {character_description}
 
 The tone should be {tone}, appropriate for children aged {age_group}.
-Avoid any themes of {', '.join(BANNED_TOPICS)}. Each page should describe a distinct scene or moment in the story."""
+Avoid any themes of {', '.join(BANNED_TOPICS)}. Each page should describe a distinct scene or moment in the story.
+The story will be printed on {total_pages} pages: start each of them on a new line with "Page N:" (Page 1: through Page {total_pages}:)."""
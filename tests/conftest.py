@@ -0,0 +1,62 @@
+"""
+The storybook modules are flat scripts at the repository root (they import each other as
+top-level modules), so make that directory importable for the tests. The main_stubs fixture runs
+main.py's pipeline without calling OpenAI or Leonardo.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHARACTER = "Pip is a small orange fox with a red scarf who loves kites."
+STORY = (
+    "Pip woke up early. The sun was warm. Pip found a kite in the grass. The kite was blue. "
+    "Pip ran up the hill. The wind pulled the kite high. Pip laughed. The kite danced in the sky. "
+    "Pip flew it until sunset. Then Pip went home happy."
+)
+
+
+class PipelineStubs:
+    """Stands in for the OpenAI and Leonardo calls made by main.py, recording what was asked for."""
+
+    def __init__(self, image_dir):
+        self.image_dir = image_dir
+        self.prompts = []
+        self.images = []  # (image prompt, render profile) of every illustration rendered
+        self.book_reply = None  # Reply to book_prompt (structured generation)
+        self.fail_images = False
+
+    def chat_completion(self, prompt, validate=None, **kwargs):
+        self.prompts.append(prompt)
+        if "Reply with only a JSON object" in prompt:
+            reply = self.book_reply
+        elif prompt.startswith("Write a"):
+            reply = STORY
+        else:
+            reply = CHARACTER
+        if validate:
+            validate(reply)
+        return reply
+
+    def generate_image(self, prompt, force_regenerate=False, profile=None):
+        if self.fail_images:
+            raise RuntimeError("Leonardo is down")
+        self.images.append((prompt, profile))
+        path = self.image_dir / f"image_{len(self.images)}.png"
+        path.write_bytes(b"png")
+        return str(path)
+
+
+@pytest.fixture
+def main_stubs(tmp_path, monkeypatch):
+    """main.py's pipeline with its API calls stubbed out."""
+    import main
+
+    stubs = PipelineStubs(tmp_path)
+    monkeypatch.setattr(main, "chat_completion", stubs.chat_completion)
+    monkeypatch.setattr(main, "generate_image", stubs.generate_image)
+    monkeypatch.setattr(main, "derive_visual_signature", lambda character: "small orange fox, red scarf")
+    return stubs
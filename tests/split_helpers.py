@@ -0,0 +1,43 @@
+"""
+Story-splitting helpers shared by tests/test_utils.py and benchmarks.py: the original splitter, kept
+as the baseline the new one is compared against, and a generator of random stories to split.
+"""
+
+import random
+import re
+import string
+from typing import List
+
+
+def random_words(count: int, rng: random.Random) -> List[str]:
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count)]
+
+
+def legacy_split_story_into_pages(story_text: str, total_pages: int = 20) -> list:
+    """The original utils.split_story_into_pages, kept verbatim as the comparison baseline."""
+    story_text = re.sub(r"^Title:.*\n", "", story_text, flags=re.IGNORECASE)
+    sentences = re.split(r'(?<=[.!?])\s+', story_text.strip())
+    chunks = []
+    avg = max(1, len(sentences) // total_pages)
+    for i in range(0, len(sentences), avg):
+        chunk = " ".join(sentences[i:i + avg])
+        chunk = re.sub(r'Page\s*\d+[:\-]?', '', chunk, flags=re.IGNORECASE).strip()
+        chunks.append(chunk.strip())
+    if len(chunks) > total_pages:
+        chunks = chunks[:total_pages]
+    elif len(chunks) < total_pages:
+        while len(chunks) < total_pages:
+            chunks.append("")
+    return [{"page": i + 1, "text": chunk} for i, chunk in enumerate(chunks)]
+
+
+def random_story(rng: random.Random, sentences: int) -> str:
+    """A story of `sentences` sentences of varied length, with a title line and a few stray "Page N:" labels."""
+    parts = []
+    for i in range(sentences):
+        words = random_words(rng.randint(1, 30), rng)
+        if rng.random() < 0.05:
+            # Mid-sentence, so it is a stray label rather than an explicit "Page N:" line marker
+            words.insert(rng.randint(1, len(words)), f"Page {rng.randint(1, 40)}:")
+        parts.append(" ".join(words).capitalize() + rng.choice([".", "!", "?"]))
+    return "Title: A Story\n" + rng.choice([" ", "\n", "  "]).join(parts)
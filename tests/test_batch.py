@@ -0,0 +1,27 @@
+from batch import read_jobs, run_job
+
+
+def test_read_jobs_turns_bad_lines_into_error_records(tmp_path):
+    path = tmp_path / "books.jsonl"
+    path.write_text('{"title": "A", "genre": "B"}\n\n[1, 2]\n"title"\nnull\n{bad\n', encoding="utf-8")
+
+    jobs = list(read_jobs(str(path)))
+
+    assert jobs[0] == {"title": "A", "genre": "B", "line": 1}
+    assert [job["line"] for job in jobs] == [1, 3, 4, 5, 6]
+    assert jobs[1]["error"] == "Expected a JSON object, got list."
+    assert jobs[2]["error"] == "Expected a JSON object, got str."
+    assert jobs[3]["error"] == "Expected a JSON object, got NoneType."
+    assert jobs[4]["error"].startswith("Invalid JSON")
+
+
+def test_run_job_reports_an_error_record_without_running_the_book(tmp_path):
+    path = tmp_path / "books.jsonl"
+    path.write_text("[1, 2]\n", encoding="utf-8")
+    job = next(read_jobs(str(path)))
+
+    record = run_job(job, image_executor=None)
+
+    assert record["status"] == "error"
+    assert record["line"] == 1
+    assert record["error"] == "Expected a JSON object, got list."
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import leonardo
+from checkpoint import BookManifest
+
+STORY = "Pip woke up early. The sun was warm. Pip found a kite. The kite flew high. Pip smiled."
+
+
+def test_pages_missing_images(tmp_path):
+    image = tmp_path / "page_1.jpg"
+    image.write_bytes(b"jpeg")
+    manifest = BookManifest.for_book("Pip", "Adventure", "5–10", directory=str(tmp_path))
+    manifest.set("pages", [
+        {"page": 1, "text": "a", "image_url": str(image)},
+        {"page": 2, "text": "b", "image_url": None},
+        {"page": 3, "text": "c", "image_url": str(tmp_path / "gone.jpg")},
+        {"page": 4, "text": "d", "image_url": "https://cdn.leonardo.ai/page_4.jpg"},
+    ])
+
+    assert [page["page"] for page in manifest.pages_missing_images()] == [2, 3]
+
+
+def test_manifest_resumes_from_disk(tmp_path):
+    manifest = BookManifest.for_book("Pip", "Adventure", "5–10", directory=str(tmp_path))
+    manifest.stage("story", lambda: STORY)
+
+    resumed = BookManifest.for_book("Pip", "Adventure", "5–10", directory=str(tmp_path))
+    assert resumed.path == manifest.path
+    assert resumed.stage("story", lambda: pytest.fail("stage ran again")) == STORY
+
+
+@pytest.fixture
+def leonardo_stubs(monkeypatch):
+    """leonardo.py's pipeline with every API call stubbed out; returns the image requests made."""
+    generated = []
+
+    def generate_image(prompt, profile=None):
+        generated.append(prompt)
+        return f"https://cdn.leonardo.ai/{len(generated)}.jpg"
+
+    def save_image_from_url(url, filename):
+        with open(filename, "wb") as f:
+            f.write(url.encode())
+        return filename
+
+    monkeypatch.setattr(leonardo, "chat_completion", lambda prompt, validate=None: STORY)
+    monkeypatch.setattr(leonardo, "derive_visual_signature", lambda character: "small fox, red scarf")
+    monkeypatch.setattr(leonardo, "generate_image", generate_image)
+    monkeypatch.setattr(leonardo, "save_image_from_url", save_image_from_url)
+    monkeypatch.setattr(leonardo, "create_pdf", lambda storybook, image_dir, dpi: os.path.join(image_dir, "book.pdf"))
+    return generated
+
+
+def test_leonardo_pipeline_resume_does_not_re_render_finished_pages(tmp_path, leonardo_stubs):
+    first = leonardo.run_story_pipeline("Pip", "Adventure", checkpoint_dir=str(tmp_path))
+    assert len(leonardo_stubs) == 2
+    assert all(os.path.exists(page["image_url"]) for page in first["pages"])
+
+    second = leonardo.run_story_pipeline("Pip", "Adventure", checkpoint_dir=str(tmp_path))
+    assert len(leonardo_stubs) == 2  # Nothing rendered again
+    assert second["pages"] == first["pages"]
+    assert BookManifest.load(first["manifest"]).get("pdf") is not None  # The PDF was not invalidated
+
+
+def test_leonardo_pipeline_re_renders_a_deleted_page(tmp_path, leonardo_stubs):
+    first = leonardo.run_story_pipeline("Pip", "Adventure", checkpoint_dir=str(tmp_path))
+    os.remove(first["pages"][1]["image_url"])
+
+    leonardo.run_story_pipeline("Pip", "Adventure", checkpoint_dir=str(tmp_path))
+    assert len(leonardo_stubs) == 3
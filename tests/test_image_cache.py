@@ -0,0 +1,95 @@
+import itertools
+import os
+import types
+
+import pytest
+
+import image_cache
+from image_cache import ImageCache
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Makes every last-used time strictly later than the previous one."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(image_cache, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def _download(tmp_path, name, content):
+    """A freshly "downloaded" image file, ready to be put() into the cache."""
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_put_and_get_count_hits_and_misses(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=1000)
+
+    assert cache.get("a") is None
+    cached = cache.put("a", _download(tmp_path, "a.png", b"A" * 10))
+
+    assert cache.get("a") == cached
+    assert os.path.basename(cached).endswith(".png")
+    assert not os.path.exists(tmp_path / "a.png")  # Moved into the cache
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1, "bytes": 10}
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=30)
+    a = cache.put("a", _download(tmp_path, "a.png", b"A" * 10))
+    b = cache.put("b", _download(tmp_path, "b.png", b"B" * 10))
+    c = cache.put("c", _download(tmp_path, "c.png", b"C" * 10))
+    cache.get("a")  # "b" is now the least recently used
+
+    d = cache.put("d", _download(tmp_path, "d.png", b"D" * 10))
+
+    assert cache.get("b") is None
+    assert not os.path.exists(b)
+    assert [cache.get(key) for key in "acd"] == [a, c, d]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 30
+
+
+def test_a_shared_content_file_outlives_one_evicted_key(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=20)
+    shared = cache.put("a", _download(tmp_path, "a.png", b"S" * 10))
+    cache.put("c", _download(tmp_path, "c.png", b"C" * 10))
+    assert cache.put("b", _download(tmp_path, "b.png", b"S" * 10)) == shared
+    assert cache.stats()["bytes"] == 20  # The shared file is stored (and counted) once
+
+    cache.put("d", _download(tmp_path, "d.png", b"D" * 5))
+
+    # "a" went first without freeing anything, since "b" still uses its file; "c" went next
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert cache.get("b") == shared
+    assert os.path.exists(shared)
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["bytes"] == 15
+
+
+def test_the_last_key_of_a_shared_file_takes_the_file_with_it(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=20)
+    shared = cache.put("a", _download(tmp_path, "a.png", b"S" * 10))
+    cache.put("b", _download(tmp_path, "b.png", b"S" * 10))
+    cache.put("c", _download(tmp_path, "c.png", b"C" * 10))
+
+    cache.put("d", _download(tmp_path, "d.png", b"D" * 10))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert not os.path.exists(shared)
+
+
+def test_two_instances_on_one_directory_see_each_others_puts(tmp_path):
+    directory = str(tmp_path / "cache")
+    first = ImageCache(directory, max_bytes=1000)
+    second = ImageCache(directory, max_bytes=1000)
+
+    from_first = first.put("a", _download(tmp_path, "a.png", b"A" * 10))
+    from_second = second.put("b", _download(tmp_path, "b.png", b"B" * 10))
+
+    assert second.get("a") == from_first
+    assert first.get("b") == from_second
+    # Neither write dropped the other's entry from index.json
+    assert set(ImageCache(directory)._load_index()) == {"a", "b"}
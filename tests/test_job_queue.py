@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+import main
+from job_queue import JobQueue
+from worker import process_job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_claim_hands_out_each_job_once(queue):
+    first = queue.enqueue({"title": "A"})
+    second = queue.enqueue({"title": "B"})
+
+    assert queue.claim("w1").id == first
+    assert queue.claim("w2").id == second
+    assert queue.claim("w3") is None
+
+
+def test_an_expired_lease_is_reclaimed_and_the_stale_owner_is_locked_out(queue):
+    job_id = queue.enqueue({"title": "A"})
+    stale = queue.claim("w1")
+    assert queue.claim("w2") is None  # Still leased
+
+    time.sleep(0.3)
+    fresh = queue.claim("w2")
+
+    assert fresh.id == job_id
+    assert fresh.attempts == 2
+    assert not queue.heartbeat(stale)
+    assert not queue.complete(stale, "stale")
+    assert not queue.fail(stale, "stale")
+    assert queue.complete(fresh, "ok")
+    record = queue.get(job_id)
+    assert record["status"] == "done"
+    assert record["result"] == "ok"
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue({"title": "A"})
+    job = queue.claim("w1")
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(job)
+
+    assert queue.claim("w2") is None
+    assert queue.complete(job)
+
+
+def test_a_job_is_failed_after_max_attempts(queue):
+    job_id = queue.enqueue({"title": "A"})
+
+    job = queue.claim("w1")
+    assert queue.fail(job, "boom")
+    assert queue.get(job_id)["status"] == "queued"
+
+    job = queue.claim("w1")
+    assert job.last_attempt
+    assert queue.fail(job, "boom again")
+
+    record = queue.get(job_id)
+    assert record["status"] == "failed"
+    assert record["error"] == "boom again"
+    assert record["attempts"] == 2
+    assert queue.claim("w1") is None
+
+
+def test_an_expired_lease_on_the_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue({"title": "A"}, max_attempts=1)
+    queue.claim("w1")
+
+    time.sleep(0.3)
+
+    assert queue.claim("w2") is None
+    record = queue.get(job_id)
+    assert record["status"] == "failed"
+    assert record["error"] == "Lease expired."
+    assert queue.stats() == {"queued": 0, "running": 0, "done": 0, "failed": 1}
+
+
+def test_process_job_retries_a_failing_book_until_max_attempts(queue, monkeypatch):
+    def run_story_pipeline(*args, **kwargs):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(main, "run_story_pipeline", run_story_pipeline)
+    monkeypatch.setattr("config.JOB_RETRY_DELAY", 0)
+    job_id = queue.enqueue({"title": "A", "genre": "Adventure"})
+
+    process_job(queue.claim("w1"), queue, image_executor=None, cpu_executor=None)
+    assert queue.get(job_id)["status"] == "queued"
+
+    process_job(queue.claim("w1"), queue, image_executor=None, cpu_executor=None)
+    record = queue.get(job_id)
+    assert record["status"] == "failed"
+    assert record["error"] == "LLM unavailable"
+
+
+def test_process_job_requeues_missing_page_images(queue, monkeypatch):
+    def run_story_pipeline(*args, **kwargs):
+        return {"pages": [{"page": 1, "image_url": "page_1.png"}, {"page": 2, "image_url": None}]}
+
+    monkeypatch.setattr(main, "run_story_pipeline", run_story_pipeline)
+    monkeypatch.setattr("config.JOB_RETRY_DELAY", 0)
+    job_id = queue.enqueue({"title": "A", "genre": "Adventure"})
+
+    process_job(queue.claim("w1"), queue, image_executor=None, cpu_executor=None)
+
+    record = queue.get(job_id)
+    assert record["status"] == "queued"
+    assert record["error"] == "Images failed for pages [2]."
+
+
+def test_process_job_rejects_a_payload_without_title(queue):
+    job_id = queue.enqueue({"genre": "Adventure"}, max_attempts=1)
+
+    process_job(queue.claim("w1"), queue, image_executor=None, cpu_executor=None)
+
+    record = queue.get(job_id)
+    assert record["status"] == "failed"
+    assert record["error"] == "Both title and genre are required."
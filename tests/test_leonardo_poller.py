@@ -0,0 +1,120 @@
+import itertools
+import time
+
+import pytest
+
+import hedging
+import instrumentation
+from fake_leonardo import FakeLeonardoServer
+from leonardo_client import LeonardoClient
+from leonardo_poller import BatchPoller
+
+
+def _poller(server: FakeLeonardoServer, poll_timeout: float = 10.0, latency_tracker=None) -> BatchPoller:
+    client = LeonardoClient(
+        api_key="test",
+        base_url=server.base_url,
+        poll_initial_delay=0.02,
+        poll_max_delay=0.1,
+        poll_timeout=poll_timeout,
+        requests_per_second=1000,  # The fake server has no rate limit to respect
+    )
+    # An in-memory tracker, so these tests neither read nor write the user's latency file
+    return BatchPoller(client, latency_tracker=latency_tracker or hedging.LatencyTracker())
+
+
+def test_concurrent_generations_all_resolve():
+    with FakeLeonardoServer(generation_time=0.2) as server:
+        poller = _poller(server)
+        try:
+            futures = [poller.submit(f"page {i}") for i in range(20)]
+            urls = [future.result(timeout=10) for future in futures]
+        finally:
+            poller.close()
+
+    assert len(set(urls)) == 20
+    assert all(url.startswith(server.base_url) for url in urls)
+    assert server.request_counts["submit"] == 20
+    assert poller.pending() == 0
+
+
+def test_track_polls_an_existing_generation():
+    with FakeLeonardoServer(generation_time=0.1) as server:
+        poller = _poller(server)
+        try:
+            generation_id = poller.client.submit("page")
+            assert poller.track(generation_id).result(timeout=10).endswith(f"{generation_id}.png")
+        finally:
+            poller.close()
+
+
+def test_failed_generation_raises():
+    with FakeLeonardoServer(generation_time=0.1, failure_rate=1.0) as server:
+        poller = _poller(server)
+        try:
+            future = poller.submit("page")
+            with pytest.raises(RuntimeError, match="failed"):
+                future.result(timeout=10)
+        finally:
+            poller.close()
+
+
+def test_generation_past_the_poll_timeout_raises_timeout_error():
+    with FakeLeonardoServer(generation_time=30) as server:
+        poller = _poller(server, poll_timeout=0.3)
+        try:
+            future = poller.submit("page")
+            with pytest.raises(TimeoutError):
+                future.result(timeout=10)
+        finally:
+            poller.close()
+
+
+def test_close_fails_pending_futures():
+    with FakeLeonardoServer(generation_time=30) as server:
+        poller = _poller(server)
+        futures = [poller.submit(f"page {i}") for i in range(3)]
+        time.sleep(0.1)  # Let the scheduler pick them up
+        poller.close()
+
+        for future in futures:
+            with pytest.raises(RuntimeError, match="closed"):
+                future.result(timeout=1)
+        with pytest.raises(RuntimeError, match="closed"):
+            poller.track("late")
+
+
+class _RecordingTracker(hedging.LatencyTracker):
+    def __init__(self):
+        super().__init__(min_samples=5)
+        self.recorded = []
+
+    def record(self, key: str, seconds: float) -> None:
+        self.recorded.append(seconds)
+        super().record(key, seconds)
+
+
+def test_hedge_win_is_counted_once_and_learns_the_losers_time():
+    # Five quick generations to learn from, then a stuck one whose hedge finishes quickly
+    times = itertools.chain([0.02] * 5, [30.0], itertools.repeat(0.05))
+    with FakeLeonardoServer(generation_time=lambda: next(times)) as server:
+        tracker = _RecordingTracker()
+        poller = _poller(server, latency_tracker=tracker)
+        try:
+            for future in [poller.submit(f"warm {i}") for i in range(5)]:
+                future.result(timeout=10)
+            wins = instrumentation.get_registry().snapshot()["counters"].get("leonardo.hedge_wins", 0)
+
+            with hedging.book_budget(max_hedges=1) as budget:
+                started = time.monotonic()
+                poller.submit("stuck").result(timeout=10)
+                elapsed = time.monotonic() - started
+        finally:
+            poller.close()
+
+    assert budget.used == 1
+    assert server.request_counts["submit"] == 7
+    assert instrumentation.get_registry().snapshot()["counters"]["leonardo.hedge_wins"] == wins + 1
+    # The hedge's own time, then a censored sample for the original covering the whole wait
+    hedge_seconds, original_seconds = tracker.recorded[-2:]
+    assert hedge_seconds < original_seconds <= elapsed
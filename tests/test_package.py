@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(REPO_DIR)
+
+
+@pytest.mark.skipif(not PACKAGE.isidentifier(), reason="the checkout folder isn't a valid package name")
+def test_folder_imports_as_a_package_without_changing_sys_path():
+    code = (
+        f"import sys; before = list(sys.path); import {PACKAGE} as package; "
+        "assert sys.path == before; "
+        "assert 'config' not in sys.modules; "
+        "assert package.validate_safe_input('A sunny day'); "
+        "print(package.story_prompt('Pip', 'Adventure', 'A fox', total_pages=3))"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(REPO_DIR), env=env, capture_output=True, text=True
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert "Page 1: through Page 3:" in completed.stdout
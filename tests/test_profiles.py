@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import main
+from checkpoint import BookManifest
+
+
+def _book(tmp_path, **options):
+    return main.run_story_pipeline(
+        "Pip and the Kite", "Adventure", total_pages=3, structured=False,
+        checkpoint_dir=str(tmp_path / "books"), **options,
+    )
+
+
+def test_resumed_book_keeps_the_profile_it_was_rendered_with(tmp_path, main_stubs):
+    draft = _book(tmp_path, profile="draft")
+    assert draft["profile"] == "draft"
+    assert [profile for _, profile in main_stubs.images] == ["draft"] * 3
+
+    resumed = _book(tmp_path, profile="final")
+    assert resumed["profile"] == "draft"
+    assert [page["profile"] for page in resumed["pages"]] == ["draft"] * 3
+    assert len(main_stubs.images) == 3  # Nothing re-rendered
+
+
+def test_book_without_illustrations_can_change_profile(tmp_path, main_stubs):
+    main_stubs.fail_images = True
+    assert _book(tmp_path, profile="draft")["profile"] == "draft"
+
+    main_stubs.fail_images = False
+    book = _book(tmp_path, profile="final")
+    assert book["profile"] == "final"
+    assert [profile for _, profile in main_stubs.images] == ["final"] * 3
+
+
+def test_partial_promotion_keeps_the_book_profile(tmp_path, main_stubs):
+    draft = _book(tmp_path, profile="draft")
+
+    promoted = main.promote_pages(draft["manifest"], [1], "final")
+    assert promoted["profile"] == "draft"
+    assert [page["profile"] for page in promoted["pages"]] == ["final", "draft", "draft"]
+
+    # A missing page is re-rendered with the book's profile, not the promoted page's
+    os.remove(promoted["pages"][2]["image_url"])
+    main.regenerate_missing_pages(draft["manifest"])
+    assert main_stubs.images[-1][1] == "draft"
+
+    finished = main.promote_pages(draft["manifest"], profile="final")
+    assert finished["profile"] == "final"
+    assert [page["profile"] for page in finished["pages"]] == ["final"] * 3
+    assert BookManifest.load(draft["manifest"]).get("profile") == "final"
+
+
+def test_promote_rejects_unknown_pages(tmp_path, main_stubs):
+    draft = _book(tmp_path, profile="draft")
+    with pytest.raises(ValueError, match="No such page"):
+        main.promote_pages(draft["manifest"], [7], "final")
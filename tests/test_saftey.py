@@ -0,0 +1,33 @@
+import pytest
+
+from saftey import SafetyMatcher, validate_safe_input, validate_safe_output
+
+
+@pytest.mark.parametrize("text", [
+    "The deaths in the old tale.",
+    "A bloodthirsty pirate.",
+    "They fought violently.",
+    "Two killers escaped!",
+    "KILLING time",
+    "weapons and drugs",
+])
+def test_inflected_forms_are_banned(text):
+    assert not validate_safe_input(text)
+
+
+@pytest.mark.parametrize("text", ["A skillful fox.", "The unkillable hero", "Pip loves drawing.", "The Deadline Dash"])
+def test_words_that_only_contain_a_term_are_allowed(text):
+    assert validate_safe_input(text)
+
+
+def test_find_terms_reports_the_listed_terms():
+    matcher = SafetyMatcher(["kill", "blood", "bad guy"])
+    assert matcher.find_terms("The killer was a bad-guy with a bloody sword.") == ["bad guy", "blood", "kill"]
+    assert matcher.find_terms("Bad  guys everywhere") == ["bad guy"]
+    assert matcher.find_terms("badly guy, bad") == []
+
+
+def test_validate_safe_output_raises_with_the_terms():
+    with pytest.raises(ValueError, match="page 2: kill"):
+        validate_safe_output("Nobody kills anyone.", "page 2")
+    assert validate_safe_output("A sunny day.") == "A sunny day."
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import main
+from book_prompt import book_prompt
+from conftest import CHARACTER
+from utils import BookReplyError, parse_book_json
+
+BOOK = {
+    "title": "Pip and the Kite",
+    "character": CHARACTER,
+    "appearance": "small orange fox, red scarf",
+    "pages": ["Pip finds a kite.", "The wind takes  it high.", "Pip flies it home."],
+}
+
+
+def test_parse_book_json_reads_a_plain_reply():
+    book = parse_book_json(json.dumps(BOOK), 3)
+
+    assert book["character"] == CHARACTER
+    assert book["appearance"] == "small orange fox, red scarf"
+    assert book["pages"][1] == {"page": 2, "text": "The wind takes it high."}
+    assert book["story"].splitlines()[0] == "Page 1: Pip finds a kite."
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        "```json\n" + json.dumps(BOOK, indent=2) + "\n```",
+        "Here is your story!\n" + json.dumps(BOOK) + "\nI hope you enjoy it.",
+    ],
+)
+def test_parse_book_json_finds_the_object_in_fenced_or_wrapped_replies(reply):
+    assert parse_book_json(reply, 3)["pages"] == parse_book_json(json.dumps(BOOK), 3)["pages"]
+
+
+def test_parse_book_json_accepts_page_objects():
+    pages = [{"page": number, "text": text} for number, text in enumerate(BOOK["pages"], start=1)]
+
+    book = parse_book_json(json.dumps(dict(BOOK, pages=pages)), 3)
+
+    assert [page["text"] for page in book["pages"]] == ["Pip finds a kite.", "The wind takes it high.", "Pip flies it home."]
+
+
+@pytest.mark.parametrize(
+    "reply, error",
+    [
+        ("Sorry, I can't help with that.", "no JSON object"),
+        ('{"character": "Pip", "pages": [}', "invalid JSON"),
+        (json.dumps(dict(BOOK, pages=BOOK["pages"][:2])), "expected 3 pages, got 2"),
+        (json.dumps(dict(BOOK, pages="Pip finds a kite.")), "expected 3 pages, got none"),
+        (json.dumps(dict(BOOK, pages=["Pip finds a kite.", " ", "Pip flies it home."])), "non-empty text"),
+        (json.dumps(dict(BOOK, pages=[{"page": 1}, "b", "c"])), "non-empty text"),
+        (json.dumps(dict(BOOK, character="")), "missing character"),
+    ],
+)
+def test_parse_book_json_rejects_unusable_replies(reply, error):
+    with pytest.raises(BookReplyError, match=error):
+        parse_book_json(reply, 3)
+
+
+def test_book_prompt_keeps_the_story_full_length():
+    prompt = book_prompt("Pip and the Kite", "Adventure", total_pages=3, length_pages=20)
+
+    assert "a 20-page illustrated story" in prompt
+    assert "printed on 3 pages" in prompt
+    assert "exactly 3 strings" in prompt
+
+
+def _structured_book(tmp_path):
+    return main.run_story_pipeline(
+        "Pip and the Kite", "Adventure", total_pages=3, structured=True, checkpoint_dir=str(tmp_path / "books"),
+    )
+
+
+def test_structured_book_takes_a_single_call(tmp_path, main_stubs):
+    main_stubs.book_reply = json.dumps(BOOK)
+
+    storybook = _structured_book(tmp_path)
+
+    assert len(main_stubs.prompts) == 1
+    assert [page["text"] for page in storybook["pages"]] == ["Pip finds a kite.", "The wind takes it high.", "Pip flies it home."]
+
+
+@pytest.mark.parametrize("reply", ["Sorry, I can't help with that.", json.dumps(dict(BOOK, pages=["Too short."]))])
+def test_unusable_structured_reply_falls_back_to_two_calls(tmp_path, main_stubs, reply):
+    main_stubs.book_reply = reply
+
+    storybook = _structured_book(tmp_path)
+
+    book_call, *fallback = main_stubs.prompts
+    assert "Reply with only a JSON object" in book_call
+    assert len(fallback) == 2
+    assert any(prompt.startswith("Write a") for prompt in fallback)  # The story prompt
+    assert len(storybook["pages"]) == 3
+    assert len(main_stubs.images) == 3
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from split_helpers import legacy_split_story_into_pages, random_story
+from utils import StreamingPageSplitter, split_story_into_pages
+
+
+def _words(pages: list) -> list:
+    return " ".join(page["text"] for page in pages).split()
+
+
+def _random_cases(count: int = 300, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        sentence_count = rng.randint(1, 120)
+        total_pages = rng.randint(1, 25)
+        yield sentence_count, total_pages, random_story(rng, sentence_count)
+
+
+def test_split_keeps_every_word_in_order():
+    for _, total_pages, story in _random_cases():
+        words = _words(split_story_into_pages(story, total_pages))
+        legacy_words = _words(legacy_split_story_into_pages(story, total_pages))
+        # The legacy splitter silently drops trailing sentences, so its words are a prefix of ours
+        assert words[:len(legacy_words)] == legacy_words
+        assert len(words) >= len(legacy_words)
+
+
+def test_split_never_produces_empty_pages():
+    for sentence_count, total_pages, story in _random_cases():
+        pages = split_story_into_pages(story, total_pages)
+        assert all(page["text"] for page in pages)
+        assert len(pages) == min(total_pages, sentence_count)
+        assert [page["page"] for page in pages] == list(range(1, len(pages) + 1))
+
+
+def test_split_pad_fills_up_to_total_pages():
+    for _, total_pages, story in _random_cases(count=100):
+        assert len(split_story_into_pages(story, total_pages, pad=True)) == total_pages
+
+
+def test_split_balances_page_lengths():
+    story = " ".join(f"Sentence number {i} is here." for i in range(200))  # 5 words each
+    lengths = [len(page["text"].split()) for page in split_story_into_pages(story, 20)]
+    # Every page is within one sentence of the even share of 10 sentences
+    assert all(abs(length - 50) <= 5 for length in lengths)
+
+
+def test_split_uses_explicit_page_markers():
+    story = "Title: A Story\nPage 1: Once upon a time. A fox.\n**Page 2.** The fox ran!\n## page 3 - The end."
+    assert split_story_into_pages(story, 3) == [
+        {"page": 1, "text": "Once upon a time. A fox."},
+        {"page": 2, "text": "The fox ran!"},
+        {"page": 3, "text": "The end."},
+    ]
+
+
+def test_split_ignores_markers_when_the_count_differs():
+    story = "Page 1: Once upon a time. A fox.\nPage 2: The fox ran! The end."
+    pages = split_story_into_pages(story, 4)
+    assert [page["text"] for page in pages] == ["Once upon a time.", "A fox.", "The fox ran!", "The end."]
+
+
+@pytest.mark.parametrize("story", ["", "   ", "Title: Only a title\n"])
+def test_split_empty_story(story):
+    assert split_story_into_pages(story, 5) == []
+    assert split_story_into_pages(story, 5, pad=True) == [{"page": i, "text": ""} for i in range(1, 6)]
+
+
+def _marked_story(rng: random.Random, pages: int) -> str:
+    parts = [rng.choice(["", "Title: A Story\n", "Title: A Story\nOnce upon a time. "])]
+    for page in range(1, pages + 1):
+        marker = rng.choice(["Page", "## Page", "**Page", "  page"]) + f" {page}" + rng.choice([":", ".", "-", ":**"])
+        words = " ".join(rng.choice(["fox", "ran", "the page", "turned", "away."]) for _ in range(rng.randint(1, 12)))
+        parts.append(f"\n{marker} {words}")
+    return "".join(parts)
+
+
+def test_streaming_splitter_emits_closed_pages_whatever_the_chunking():
+    rng = random.Random(0)
+    for _ in range(300):
+        pages = rng.randint(1, 8)
+        total_pages = rng.randint(1, 10)
+        story = _marked_story(rng, pages)
+
+        splitter = StreamingPageSplitter(total_pages)
+        streamed = []
+        position = 0
+        while position < len(story):
+            size = rng.randint(1, 12)
+            streamed += splitter.feed(story[position:position + size])
+            position += size
+
+        # Every page but the last is closed by the next marker; the final split stays authoritative
+        final = split_story_into_pages(story, total_pages)
+        assert [page["page"] for page in streamed] == list(range(1, min(pages - 1, total_pages) + 1))
+        if pages == total_pages:
+            assert streamed == final[:-1]
+        assert splitter.text == story
+        assert splitter.finish() == final
@@ -1,20 +1,20 @@
+import json
 import re
-from config import BANNED_TOPICS
-
-
-# List of banned words
-# This list contains words that are considered inappropriate or unsafe for children's stories.
-#banned_words = ['violence', 'drugs', 'kill', 'blood', 'weapon', 'death']
+from bisect import bisect_left
+from itertools import accumulate
+if __package__:  # Imported as part of the package (see __init__.py)
+    from .saftey import get_default_matcher
+else:  # Run from this folder, like every script here
+    from saftey import get_default_matcher
 
 
 def is_input_safe(data: dict):
     """
     Check if the input data contains any banned words.
     This function takes a dictionary of input data and checks if any of the values contain
-    words that are considered inappropriate or unsafe for children's stories.
+    words that are considered inappropriate or unsafe for children's stories (config.BANNED_TERMS).
     """
-    combined = " ".join(str(value).lower() for value in data.values())
-    return not any(bad in combined for bad in banned_words)
+    return all(not terms for terms in get_default_matcher().scan(str(value) for value in data.values()))
 
 def format_story_by_level(story, reading_level="intermediate"):
     sentences = story.split(". ")
@@ -32,37 +32,254 @@ def format_story_by_level(story, reading_level="intermediate"):
     return pages[:20]
 
 
-def split_story_into_pages(story_text: str, total_pages: int = 20) -> list:
+# Patterns used by the page splitters, compiled once at import time
+TITLE_PATTERN = re.compile(r"^Title:.*\n", re.IGNORECASE)
+# Explicit page markers the story prompt asks the model to write, e.g. "Page 3:" or "**Page 3.**"
+PAGE_MARKER_PATTERN = re.compile(r"^[ \t#*]*Page\s*\d+\s*[:\-.]?\**", re.IGNORECASE | re.MULTILINE)
+# Any leftover "Page N" label inside the text, removed before the sentence heuristic
+INLINE_PAGE_LABEL_PATTERN = re.compile(r"Page\s*\d+[:\-]?", re.IGNORECASE)
+# The same label searched for in lowercased text: a literal prefix lets the regex engine skip ahead
+# instead of trying a case-insensitive match at every position
+LOWER_PAGE_LABEL_PATTERN = re.compile(r"page\s*\d+[:\-]?")
+SENTENCE_BREAK_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def _page_labels(story_text: str) -> list:
+    """
+    Finds every "Page N" label in the text and returns their (start, end) spans.
+    """
+    lower = story_text.lower()
+    if len(lower) != len(story_text):
+        # A few non-ASCII characters change length when lowercased; offsets would not line up
+        return [match.span() for match in INLINE_PAGE_LABEL_PATTERN.finditer(story_text)]
+    return [match.span() for match in LOWER_PAGE_LABEL_PATTERN.finditer(lower)]
+
+
+def _marked_sections(story_text: str, labels: list = None) -> list:
+    """
+    Splits text on explicit "Page N:" markers, i.e. labels that start a line.
+    Returns the stripped text of each marked page; anything before the first marker (other than a
+    "Title:" line) is kept at the start of page 1. Pass `labels` if _page_labels already ran.
+    """
+    if labels is None:
+        labels = _page_labels(story_text)
+    markers = []
+    for start, _ in labels:
+        # Walk back over the indentation/markdown a marker may carry; it must reach the start of a line
+        line_start = start
+        while line_start and story_text[line_start - 1] in " \t#*":
+            line_start -= 1
+        if line_start == 0 or story_text[line_start - 1] == "\n":
+            markers.append(PAGE_MARKER_PATTERN.match(story_text, line_start))
+    sections = []
+    for index, marker in enumerate(markers):
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(story_text)
+        sections.append(story_text[marker.end():end].strip())
+
+    preamble = story_text[:markers[0].start()].strip() if markers else ""
+    if sections and preamble:
+        sections[0] = f"{preamble} {sections[0]}".strip()
+    return sections
+
+
+def _balanced_groups(sentences: list, total_pages: int) -> list:
+    """
+    Groups consecutive sentences into at most `total_pages` pages of roughly equal length.
+    Length is measured in characters, a close proxy for words that costs nothing to compute: the
+    running totals come from len() and accumulate() in C, so the only Python-level work is one
+    bisection per page, O(pages · log n). A page takes the sentence straddling its share of the
+    text if at least half of that sentence falls inside it, and every remaining page keeps at
+    least one sentence, so no page is ever empty.
+    """
+    page_count = min(total_pages, len(sentences))
+    if page_count == 0:
+        return []
+
+    ends = list(accumulate(map(len, sentences)))  # Running length at the end of each sentence
+    chars_per_page = ends[-1] / page_count
+
+    groups = []
+    start = 0
+    for page in range(1, page_count):
+        boundary = page * chars_per_page
+        last = len(sentences) - (page_count - page)  # Leave a sentence for every remaining page
+        stop = bisect_left(ends, boundary, start + 1, last)  # First sentence ending at or past the boundary
+        if stop < last and ends[stop] - boundary <= boundary - ends[stop - 1]:
+            stop += 1  # Most of that sentence lies before the boundary: it belongs to this page
+        groups.append(sentences[start:stop])
+        start = stop
+    groups.append(sentences[start:])
+    return groups
+
+
+def split_story_into_pages(story_text: str, total_pages: int = 20, pad: bool = False) -> list:
     """
     Splits a story into a specified number of pages.
     This function takes a string of story text and divides it into chunks that can be used as pages.
-    It uses a simple heuristic to break the text into sentences and then groups them into the specified number of pages.
+    If the story labels exactly `total_pages` pages with "Page N:" markers, those pages are used as-is.
+    Otherwise it breaks the text into sentences and groups consecutive sentences into pages of
+    roughly equal length. Every sentence is kept, and no page is empty: a story with fewer
+    sentences than `total_pages` gets fewer pages, unless pad=True asks for empty pages to fill the gap.
     """
 
     # Remove title if included
-    story_text = re.sub(r"^Title:.*\n", "", story_text, flags=re.IGNORECASE)
+    story_text = TITLE_PATTERN.sub("", story_text, count=1)
 
-    # Break into sentences (simple heuristic)
-    sentences = re.split(r'(?<=[.!?])\s+', story_text.strip())
+    labels = _page_labels(story_text)
 
-    # Group sentences into 20 chunks
-    chunks = []
-    avg = max(1, len(sentences) // total_pages)
+    # Trust the model's own page breaks when it wrote exactly the pages we asked for
+    sections = _marked_sections(story_text, labels) if labels else []
+    if len(sections) == total_pages:
+        return [{"page": i + 1, "text": section} for i, section in enumerate(sections)]
 
-    for i in range(0, len(sentences), avg):
-        # chunk = " ".join(sentences[i:i + avg])
-
-        chunk = " ".join(sentences[i:i + avg])
-        chunk = re.sub(r'Page\s*\d+[:\-]?', '', chunk, flags=re.IGNORECASE).strip()
+    # Drop any "Page N" labels (reusing the spans found above), then break into sentences (simple heuristic)
+    if labels:
+        kept_from = [0] + [end for _, end in labels]
+        kept_to = [start for start, _ in labels] + [len(story_text)]
+        story_text = "".join(story_text[a:b] for a, b in zip(kept_from, kept_to))
+        sentences = [sentence.strip() for sentence in SENTENCE_BREAK_PATTERN.split(story_text.strip())]
+        sentences = [sentence for sentence in sentences if sentence]
+    else:
+        # The break pattern already swallows the whitespace between sentences
+        sentences = SENTENCE_BREAK_PATTERN.split(story_text.strip()) if story_text.strip() else []
 
-        chunks.append(chunk.strip())
+    chunks = [" ".join(group) for group in _balanced_groups(sentences, total_pages)]
 
-    # Ensure exactly 20 chunks
-    if len(chunks) > total_pages:
-        chunks = chunks[:total_pages]
-    elif len(chunks) < total_pages:
-        # Pad with empty pages if short (rare)
-        while len(chunks) < total_pages:
-            chunks.append("")
+    if pad:
+        # Only when explicitly asked for: fill up to exactly total_pages with empty pages
+        chunks.extend([""] * (total_pages - len(chunks)))
 
     return [{"page": i + 1, "text": chunk} for i, chunk in enumerate(chunks)]
+
+
+def shorten(text: str, max_chars: int) -> str:
+    """
+    Collapses whitespace and cuts text to at most max_chars, at the last comma or space that fits
+    (never mid-word). Returns "" if not even the first word fits.
+    """
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(max_chars, 0) + 1]
+    for separator in (", ", " "):
+        position = cut.rfind(separator)
+        if position > 0:
+            return cut[:position].rstrip(" ,;.")
+    return ""
+
+
+# The outermost {...} of a reply, in case the model wraps its JSON in prose or a ```json fence
+JSON_OBJECT_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class BookReplyError(ValueError):
+    """A reply to book_prompt that can't be used (as opposed to content that fails a safety check)."""
+
+
+def parse_book_json(reply: str, total_pages: int) -> dict:
+    """
+    Parses and validates a reply to book_prompt.
+
+    Returns:
+        dict: {"title", "character", "appearance", "story", "pages"}, where pages has the same shape as
+        split_story_into_pages() output and story is the pages written out with "Page N:" labels
+        (so it reads and re-splits like a reply to story_prompt).
+
+    Raises:
+        BookReplyError: If the reply isn't a JSON object with a character and exactly total_pages
+        non-empty page texts.
+    """
+    match = JSON_OBJECT_PATTERN.search(reply)
+    if not match:
+        raise BookReplyError("no JSON object in the reply")
+    try:
+        book = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise BookReplyError(f"invalid JSON: {e}")
+    if not isinstance(book, dict):
+        raise BookReplyError("the reply is not a JSON object")
+
+    character = book.get("character")
+    if not isinstance(character, str) or not character.strip():
+        raise BookReplyError("missing character description")
+    texts = book.get("pages")
+    if not isinstance(texts, list) or len(texts) != total_pages:
+        raise BookReplyError(f"expected {total_pages} pages, got {len(texts) if isinstance(texts, list) else 'none'}")
+    # Tolerate {"page": n, "text": ...} objects as well as plain strings
+    texts = [text.get("text") if isinstance(text, dict) else text for text in texts]
+    if not all(isinstance(text, str) and text.strip() for text in texts):
+        raise BookReplyError("every page needs non-empty text")
+
+    pages = [{"page": number, "text": " ".join(text.split())} for number, text in enumerate(texts, start=1)]
+    title = book.get("title") if isinstance(book.get("title"), str) else ""
+    appearance = book.get("appearance") if isinstance(book.get("appearance"), str) else ""  # Optional
+    return {
+        "title": title.strip(),
+        "character": character.strip(),
+        "appearance": " ".join(appearance.split()),
+        "story": "\n".join(f"Page {page['page']}: {page['text']}" for page in pages),
+        "pages": pages,
+    }
+
+
+class StreamingPageSplitter:
+    """
+    Splits a story into pages incrementally while it is still being generated.
+
+    Call feed() with each new chunk of streamed text; it returns the pages whose "Page N:" section
+    has been closed by the start of the next marker, so their illustrations can start early.
+    Those early pages are speculative: finish() returns the authoritative page list, which is
+    always exactly split_story_into_pages(full_text, total_pages).
+    """
+
+    # How far back into already-scanned text to look for a marker cut in two by a chunk boundary
+    MARKER_LOOKBACK = 32
+
+    def __init__(self, total_pages: int = 20):
+        self.total_pages = total_pages
+        self._chunks = []
+        # Only the open section is kept for parsing, so each chunk costs time proportional to its own
+        # length rather than the whole story. It starts one character early (or at the very start of
+        # the text) so the marker pattern can still tell whether its first character begins a line.
+        self._open = ""
+        self._scan = 0  # Where the next marker search in self._open starts
+        self._preamble = None  # Text before the first marker, once that marker has been seen
+        self._emitted = 0
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> list:
+        """Adds streamed text and returns any newly completed pages."""
+        self._chunks.append(chunk)
+        self._open += chunk
+
+        new_pages = []
+        while True:
+            marker = PAGE_MARKER_PATTERN.search(self._open, self._scan)
+            if marker is None:
+                self._scan = max(self._scan, len(self._open) - self.MARKER_LOOKBACK)
+                break
+            if marker.end() == len(self._open):
+                self._scan = marker.start()  # "Page 1" may still become "Page 12": look again next chunk
+                break
+
+            # The marker closes the open section
+            section = self._open[:marker.start()] if self._preamble is None else self._open[1:marker.start()]
+            self._open = self._open[marker.end() - 1:]
+            self._scan = 1
+            if self._preamble is None:
+                self._preamble = TITLE_PATTERN.sub("", section.lstrip(), count=1).strip()
+                continue
+            if self._emitted == 0 and self._preamble:
+                section = f"{self._preamble} {section.strip()}"
+            if self._emitted < self.total_pages:
+                self._emitted += 1
+                new_pages.append({"page": self._emitted, "text": section.strip()})
+        return new_pages
+
+    def finish(self) -> list:
+        """Returns the final page list for the complete text."""
+        return split_story_into_pages(self.text.strip(), total_pages=self.total_pages)
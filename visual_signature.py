@@ -0,0 +1,85 @@
+import re
+from typing import Optional
+
+import config  # Signature length budget
+import instrumentation  # Counts signatures that had to fall back to the heuristic
+from saftey import validate_safe_output  # The signature ends up in every image prompt
+from utils import shorten
+
+# Words that mark a sentence as describing how the character looks
+_VISUAL_CUES = re.compile(
+    r"\b(red|orange|yellow|green|blue|purple|pink|brown|black|white|gr[ae]y|golden|silver|spotted|striped|"
+    r"fur|furry|feathers?|scales?|hair|eyes?|ears?|tail|wings?|paws?|whiskers|freckles|tall|small|tiny|big|"
+    r"wears?|wearing|dressed|scarf|hat|cap|boots|shoes|dress|shirt|jacket|cape|coat|backpack|glasses|"
+    r"fox|rabbit|bunny|bear|cat|dog|puppy|owl|dragon|mouse|bird|girl|boy|robot|unicorn)\b",
+    re.IGNORECASE,
+)
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_LABEL = re.compile(r"^(visual (traits|signature)|appearance|traits)\s*:\s*", re.IGNORECASE)
+
+
+def visual_signature_prompt(character_description: str, max_words: int = 30) -> str:
+    """
+    Creates a prompt that boils a character description down to what an illustrator has to draw
+    the same way on every page.
+
+    Parameters:
+        character_description (str): The full character description (name, looks, personality, backstory).
+        max_words (int): Upper bound on the reply's length.
+
+    Returns:
+        str: A formatted prompt for use with a language model like GPT.
+    """
+    return (
+        "Below is the description of the main character of a children's picture book.\n"
+        "List only how the character looks, so an illustrator draws them the same way on every page: "
+        "species or kind, body and hair or fur colors, eye color, clothing and accessories.\n"
+        "Leave out the name, personality and backstory.\n"
+        f"Reply with one line of comma-separated visual traits, at most {max_words} words.\n\n"
+        f"Character: {character_description}"
+    )
+
+
+def heuristic_visual_signature(character_description: str, max_chars: int = config.VISUAL_SIGNATURE_MAX_CHARS) -> str:
+    """
+    Signature without an LLM call: the description's sentences that mention looks (colors, fur,
+    clothing, species...), or its first sentence if none do, shortened to max_chars.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_BREAK.split(character_description.strip()) if sentence.strip()]
+    visual = [sentence for sentence in sentences if _VISUAL_CUES.search(sentence)] or sentences[:1]
+    return shorten(" ".join(visual), max_chars)
+
+
+def clean_visual_signature(reply: str, max_chars: int = config.VISUAL_SIGNATURE_MAX_CHARS) -> Optional[str]:
+    """The first non-empty line of a model reply, without labels or quotes, shortened; None if empty."""
+    for line in reply.splitlines():
+        line = _LABEL.sub("", line.strip().strip("-*•").strip()).strip().strip("\"'").strip()
+        if line:
+            return shorten(line, max_chars) or None
+    return None
+
+
+def derive_visual_signature(character_description: str, max_chars: int = config.VISUAL_SIGNATURE_MAX_CHARS) -> str:
+    """
+    Returns a compact visual-only signature of the character (e.g. "small orange fox, blue scarf,
+    green eyes") for use in every page's image prompt. Asks the LLM (the completion cache makes
+    re-runs free); if that fails or the reply is empty or unsafe, falls back to
+    heuristic_visual_signature.
+    """
+    from llm import chat_completion  # Imported here: the heuristic alone needs no API client
+
+    def check(reply: str) -> None:
+        """Only a non-empty, safe signature is cached."""
+        signature = clean_visual_signature(reply, max_chars)
+        if not signature:
+            raise ValueError("empty reply")
+        validate_safe_output(signature, "visual signature")
+
+    try:
+        with instrumentation.span("visual_signature"):
+            reply = chat_completion(visual_signature_prompt(character_description), validate=check)
+        return clean_visual_signature(reply, max_chars)
+    except Exception as e:
+        print(f"⚠️ Visual signature failed ({e}); using the description's visual sentences instead.")
+    instrumentation.count("visual_signature.fallbacks")
+    return heuristic_visual_signature(character_description, max_chars)
@@ -0,0 +1,210 @@
+"""
+Durable, multi-process story generation backed by the SQLite job queue (job_queue.py).
+
+    python worker.py enqueue books.jsonl                    # one job per line, same format as batch.py
+    python worker.py run --processes 4                      # start workers (repeat on other hosts)
+    python worker.py status [--id 12]
+
+Every worker process claims jobs with a lease and keeps it alive with heartbeats while the book is
+generated. If a worker dies, its lease expires and another worker picks the job up; the book's
+checkpoint manifest makes the retry resume where the crashed attempt stopped. Inside a worker
+process the I/O-bound stages (LLM calls, Leonardo polling, downloads) run on threads, while the
+CPU-bound PDF page rendering runs in a separate pool of processes so it is not held back by the GIL.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import config
+from job_queue import Job, JobQueue
+
+
+def process_job(job: Job, queue: JobQueue, image_executor, cpu_executor) -> None:
+    """
+    Generates one book for a claimed job, heartbeating its lease the whole time, and records the
+    outcome. Pages whose image failed send the job back to the queue (the retry only renders the
+    missing pages) until its last attempt, which completes with whatever pages succeeded.
+    """
+    from checkpoint import BookManifest
+    from main import run_story_pipeline
+    from pdf_export import export_pdf
+    from render_profiles import pdf_dpi
+
+    payload = job.payload
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(queue.lease_seconds / 3):
+            if not queue.heartbeat(job):
+                print(f"⚠️ Lost the lease on job {job.id}; another worker will retry it.", file=sys.stderr)
+                return
+
+    heartbeat_thread = threading.Thread(target=heartbeat, name=f"lease-{job.id}", daemon=True)
+    heartbeat_thread.start()
+    try:
+        if not payload.get("title") or not payload.get("genre"):
+            raise ValueError("Both title and genre are required.")
+
+        storybook = run_story_pipeline(
+            payload["title"],
+            payload["genre"],
+            age_group=payload.get("age_group", "5–10"),
+            total_pages=payload.get("total_pages", 5),
+            stream=payload.get("stream", False),
+            structured=payload.get("structured", config.STRUCTURED_GENERATION),
+            profile=payload.get("profile"),
+            image_executor=image_executor,
+        )
+        failed_pages = [page["page"] for page in storybook["pages"] if not page.get("image_url")]
+        if failed_pages and not job.last_attempt:
+            queue.fail(job, f"Images failed for pages {failed_pages}.", retry_delay=config.JOB_RETRY_DELAY)
+            print(f"🔁 Job {job.id}: {len(failed_pages)} page image(s) failed, queued for another attempt.", file=sys.stderr)
+            return
+
+        # CPU-bound: every page is decoded, resized and drawn in the process pool
+        manifest = BookManifest.load(storybook["manifest"])
+        pdf_path = os.path.join(os.path.dirname(storybook["manifest"]), "storybook.pdf")
+        pages = [(page["image_url"], page["text"]) for page in storybook["pages"] if page.get("image_url")]
+        dpi = pdf_dpi(storybook["profile"])
+        pdf = manifest.stage("pdf", lambda: pdf_path if export_pdf(pages, pdf_path, dpi=dpi, executor=cpu_executor) else None)
+
+        queue.complete(job, {"manifest": storybook["manifest"], "pdf": pdf, "failed_pages": failed_pages})
+        print(f"📘 Job {job.id} done: {payload['title']}", file=sys.stderr)
+    except Exception as e:
+        queue.fail(job, str(e), retry_delay=config.JOB_RETRY_DELAY)
+        print(f"❌ Job {job.id} attempt {job.attempts}/{job.max_attempts} failed: {e}", file=sys.stderr)
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+
+
+def run_worker(
+    queue_path: str = config.JOB_QUEUE_PATH,
+    jobs_per_process: int = config.WORKER_JOBS_PER_PROCESS,
+    cpu_workers: int = config.WORKER_CPU_PROCESSES,
+    max_images_in_flight: int = config.BATCH_MAX_IMAGES_IN_FLIGHT,
+    exit_when_idle: bool = False,
+    lease_seconds: float = config.JOB_LEASE_SECONDS,
+) -> int:
+    """
+    Runs one worker process: jobs_per_process threads claim and generate books, sharing one image
+    pool and one process pool for CPU work. With exit_when_idle=True the worker returns once the
+    queue is drained, i.e. nothing is queued or running (otherwise it polls forever). Returns the
+    number of jobs handled.
+    """
+    queue = JobQueue(queue_path, lease_seconds=lease_seconds)
+    handled = 0
+    handled_lock = threading.Lock()
+
+    # "spawn": the pool is created while this process already runs threads, which fork() can't copy safely
+    cpu_executor = ProcessPoolExecutor(max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+    image_executor = ThreadPoolExecutor(max_workers=max_images_in_flight, thread_name_prefix="worker-image")
+
+    def job_loop(slot: int) -> None:
+        nonlocal handled
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{slot}"
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                counts = queue.stats()
+                if exit_when_idle and counts["queued"] + counts["running"] == 0:
+                    return
+                time.sleep(config.WORKER_IDLE_SLEEP)
+                continue
+            print(f"🛠️ {worker_id} claimed job {job.id} (attempt {job.attempts}/{job.max_attempts})", file=sys.stderr)
+            process_job(job, queue, image_executor, cpu_executor)
+            with handled_lock:
+                handled += 1
+
+    threads = [threading.Thread(target=job_loop, args=(slot,), name=f"job-{slot}") for slot in range(jobs_per_process)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        image_executor.shutdown(wait=True)
+        cpu_executor.shutdown(wait=True)
+        queue.close()
+    return handled
+
+
+def run_workers(processes: int, **worker_options) -> None:
+    """Starts `processes` worker processes and waits for them (Ctrl+C stops them all)."""
+    if processes <= 1:
+        run_worker(**worker_options)
+        return
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=run_worker, kwargs=worker_options, name=f"worker-{n}") for n in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()  # Their leases expire and the jobs are retried by the next worker
+
+
+def enqueue_file(input_path: str, queue: JobQueue) -> list:
+    """Adds one job per line of a batch.py-style JSONL file; returns the new job ids."""
+    from batch import read_jobs
+
+    ids = []
+    for job in read_jobs(input_path):
+        if "error" in job:
+            print(f"⚠️ Skipping line {job['line']}: {job['error']}", file=sys.stderr)
+            continue
+        ids.append(queue.enqueue(job))
+    return ids
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Durable multi-process storybook workers.")
+    parser.add_argument("--queue", default=config.JOB_QUEUE_PATH, help="SQLite job queue file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add jobs from a JSONL file of {title, genre, age_group}")
+    enqueue.add_argument("input")
+
+    run = commands.add_parser("run", help="Start workers that claim and generate queued books")
+    run.add_argument("--processes", type=int, default=1, help="Worker processes on this host")
+    run.add_argument("--jobs-per-process", type=int, default=config.WORKER_JOBS_PER_PROCESS)
+    run.add_argument("--cpu-workers", type=int, default=config.WORKER_CPU_PROCESSES, help="PDF rendering processes per worker")
+    run.add_argument("--max-images-in-flight", type=int, default=config.BATCH_MAX_IMAGES_IN_FLIGHT, help="Per worker process")
+    run.add_argument("--exit-when-idle", action="store_true", help="Stop once nothing is queued or running")
+    run.add_argument("--lease-seconds", type=float, default=config.JOB_LEASE_SECONDS)
+
+    status = commands.add_parser("status", help="Show job counts, or one job's record")
+    status.add_argument("--id", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "enqueue":
+        ids = enqueue_file(args.input, JobQueue(args.queue))
+        print(f"📥 Enqueued {len(ids)} job(s).", file=sys.stderr)
+    elif args.command == "run":
+        run_workers(
+            args.processes,
+            queue_path=args.queue,
+            jobs_per_process=args.jobs_per_process,
+            cpu_workers=args.cpu_workers,
+            max_images_in_flight=args.max_images_in_flight,
+            exit_when_idle=args.exit_when_idle,
+            lease_seconds=args.lease_seconds,
+        )
+    else:
+        queue = JobQueue(args.queue)
+        print(json.dumps(queue.get(args.id) if args.id else queue.stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())